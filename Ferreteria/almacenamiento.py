@@ -0,0 +1,852 @@
+# almacenamiento.py - Persistencia de datos del punto de venta
+
+from typing import List, Dict, Iterator, Optional, Tuple
+import atexit
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import dinero
+
+
+# Backend de persistencia: 'json' (archivos, por defecto) o 'sqlite'
+BACKEND_ALMACENAMIENTO = os.environ.get('PV_ALMACENAMIENTO', 'json').lower()
+ARCHIVO_BASE_DATOS = os.environ.get('PV_BASE_DATOS', 'punto_venta.db')
+# Segundos que el escritor en segundo plano espera para agrupar cambios del mismo archivo
+VENTANA_ESCRITURA = float(os.environ.get('PV_VENTANA_ESCRITURA', '0.5'))
+# Directorio del historial de ventas particionado por mes
+DIRECTORIO_VENTAS = os.environ.get('PV_DIRECTORIO_VENTAS', 'ventas')
+MES_SIN_FECHA = 'sin_fecha'
+
+
+def serializar_json(datos, indent: int = 2) -> bytes:
+    """Contenido de un archivo JSON (UTF-8) con los datos tal como están en este momento"""
+    return json.dumps(datos, ensure_ascii=False, indent=indent).encode('utf-8')
+
+
+def escribir_archivo_atomico(ruta: str, contenido: bytes) -> None:
+    """Escribe un archivo de forma atómica (archivo temporal, fsync y renombrado)"""
+    temporal = ruta + '.tmp'
+    directorio = os.path.dirname(ruta)
+    if directorio:
+        os.makedirs(directorio, exist_ok=True)
+    with open(temporal, 'wb') as f:
+        f.write(contenido)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporal, ruta)
+
+
+def escribir_json_atomico(ruta: str, datos, indent: int = 2) -> None:
+    """Escribe un archivo JSON de forma atómica (archivo temporal, fsync y renombrado)"""
+    escribir_archivo_atomico(ruta, serializar_json(datos, indent))
+
+
+def iterar_jsonl(ruta: str) -> Iterator[Dict]:
+    """Recorre un archivo JSONL registro por registro, omitiendo líneas vacías o dañadas"""
+    with open(ruta, 'r', encoding='utf-8') as f:
+        for numero, linea in enumerate(f, start=1):
+            linea = linea.strip()
+            if not linea:
+                continue
+            try:
+                yield json.loads(linea)
+            except json.JSONDecodeError:
+                # Una línea incompleta sólo puede venir de un corte al escribir
+                print(f"Registro dañado en {ruta}, línea {numero}; se omite")
+
+
+def anexar_jsonl(ruta: str, registros: List[Dict]) -> None:
+    """Anexa registros a un archivo JSONL, una línea compacta por registro, y los asegura en disco"""
+    lineas = ''.join(json.dumps(registro, ensure_ascii=False, separators=(',', ':')) + '\n' for registro in registros)
+    with open(ruta, 'a', encoding='utf-8') as f:
+        f.write(lineas)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def leer_jsonl(ruta: str) -> List[Dict]:
+    """Lee un archivo JSONL omitiendo líneas vacías o dañadas"""
+    return list(iterar_jsonl(ruta))
+
+
+def en_rango_fechas(venta: Dict, desde: str = None, hasta: str = None) -> bool:
+    """Indica si la fecha de la venta (AAAA-MM-DD ...) está entre desde y hasta, inclusive"""
+    if not desde and not hasta:
+        return True
+    dia = str(venta.get('fecha') or '')[:10]
+    return bool(dia) and (not desde or dia >= desde) and (not hasta or dia <= hasta)
+
+
+def mes_de_venta(venta: Dict) -> str:
+    """Retorna la partición (AAAA-MM) a la que pertenece una venta según su fecha"""
+    fecha = str(venta.get('fecha') or '')
+    return fecha[:7] if re.match(r'\d{4}-\d{2}', fecha) else MES_SIN_FECHA
+
+
+class EscritorSegundoPlano:
+    """Hilo escritor que agrupa los cambios de cada archivo en una sola escritura atómica"""
+    def __init__(self, ventana: float = VENTANA_ESCRITURA):
+        self.ventana = ventana
+        self.condicion = threading.Condition()
+        self.pendientes = {}  # ruta -> (versión, contenido serializado)
+        self.primera_marca = 0.0
+        self.forzar = False
+        self.en_curso = 0
+        self.version = 0
+        # Última versión escrita de cada archivo (evita que un lote viejo pise uno nuevo)
+        self.versiones_escritas = {}
+        self.candado_archivos = threading.Lock()
+        self.metricas = {
+            'marcas': 0,
+            'escrituras': 0,
+            'errores': 0,
+            'profundidad_maxima': 0,
+            'latencia_total': 0.0,
+            'latencia_maxima': 0.0
+        }
+        self.hilo = threading.Thread(target=self.ejecutar, name='escritor-segundo-plano', daemon=True)
+        self.hilo.start()
+        atexit.register(self.flush)
+
+    def marcar(self, ruta: str, datos) -> None:
+        """Marca un archivo como pendiente de escribir con los datos indicados"""
+        # Se serializa en el hilo que llama: el escritor nunca lee registros que se siguen modificando
+        contenido = serializar_json(datos)
+        with self.condicion:
+            self.version += 1
+            if not self.pendientes:
+                self.primera_marca = time.monotonic()
+            self.pendientes[ruta] = (self.version, contenido)
+            self.metricas['marcas'] += 1
+            self.metricas['profundidad_maxima'] = max(self.metricas['profundidad_maxima'], len(self.pendientes))
+            self.condicion.notify_all()
+
+    def escribir_ahora(self, ruta: str, datos) -> None:
+        """Escribe un archivo de inmediato (descarta lo pendiente del mismo archivo); propaga errores"""
+        contenido = serializar_json(datos)
+        with self.condicion:
+            self.version += 1
+            version = self.version
+            self.pendientes.pop(ruta, None)
+            self.metricas['marcas'] += 1
+            self.en_curso += 1
+        try:
+            self.escribir(ruta, version, contenido)
+        finally:
+            with self.condicion:
+                self.en_curso -= 1
+                self.condicion.notify_all()
+
+    def escribir(self, ruta: str, version: int, contenido: bytes) -> None:
+        """Escribe una versión de un archivo si no hay otra más reciente en disco"""
+        inicio = time.perf_counter()
+        with self.candado_archivos:
+            if version <= self.versiones_escritas.get(ruta, 0):
+                return
+            escribir_archivo_atomico(ruta, contenido)
+            self.versiones_escritas[ruta] = version
+        latencia = time.perf_counter() - inicio
+        with self.condicion:
+            self.metricas['escrituras'] += 1
+            self.metricas['latencia_total'] += latencia
+            self.metricas['latencia_maxima'] = max(self.metricas['latencia_maxima'], latencia)
+
+    def ejecutar(self) -> None:
+        """Ciclo del hilo escritor"""
+        while True:
+            with self.condicion:
+                while not self.pendientes:
+                    self.condicion.wait()
+                # Esperar la ventana de agrupación, salvo que se haya pedido flush()
+                while not self.forzar:
+                    restante = self.primera_marca + self.ventana - time.monotonic()
+                    if restante <= 0:
+                        break
+                    self.condicion.wait(restante)
+                lote = self.pendientes
+                self.pendientes = {}
+                self.en_curso += 1
+
+            try:
+                for ruta, (version, contenido) in lote.items():
+                    try:
+                        self.escribir(ruta, version, contenido)
+                    except Exception as e:
+                        print(f"Error al escribir {ruta}: {e}")
+                        with self.condicion:
+                            self.metricas['errores'] += 1
+            finally:
+                with self.condicion:
+                    self.en_curso -= 1
+                    self.condicion.notify_all()
+
+    def flush(self, timeout: float = None) -> bool:
+        """Espera a que todas las escrituras pendientes terminen; retorna False si se agota el tiempo"""
+        with self.condicion:
+            self.forzar = True
+            self.condicion.notify_all()
+            terminado = self.condicion.wait_for(lambda: not self.pendientes and not self.en_curso, timeout)
+            self.forzar = False
+            return terminado
+
+    def obtener_metricas(self) -> Dict:
+        """Retorna profundidad de cola, razón de agrupación y latencia de escritura"""
+        with self.condicion:
+            escrituras = self.metricas['escrituras']
+            return {
+                'profundidad_cola': len(self.pendientes),
+                'profundidad_maxima': self.metricas['profundidad_maxima'],
+                'marcas': self.metricas['marcas'],
+                'escrituras': escrituras,
+                'errores': self.metricas['errores'],
+                'razon_agrupacion': self.metricas['marcas'] / escrituras if escrituras else 0.0,
+                'latencia_promedio_ms': self.metricas['latencia_total'] / escrituras * 1000 if escrituras else 0.0,
+                'latencia_maxima_ms': self.metricas['latencia_maxima'] * 1000
+            }
+
+
+class DiarioVentas:
+    """Diario único de ventas del formato anterior (JSONL y snapshot); sólo se lee para migrarlo"""
+    def __init__(self,
+                 archivo_diario: str = 'ventas.jsonl',
+                 archivo_snapshot: str = 'ventas_snapshot.json'):
+        self.archivo_diario = archivo_diario
+        self.archivo_snapshot = archivo_snapshot
+
+    def existe(self) -> bool:
+        """Indica si ya hay un diario o un snapshot en disco"""
+        return os.path.exists(self.archivo_diario) or os.path.exists(self.archivo_snapshot)
+
+    def cargar(self) -> List[Dict]:
+        """Reconstruye el historial leyendo el snapshot y reproduciendo el diario"""
+        ventas = []
+        if os.path.exists(self.archivo_snapshot):
+            try:
+                with open(self.archivo_snapshot, 'r', encoding='utf-8') as f:
+                    ventas = json.load(f)
+            except Exception as e:
+                print(f"Error al cargar snapshot de ventas: {e}")
+
+        # Folios ya compactados (evita duplicados si se interrumpió una compactación)
+        folios = {v.get('folio') for v in ventas if v.get('folio') is not None}
+
+        if os.path.exists(self.archivo_diario):
+            try:
+                for venta in leer_jsonl(self.archivo_diario):
+                    if venta.get('folio') is not None and venta.get('folio') in folios:
+                        continue
+                    ventas.append(venta)
+            except Exception as e:
+                print(f"Error al leer diario de ventas: {e}")
+
+        return ventas
+
+
+class HistorialParticionado:
+    """Historial de ventas en un archivo JSONL por mes (ventas/AAAA-MM.jsonl) con un manifiesto"""
+    def __init__(self, directorio: str = DIRECTORIO_VENTAS, escritor: EscritorSegundoPlano = None):
+        self.directorio = directorio
+        self.archivo_manifiesto = os.path.join(directorio, 'manifiesto.json')
+        self.escritor = escritor
+        self.manifiesto = None
+
+    def existe(self) -> bool:
+        """Indica si el historial ya está particionado en disco"""
+        return os.path.exists(self.archivo_manifiesto)
+
+    def ruta_particion(self, mes: str) -> str:
+        return os.path.join(self.directorio, f"{mes}.jsonl")
+
+    @staticmethod
+    def estadisticas(ventas: List[Dict], tamano: int = 0) -> Dict:
+        """Calcula las estadísticas de una partición"""
+        folios = [v['folio'] for v in ventas if isinstance(v.get('folio'), int)]
+        return {
+            'ventas': len(ventas),
+            'total': dinero.a_pesos(dinero.sumar(v.get('total', 0) for v in ventas)),
+            'primer_folio': min(folios) if folios else None,
+            'ultimo_folio': max(folios) if folios else None,
+            'bytes': tamano
+        }
+
+    def obtener_manifiesto(self) -> Dict:
+        """Carga el manifiesto (una vez) y lo corrige si no coincide con las particiones en disco"""
+        if self.manifiesto is not None:
+            return self.manifiesto
+
+        self.manifiesto = {'ultimo_folio': 0, 'particiones': {}}
+        if os.path.exists(self.archivo_manifiesto):
+            try:
+                with open(self.archivo_manifiesto, 'r', encoding='utf-8') as f:
+                    self.manifiesto.update(json.load(f))
+            except Exception as e:
+                print(f"Error al cargar manifiesto de ventas: {e}")
+
+        if not os.path.isdir(self.directorio):
+            return self.manifiesto
+
+        # Una partición cuyo tamaño no coincide se escribió después del manifiesto (p. ej. un corte)
+        particiones = self.manifiesto['particiones']
+        en_disco = {nombre[:-len('.jsonl')] for nombre in os.listdir(self.directorio) if nombre.endswith('.jsonl')}
+        cambios = False
+        for mes in set(particiones) - en_disco:
+            del particiones[mes]
+            cambios = True
+        for mes in en_disco:
+            tamano = os.path.getsize(self.ruta_particion(mes))
+            if particiones.get(mes, {}).get('bytes') != tamano:
+                particiones[mes] = self.estadisticas(leer_jsonl(self.ruta_particion(mes)), tamano)
+                cambios = True
+        if cambios:
+            folios = [datos['ultimo_folio'] for datos in particiones.values() if datos.get('ultimo_folio')]
+            self.manifiesto['ultimo_folio'] = max(folios + [self.manifiesto.get('ultimo_folio') or 0])
+            self.guardar_manifiesto()
+        return self.manifiesto
+
+    def guardar_manifiesto(self, inmediato: bool = False) -> None:
+        """Guarda el manifiesto (en segundo plano si hay escritor)"""
+        # El escritor serializa al marcar: no hace falta copiar las estadísticas de cada partición
+        copia = {
+            'ultimo_folio': self.manifiesto['ultimo_folio'],
+            'particiones': self.manifiesto['particiones']
+        }
+        os.makedirs(self.directorio, exist_ok=True)
+        if self.escritor is None:
+            escribir_json_atomico(self.archivo_manifiesto, copia)
+        elif inmediato:
+            self.escritor.escribir_ahora(self.archivo_manifiesto, copia)
+        else:
+            self.escritor.marcar(self.archivo_manifiesto, copia)
+
+    def meses(self) -> Dict[str, Dict]:
+        """Retorna las estadísticas de cada partición, por mes"""
+        return self.obtener_manifiesto()['particiones']
+
+    def cargar_mes(self, mes: str) -> List[Dict]:
+        """Carga las ventas de una partición"""
+        ruta = self.ruta_particion(mes)
+        if not os.path.exists(ruta):
+            return []
+        return leer_jsonl(ruta)
+
+    def cargar(self) -> List[Dict]:
+        """Carga todas las particiones en orden cronológico"""
+        ventas = []
+        for mes in sorted(self.meses()):
+            ventas.extend(self.cargar_mes(mes))
+        return ventas
+
+    def iterar(self, desde: str = None, hasta: str = None) -> Iterator[Dict]:
+        """Recorre las ventas del rango sin cargarlas en memoria (sólo lee las particiones necesarias)"""
+        for mes in sorted(self.meses()):
+            if mes == MES_SIN_FECHA:
+                if desde or hasta:
+                    continue
+            elif (desde and mes < desde[:7]) or (hasta and mes > hasta[:7]):
+                continue
+            ruta = self.ruta_particion(mes)
+            if not os.path.exists(ruta):
+                continue
+            for venta in iterar_jsonl(ruta):
+                if en_rango_fechas(venta, desde, hasta):
+                    yield venta
+
+    def anexar(self, venta: Dict) -> bool:
+        """Anexa una venta a la partición de su mes y actualiza el manifiesto"""
+        try:
+            manifiesto = self.obtener_manifiesto()
+            mes = mes_de_venta(venta)
+            ruta = self.ruta_particion(mes)
+            os.makedirs(self.directorio, exist_ok=True)
+            anexar_jsonl(ruta, [venta])
+
+            datos = manifiesto['particiones'].setdefault(mes, self.estadisticas([]))
+            datos['ventas'] += 1
+            datos['total'] = dinero.a_pesos(dinero.a_centavos(datos['total']) + dinero.a_centavos(venta.get('total', 0)))
+            datos['bytes'] = os.path.getsize(ruta)
+            folio = venta.get('folio')
+            if isinstance(folio, int):
+                datos['primer_folio'] = folio if datos['primer_folio'] is None else min(datos['primer_folio'], folio)
+                datos['ultimo_folio'] = folio if datos['ultimo_folio'] is None else max(datos['ultimo_folio'], folio)
+                manifiesto['ultimo_folio'] = max(manifiesto['ultimo_folio'], folio)
+            self.guardar_manifiesto()
+            return True
+        except Exception as e:
+            print(f"Error al anexar venta al historial: {e}")
+            return False
+
+    def escribir_particiones(self, ventas: List[Dict]) -> None:
+        """Reescribe el historial completo, una partición por mes"""
+        por_mes = {}
+        for venta in ventas:
+            por_mes.setdefault(mes_de_venta(venta), []).append(venta)
+
+        os.makedirs(self.directorio, exist_ok=True)
+        particiones = {}
+        for mes, ventas_mes in por_mes.items():
+            ruta = self.ruta_particion(mes)
+            temporal = ruta + '.tmp'
+            with open(temporal, 'w', encoding='utf-8') as f:
+                for venta in ventas_mes:
+                    f.write(json.dumps(venta, ensure_ascii=False, separators=(',', ':')) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporal, ruta)
+            particiones[mes] = self.estadisticas(ventas_mes, os.path.getsize(ruta))
+
+        # Se eliminan las particiones que ya no tienen ventas
+        for nombre in os.listdir(self.directorio):
+            if nombre.endswith('.jsonl') and nombre[:-len('.jsonl')] not in particiones:
+                os.remove(os.path.join(self.directorio, nombre))
+
+        folios = [datos['ultimo_folio'] for datos in particiones.values() if datos['ultimo_folio']]
+        self.manifiesto = {'ultimo_folio': max(folios, default=0), 'particiones': particiones}
+        self.guardar_manifiesto(inmediato=True)
+
+    def migrar(self, archivo_legado: str = 'ventas.json') -> Tuple[bool, str]:
+        """Migra (una sola vez) el diario único o el ventas.json legado a particiones mensuales"""
+        if self.existe():
+            return (False, "El historial ya está particionado")
+
+        diario = DiarioVentas()
+        if diario.existe():
+            origenes = [diario.archivo_diario, diario.archivo_snapshot]
+        elif os.path.exists(archivo_legado):
+            origenes = [archivo_legado]
+        else:
+            return (False, "No hay historial por migrar")
+
+        try:
+            if diario.existe():
+                ventas = diario.cargar()
+            else:
+                with open(archivo_legado, 'r', encoding='utf-8') as f:
+                    ventas = json.load(f)
+            self.escribir_particiones(ventas)
+            # Se conservan los archivos originales como respaldo, fuera de la ruta de carga
+            for origen in origenes:
+                if os.path.exists(origen):
+                    os.replace(origen, origen + '.migrado')
+            return (True, f"Historial migrado a {len(self.meses())} particiones mensuales: {len(ventas)} ventas")
+        except Exception as e:
+            return (False, f"Error al migrar historial: {str(e)}")
+
+    def compactar(self) -> Tuple[bool, str]:
+        """Reescribe las particiones sin líneas dañadas y reconstruye el manifiesto"""
+        try:
+            ventas = self.cargar()
+            self.escribir_particiones(ventas)
+            return (True, f"Historial compactado: {len(ventas)} ventas en {len(self.meses())} meses")
+        except Exception as e:
+            return (False, f"Error al compactar historial: {str(e)}")
+
+
+class Almacenamiento:
+    """Interfaz común de persistencia para los gestores del punto de venta"""
+    def cargar(self, coleccion: str, archivo: str = None) -> Dict:
+        """Carga todos los registros de una colección (inventario, clientes, proveedores)"""
+        raise NotImplementedError
+
+    def guardar(self, coleccion: str, datos: Dict, archivo: str = None) -> None:
+        """Reemplaza todos los registros guardados de una colección"""
+        raise NotImplementedError
+
+    def guardar_registros(self, coleccion: str, datos: Dict, claves: List[str],
+                          eliminados: List[str] = None, inmediato: bool = False) -> None:
+        """Persiste sólo los registros modificados o eliminados de una colección"""
+        raise NotImplementedError
+
+    def cargar_ventas(self, archivo: str = None) -> List[Dict]:
+        """Carga el historial de ventas"""
+        raise NotImplementedError
+
+    def anexar_venta(self, venta: Dict, historial: List[Dict]) -> bool:
+        """Persiste una venta nueva"""
+        raise NotImplementedError
+
+    def guardar_ventas(self, ventas: List[Dict], archivo: str = None) -> None:
+        """Reemplaza el historial de ventas guardado"""
+        raise NotImplementedError
+
+    def compactar_ventas(self, ventas: List[Dict]) -> Tuple[bool, str]:
+        """Compacta el almacenamiento del historial de ventas"""
+        return (False, "El almacenamiento no requiere compactación")
+
+    def buscar_ventas_por_fecha(self, fecha: str) -> Optional[List[Dict]]:
+        """Busca ventas por prefijo de fecha; None si el backend no tiene índice"""
+        return None
+
+    def estadisticas_ventas(self) -> Optional[Dict[str, Dict]]:
+        """Estadísticas del historial por mes; None si el backend no permite cargar por mes"""
+        return None
+
+    def iterar_ventas(self, desde: str = None, hasta: str = None) -> Iterator[Dict]:
+        """Recorre las ventas entre dos fechas (AAAA-MM-DD, inclusive) en orden cronológico"""
+        for venta in self.cargar_ventas():
+            if en_rango_fechas(venta, desde, hasta):
+                yield venta
+
+    def cargar_ventas_mes(self, mes: str) -> List[Dict]:
+        """Carga las ventas de un mes (AAAA-MM)"""
+        raise NotImplementedError
+
+    def flush(self, timeout: float = None) -> bool:
+        """Espera a que terminen las escrituras pendientes"""
+        return True
+
+    def obtener_metricas(self) -> Dict:
+        """Retorna las métricas de escritura del almacenamiento"""
+        return {}
+
+
+class AlmacenamientoJSON(Almacenamiento):
+    """Persistencia en archivos JSON, con diario para el historial de ventas"""
+    ARCHIVOS = {
+        'inventario': 'inventario.json',
+        'clientes': 'clientes.json',
+        'proveedores': 'proveedores.json',
+        'catalogo': 'catalogo.jsonl',
+        'agregados_diarios': os.path.join(DIRECTORIO_VENTAS, 'agregados_diarios.json')
+    }
+    # Colecciones cuyos registros no cambian una vez creados: se anexan como líneas {clave: registro}
+    # y una venta no reescribe el archivo completo. Valor: archivo JSON que usaban antes
+    ANEXADAS = {'catalogo': 'catalogo.json'}
+
+    def __init__(self, modo_diario: bool = True, escritura_diferida: bool = True):
+        # Con escritura diferida los archivos se escriben desde un hilo, fuera del hilo de Tk
+        self.escritor = EscritorSegundoPlano() if escritura_diferida else None
+        # En modo diario cada venta se anexa a la partición de su mes (ventas/AAAA-MM.jsonl)
+        self.diario = HistorialParticionado(escritor=self.escritor) if modo_diario else None
+
+    def escribir(self, archivo: str, datos, inmediato: bool = False) -> None:
+        """Escribe un archivo JSON (en segundo plano salvo que se pida inmediato)"""
+        if self.escritor is None:
+            escribir_json_atomico(archivo, datos)
+        elif inmediato:
+            self.escritor.escribir_ahora(archivo, datos)
+        else:
+            self.escritor.marcar(archivo, datos)
+
+    def cargar(self, coleccion: str, archivo: str = None) -> Dict:
+        if coleccion in self.ANEXADAS and archivo is None:
+            return self.cargar_anexada(coleccion)
+        archivo = archivo or self.ARCHIVOS[coleccion]
+        self.flush()
+        if not os.path.exists(archivo):
+            return {}
+        with open(archivo, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def cargar_anexada(self, coleccion: str) -> Dict:
+        """Carga el archivo JSON anterior de la colección y le aplica las líneas anexadas"""
+        datos = {}
+        legado = self.ANEXADAS[coleccion]
+        if os.path.exists(legado):
+            with open(legado, 'r', encoding='utf-8') as f:
+                datos.update(json.load(f))
+        ruta = self.ARCHIVOS[coleccion]
+        if os.path.exists(ruta):
+            for registro in iterar_jsonl(ruta):
+                datos.update(registro)
+        return datos
+
+    def guardar(self, coleccion: str, datos: Dict, archivo: str = None) -> None:
+        if coleccion in self.ANEXADAS and archivo is None:
+            # Reescritura completa del JSONL, una línea por registro
+            ruta = self.ARCHIVOS[coleccion]
+            temporal = ruta + '.tmp'
+            with open(temporal, 'w', encoding='utf-8') as f:
+                for clave, registro in datos.items():
+                    f.write(json.dumps({clave: registro}, ensure_ascii=False, separators=(',', ':')) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporal, ruta)
+            return
+        self.escribir(archivo or self.ARCHIVOS[coleccion], datos)
+
+    def guardar_registros(self, coleccion: str, datos: Dict, claves: List[str],
+                          eliminados: List[str] = None, inmediato: bool = False) -> None:
+        if coleccion in self.ANEXADAS:
+            # Sólo se anexan los registros nuevos (unos bytes por versión, sin importar el tamaño del catálogo)
+            anexar_jsonl(self.ARCHIVOS[coleccion], [{clave: datos[clave]} for clave in claves if clave in datos])
+            return
+        # Un archivo JSON no admite cambios parciales: se reescribe completo
+        self.escribir(self.ARCHIVOS[coleccion], datos, inmediato)
+
+    def preparar_historial(self, archivo: str = 'ventas.json') -> None:
+        """Migra el historial a particiones mensuales si aún no lo está"""
+        exito, mensaje = self.diario.migrar(archivo)
+        if exito or mensaje.startswith("Error"):
+            print(mensaje)
+
+    def cargar_ventas(self, archivo: str = 'ventas.json') -> List[Dict]:
+        if self.diario:
+            self.preparar_historial(archivo)
+            return self.diario.cargar()
+
+        self.flush()
+        if not os.path.exists(archivo):
+            return []
+        with open(archivo, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def anexar_venta(self, venta: Dict, historial: List[Dict]) -> bool:
+        if self.diario:
+            return self.diario.anexar(venta)
+        try:
+            self.guardar_ventas(historial)
+            return True
+        except Exception as e:
+            print(f"Error al guardar ventas: {e}")
+            return False
+
+    def guardar_ventas(self, ventas: List[Dict], archivo: str = 'ventas.json') -> None:
+        if self.diario:
+            self.diario.escribir_particiones(ventas)
+            return
+        self.escribir(archivo, ventas)
+
+    def iterar_ventas(self, desde: str = None, hasta: str = None) -> Iterator[Dict]:
+        if not self.diario:
+            yield from super().iterar_ventas(desde, hasta)
+            return
+        self.preparar_historial()
+        yield from self.diario.iterar(desde, hasta)
+
+    def compactar_ventas(self, ventas: List[Dict]) -> Tuple[bool, str]:
+        if not self.diario:
+            return (False, "El historial no está en modo diario")
+        return self.diario.compactar()
+
+    def estadisticas_ventas(self) -> Optional[Dict[str, Dict]]:
+        if not self.diario:
+            return None
+        self.preparar_historial()
+        return self.diario.meses()
+
+    def cargar_ventas_mes(self, mes: str) -> List[Dict]:
+        return self.diario.cargar_mes(mes)
+
+    def flush(self, timeout: float = None) -> bool:
+        if self.escritor is None:
+            return True
+        return self.escritor.flush(timeout)
+
+    def obtener_metricas(self) -> Dict:
+        if self.escritor is None:
+            return {}
+        return self.escritor.obtener_metricas()
+
+
+class AlmacenamientoSQLite(Almacenamiento):
+    """Persistencia en una base SQLite (modo WAL) con cambios a nivel de registro"""
+    # Tabla, llave primaria y columnas indexadas adicionales de cada colección
+    TABLAS = {
+        'inventario': ('codigo_barras', ()),
+        'clientes': ('rfc', ()),
+        'proveedores': ('id_proveedor', ('rfc',)),
+        'catalogo': ('referencia', ()),
+        'agregados_diarios': ('dia', ()),
+    }
+    # Ventas leídas por consulta al recorrer el historial
+    TAMANO_PAGINA = 500
+
+    def __init__(self, archivo: str = ARCHIVO_BASE_DATOS):
+        self.archivo = archivo
+        es_nueva = not os.path.exists(archivo)
+        # La conexión se comparte entre hilos; el candado serializa su uso
+        self.conexion = sqlite3.connect(archivo, check_same_thread=False)
+        self.candado = threading.Lock()
+        self.crear_esquema()
+        if es_nueva:
+            self.importar_desde_json()
+
+    def crear_esquema(self) -> None:
+        """Crea las tablas e índices si no existen"""
+        with self.candado, self.conexion:
+            self.conexion.execute("PRAGMA journal_mode=WAL")
+            self.conexion.execute("PRAGMA synchronous=NORMAL")
+            for tabla, (llave, columnas) in self.TABLAS.items():
+                extras = ''.join(f", {col} TEXT" for col in columnas)
+                self.conexion.execute(
+                    f"CREATE TABLE IF NOT EXISTS {tabla} ({llave} TEXT PRIMARY KEY{extras}, datos TEXT NOT NULL)"
+                )
+                for col in columnas:
+                    self.conexion.execute(
+                        f"CREATE INDEX IF NOT EXISTS idx_{tabla}_{col} ON {tabla} ({col})"
+                    )
+            self.conexion.execute(
+                "CREATE TABLE IF NOT EXISTS ventas (folio INTEGER PRIMARY KEY, fecha TEXT, datos TEXT NOT NULL)"
+            )
+            self.conexion.execute("CREATE INDEX IF NOT EXISTS idx_ventas_fecha ON ventas (fecha)")
+
+    def importar_desde_json(self) -> None:
+        """Importa (una sola vez) los datos existentes en archivos JSON a la base nueva"""
+        origen = AlmacenamientoJSON(escritura_diferida=False)
+        try:
+            for coleccion in self.TABLAS:
+                datos = origen.cargar(coleccion)
+                if datos:
+                    self.guardar(coleccion, datos)
+            # Se leen las particiones, el diario único o ventas.json directamente, sin migrar archivos
+            if origen.diario.existe():
+                ventas = origen.diario.cargar()
+            elif DiarioVentas().existe():
+                ventas = DiarioVentas().cargar()
+            else:
+                ventas = AlmacenamientoJSON(modo_diario=False, escritura_diferida=False).cargar_ventas()
+            if ventas:
+                self.guardar_ventas(ventas)
+        except Exception as e:
+            print(f"Error al importar datos JSON a SQLite: {e}")
+
+    def fila(self, coleccion: str, clave: str, registro: Dict) -> tuple:
+        """Convierte un registro en la tupla de columnas de su tabla"""
+        _, columnas = self.TABLAS[coleccion]
+        extras = tuple(registro.get(col, '') for col in columnas)
+        return (clave,) + extras + (json.dumps(registro, ensure_ascii=False),)
+
+    def sentencia_upsert(self, coleccion: str) -> str:
+        """Sentencia INSERT ... ON CONFLICT para la tabla de la colección"""
+        llave, columnas = self.TABLAS[coleccion]
+        nombres = (llave,) + tuple(columnas) + ('datos',)
+        marcas = ', '.join('?' for _ in nombres)
+        actualizar = ', '.join(f"{col} = excluded.{col}" for col in nombres[1:])
+        return (f"INSERT INTO {coleccion} ({', '.join(nombres)}) VALUES ({marcas}) "
+                f"ON CONFLICT({llave}) DO UPDATE SET {actualizar}")
+
+    def cargar(self, coleccion: str, archivo: str = None) -> Dict:
+        llave, _ = self.TABLAS[coleccion]
+        with self.candado:
+            filas = self.conexion.execute(
+                f"SELECT {llave}, datos FROM {coleccion} ORDER BY rowid"
+            ).fetchall()
+        return {clave: json.loads(datos) for clave, datos in filas}
+
+    def guardar(self, coleccion: str, datos: Dict, archivo: str = None) -> None:
+        sentencia = self.sentencia_upsert(coleccion)
+        with self.candado, self.conexion:
+            self.conexion.execute(f"DELETE FROM {coleccion}")
+            self.conexion.executemany(
+                sentencia, (self.fila(coleccion, clave, registro) for clave, registro in datos.items())
+            )
+
+    def guardar_registros(self, coleccion: str, datos: Dict, claves: List[str],
+                          eliminados: List[str] = None, inmediato: bool = False) -> None:
+        llave, _ = self.TABLAS[coleccion]
+        sentencia = self.sentencia_upsert(coleccion)
+        with self.candado, self.conexion:
+            self.conexion.executemany(
+                sentencia, (self.fila(coleccion, clave, datos[clave]) for clave in claves if clave in datos)
+            )
+            if eliminados:
+                self.conexion.executemany(
+                    f"DELETE FROM {coleccion} WHERE {llave} = ?", ((clave,) for clave in eliminados)
+                )
+
+    def cargar_ventas(self, archivo: str = None) -> List[Dict]:
+        with self.candado:
+            filas = self.conexion.execute("SELECT datos FROM ventas ORDER BY folio").fetchall()
+        return [json.loads(datos) for (datos,) in filas]
+
+    def anexar_venta(self, venta: Dict, historial: List[Dict]) -> bool:
+        try:
+            with self.candado, self.conexion:
+                # INSERT simple: un folio repetido no debe reemplazar una venta ya guardada
+                self.conexion.execute(
+                    "INSERT INTO ventas (folio, fecha, datos) VALUES (?, ?, ?)",
+                    (venta.get('folio'), venta.get('fecha', ''), json.dumps(venta, ensure_ascii=False))
+                )
+            return True
+        except sqlite3.IntegrityError:
+            print(f"Error al guardar venta en SQLite: el folio {venta.get('folio')} ya existe")
+            return False
+        except Exception as e:
+            print(f"Error al guardar venta en SQLite: {e}")
+            return False
+
+    def guardar_ventas(self, ventas: List[Dict], archivo: str = None) -> None:
+        with self.candado, self.conexion:
+            self.conexion.execute("DELETE FROM ventas")
+            self.conexion.executemany(
+                "INSERT OR REPLACE INTO ventas (folio, fecha, datos) VALUES (?, ?, ?)",
+                ((v.get('folio'), v.get('fecha', ''), json.dumps(v, ensure_ascii=False)) for v in ventas)
+            )
+
+    def compactar_ventas(self, ventas: List[Dict]) -> Tuple[bool, str]:
+        try:
+            with self.candado:
+                self.conexion.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            return (True, "Base de datos compactada")
+        except Exception as e:
+            return (False, f"Error al compactar base de datos: {str(e)}")
+
+    def buscar_ventas_por_fecha(self, fecha: str) -> Optional[List[Dict]]:
+        # Rango [fecha, fecha + U+FFFF) para aprovechar el índice sobre fecha
+        with self.candado:
+            filas = self.conexion.execute(
+                "SELECT datos FROM ventas WHERE fecha >= ? AND fecha < ? ORDER BY folio",
+                (fecha, fecha + '\uffff')
+            ).fetchall()
+        return [json.loads(datos) for (datos,) in filas]
+
+    # Expresión del mes de una venta, equivalente a mes_de_venta()
+    EXPRESION_MES = (f"CASE WHEN fecha GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]*' "
+                     f"THEN substr(fecha, 1, 7) ELSE '{MES_SIN_FECHA}' END")
+
+    def estadisticas_ventas(self) -> Optional[Dict[str, Dict]]:
+        with self.candado:
+            filas = self.conexion.execute(
+                f"SELECT {self.EXPRESION_MES} AS mes, COUNT(*), MIN(folio), MAX(folio) FROM ventas GROUP BY mes"
+            ).fetchall()
+        return {
+            mes: {'ventas': cantidad, 'primer_folio': primero, 'ultimo_folio': ultimo}
+            for mes, cantidad, primero, ultimo in filas
+        }
+
+    def iterar_ventas(self, desde: str = None, hasta: str = None) -> Iterator[Dict]:
+        # Páginas por folio: el candado se libera entre páginas y no se bloquea a quien registra ventas
+        condiciones, parametros = ["folio > ?"], []
+        if desde:
+            condiciones.append("fecha >= ?")
+            parametros.append(desde)
+        if hasta:
+            condiciones.append("fecha < ?")
+            parametros.append(hasta + '\uffff')
+        consulta = f"SELECT folio, datos FROM ventas WHERE {' AND '.join(condiciones)} ORDER BY folio LIMIT ?"
+        ultimo = -1
+        while True:
+            with self.candado:
+                filas = self.conexion.execute(consulta, [ultimo] + parametros + [self.TAMANO_PAGINA]).fetchall()
+            for folio, datos in filas:
+                yield json.loads(datos)
+            if len(filas) < self.TAMANO_PAGINA:
+                return
+            ultimo = filas[-1][0]
+
+    def cargar_ventas_mes(self, mes: str) -> List[Dict]:
+        if mes == MES_SIN_FECHA:
+            consulta, parametros = f"SELECT datos FROM ventas WHERE {self.EXPRESION_MES} = ? ORDER BY folio", (mes,)
+        else:
+            consulta, parametros = "SELECT datos FROM ventas WHERE fecha >= ? AND fecha < ? ORDER BY folio", (mes, mes + '\uffff')
+        with self.candado:
+            filas = self.conexion.execute(consulta, parametros).fetchall()
+        return [json.loads(datos) for (datos,) in filas]
+
+
+_almacenamiento_compartido = None
+
+
+def obtener_almacenamiento() -> Almacenamiento:
+    """Retorna el almacenamiento configurado, compartido por todos los gestores"""
+    global _almacenamiento_compartido
+    if _almacenamiento_compartido is None:
+        if BACKEND_ALMACENAMIENTO == 'sqlite':
+            _almacenamiento_compartido = AlmacenamientoSQLite(ARCHIVO_BASE_DATOS)
+        else:
+            _almacenamiento_compartido = AlmacenamientoJSON()
+    return _almacenamiento_compartido
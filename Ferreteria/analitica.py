@@ -0,0 +1,187 @@
+# analitica.py - Líneas de venta en columnas NumPy para reportes agrupados
+
+from typing import Dict, List, Tuple
+import numpy as np
+
+import dinero
+from catalogo import obtener_catalogo
+
+
+# Columnas numéricas por línea de venta; los textos se guardan como códigos de diccionario
+COLUMNAS = {
+    'folio': np.int64,
+    'tiempo': 'datetime64[s]',
+    'sku': np.int32,
+    'clasificacion': np.int32,
+    'proveedor': np.int32,
+    'cantidad': np.int64,
+    'precio': np.int64,     # centavos
+    'costo': np.int64,      # centavos
+}
+CAPACIDAD_INICIAL = 1024
+
+
+class Diccionario:
+    """Codificación de textos a enteros consecutivos"""
+    def __init__(self):
+        self.valores = []
+        self.codigos = {}
+
+    def codificar(self, valor: str) -> int:
+        codigo = self.codigos.get(valor)
+        if codigo is None:
+            codigo = self.codigos[valor] = len(self.valores)
+            self.valores.append(valor)
+        return codigo
+
+    def __len__(self) -> int:
+        return len(self.valores)
+
+
+class AnaliticaVentas:
+    """Historial de líneas de venta en arreglos columnares, ampliable venta por venta"""
+    def __init__(self):
+        self.tamano = 0
+        self.columnas = {nombre: np.empty(CAPACIDAD_INICIAL, dtype=tipo) for nombre, tipo in COLUMNAS.items()}
+        self.skus = Diccionario()
+        self.nombres = {}
+        self.clasificaciones = Diccionario()
+        self.proveedores = Diccionario()
+
+    def reservar(self, adicionales: int) -> None:
+        """Amplía la capacidad (al doble) si no caben las líneas nuevas"""
+        necesario = self.tamano + adicionales
+        capacidad = len(self.columnas['folio'])
+        if necesario <= capacidad:
+            return
+        while capacidad < necesario:
+            capacidad *= 2
+        for nombre, arreglo in self.columnas.items():
+            nuevo = np.empty(capacidad, dtype=arreglo.dtype)
+            nuevo[:self.tamano] = arreglo[:self.tamano]
+            self.columnas[nombre] = nuevo
+
+    def columna(self, nombre: str) -> np.ndarray:
+        return self.columnas[nombre][:self.tamano]
+
+    def agregar_ventas(self, ventas: List[Dict]) -> None:
+        """Agrega las líneas de varias ventas en un solo bloque"""
+        filas = {nombre: [] for nombre in COLUMNAS}
+        catalogo = obtener_catalogo()
+        # Los precios se repiten mucho: cada importe distinto se convierte a centavos una sola vez
+        centavos = {}
+
+        def a_centavos(valor) -> int:
+            resultado = centavos.get(valor)
+            if resultado is None:
+                resultado = centavos[valor] = dinero.a_centavos(valor)
+            return resultado
+
+        for venta in ventas:
+            folio = venta.get('folio', 0) if isinstance(venta.get('folio'), int) else 0
+            fecha = venta.get('fecha') or ''
+            tiempo = fecha.replace(' ', 'T') if fecha else 'NaT'
+            for linea in venta.get('productos', []):
+                codigo_barras = linea.get('codigo_barras', '')
+                # Las líneas compactas toman clasificación y proveedor de su versión del catálogo
+                ficha = catalogo.resolver(codigo_barras, linea['version']) if 'version' in linea else linea
+                sku = self.skus.codificar(codigo_barras)
+                self.nombres[sku] = linea.get('nombre', '')
+                filas['folio'].append(folio)
+                filas['tiempo'].append(tiempo)
+                filas['sku'].append(sku)
+                filas['clasificacion'].append(self.clasificaciones.codificar(ficha.get('clasificacion', '') or ''))
+                filas['proveedor'].append(self.proveedores.codificar(ficha.get('proveedor', '') or ''))
+                filas['cantidad'].append(linea.get('cantidad', 0) or 0)
+                filas['precio'].append(a_centavos(linea.get('precio_aplicado', linea.get('precio', 0))))
+                filas['costo'].append(a_centavos(linea.get('costo', 0)))
+
+        cantidad = len(filas['folio'])
+        if not cantidad:
+            return
+        self.reservar(cantidad)
+        inicio, fin = self.tamano, self.tamano + cantidad
+        for nombre, valores in filas.items():
+            self.columnas[nombre][inicio:fin] = np.array(valores, dtype=COLUMNAS[nombre])
+        self.tamano = fin
+
+    def agregar_venta(self, venta: Dict) -> None:
+        self.agregar_ventas([venta])
+
+    def filtro(self, desde: str = None, hasta: str = None) -> np.ndarray:
+        """Máscara de las líneas con fecha entre desde y hasta (AAAA-MM-DD, inclusive)"""
+        tiempo = self.columna('tiempo')
+        mascara = np.ones(self.tamano, dtype=bool)
+        if desde:
+            mascara &= tiempo >= np.datetime64(desde, 's')
+        if hasta:
+            mascara &= tiempo < np.datetime64(hasta, 'D') + np.timedelta64(1, 'D')
+        return mascara
+
+    def importes(self) -> np.ndarray:
+        """Importe de cada línea en centavos"""
+        return self.columna('precio') * self.columna('cantidad')
+
+    def costos(self) -> np.ndarray:
+        return self.columna('costo') * self.columna('cantidad')
+
+    @staticmethod
+    def sumar_por(codigos: np.ndarray, valores: np.ndarray, mascara: np.ndarray, grupos: int) -> np.ndarray:
+        """Suma de valores enteros por código (bincount acumula en float64: exacto hasta 2**53 centavos)"""
+        suma = np.bincount(codigos[mascara], weights=valores[mascara], minlength=grupos)
+        return np.rint(suma).astype(np.int64)
+
+    def mas_vendidos(self, n: int = 10, por: str = 'unidades', desde: str = None, hasta: str = None) -> List[Dict]:
+        """Productos con más unidades (o importe) vendidos"""
+        mascara = self.filtro(desde, hasta)
+        sku = self.columna('sku')
+        unidades = self.sumar_por(sku, self.columna('cantidad'), mascara, len(self.skus))
+        importe = self.sumar_por(sku, self.importes(), mascara, len(self.skus))
+        orden = unidades if por == 'unidades' else importe
+        n = min(n, int(np.count_nonzero(orden)))
+        if n <= 0:
+            return []
+        mejores = np.argpartition(-orden, n - 1)[:n]
+        mejores = mejores[np.argsort(-orden[mejores], kind='stable')]
+        return [{
+            'codigo_barras': self.skus.valores[i],
+            'nombre': self.nombres.get(int(i), ''),
+            'unidades': int(unidades[i]),
+            'importe': dinero.a_pesos(int(importe[i]))
+        } for i in mejores]
+
+    def ingresos_por(self, campo: str, desde: str = None, hasta: str = None) -> List[Dict]:
+        """Importe, costo y margen por clasificación o proveedor, de mayor a menor importe"""
+        diccionario = {'clasificacion': self.clasificaciones, 'proveedor': self.proveedores}[campo]
+        mascara = self.filtro(desde, hasta)
+        codigos = self.columna(campo)
+        importe = self.sumar_por(codigos, self.importes(), mascara, len(diccionario))
+        costo = self.sumar_por(codigos, self.costos(), mascara, len(diccionario))
+        orden = np.argsort(-importe, kind='stable')
+        return [{
+            campo: diccionario.valores[i] or 'Sin asignar',
+            'importe': dinero.a_pesos(int(importe[i])),
+            'costo': dinero.a_pesos(int(costo[i])),
+            'margen': dinero.a_pesos(int(importe[i] - costo[i]))
+        } for i in orden if importe[i] or costo[i]]
+
+    def margen(self, desde: str = None, hasta: str = None) -> Dict:
+        """Importe, costo y margen del periodo"""
+        mascara = self.filtro(desde, hasta)
+        importe = int(self.importes()[mascara].sum())
+        costo = int(self.costos()[mascara].sum())
+        return {
+            'importe': dinero.a_pesos(importe),
+            'costo': dinero.a_pesos(costo),
+            'margen': dinero.a_pesos(importe - costo),
+            'porcentaje': round((importe - costo) * 100 / importe, 2) if importe else 0.0
+        }
+
+    def por_hora(self, desde: str = None, hasta: str = None) -> List[Tuple[int, int, float]]:
+        """(hora, líneas, importe) para cada hora del día con ventas"""
+        tiempo = self.columna('tiempo')
+        mascara = self.filtro(desde, hasta) & ~np.isnat(tiempo)
+        horas = (tiempo[mascara].astype(np.int64) // 3600) % 24
+        lineas = np.bincount(horas, minlength=24)
+        importe = np.rint(np.bincount(horas, weights=self.importes()[mascara], minlength=24)).astype(np.int64)
+        return [(hora, int(lineas[hora]), dinero.a_pesos(int(importe[hora]))) for hora in range(24) if lineas[hora]]
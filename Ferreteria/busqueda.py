@@ -0,0 +1,527 @@
+# busqueda.py - Índices en memoria para la búsqueda de productos
+
+from bisect import bisect_right
+from collections import Counter, OrderedDict
+from itertools import islice
+from operator import itemgetter
+from typing import Callable, List, Dict, Iterable, Optional, Tuple
+import heapq
+import math
+import re
+import unicodedata
+
+
+# Secuencias de letras y dígitos; un fragmento de la consulta sin separadores
+# siempre queda dentro de una sola de estas palabras del texto buscado
+PATRON_TOKEN = re.compile(r'\w+')
+
+
+class IndiceProductos:
+    """Índice invertido de palabras sobre los campos descriptivos de los productos"""
+    CAMPOS = ('nombre', 'descripcion', 'clasificacion', 'fabricante', 'tipo')
+
+    def __init__(self):
+        self.textos = {}      # codigo_barras -> textos en minúsculas de cada campo
+        self.posicion = {}    # codigo_barras -> orden de alta (el mismo del inventario)
+        self.tokens = {}      # codigo_barras -> palabras del producto
+        self.listas = {}      # palabra -> códigos de barras que la contienen
+        self.siguiente_posicion = 0
+        # Vocabulario concatenado para buscar fragmentos de palabra con str.find
+        self.vocabulario = []
+        self.inicios = []
+        self.texto_vocabulario = ''
+        self.vocabulario_vigente = False
+        # Cambia con cada modificación; las sesiones de búsqueda la usan para invalidarse
+        self.version = 0
+
+    def construir(self, productos: Dict[str, Dict]) -> None:
+        """Reconstruye el índice completo a partir del inventario"""
+        version = self.version
+        self.__init__()
+        self.version = version + 1
+        for codigo_barras, producto in productos.items():
+            self.agregar(codigo_barras, producto)
+
+    def textos_producto(self, producto: Dict) -> tuple:
+        return tuple(str(producto.get(campo) or '').lower() for campo in self.CAMPOS)
+
+    def agregar(self, codigo_barras: str, producto: Dict) -> None:
+        """Indexa un producto nuevo o reemplaza el índice de uno existente"""
+        self.version += 1
+        if codigo_barras in self.textos:
+            self.quitar_tokens(codigo_barras)
+        else:
+            self.posicion[codigo_barras] = self.siguiente_posicion
+            self.siguiente_posicion += 1
+
+        textos = self.textos_producto(producto)
+        tokens = set()
+        for texto in textos:
+            tokens.update(PATRON_TOKEN.findall(texto))
+        self.textos[codigo_barras] = textos
+        self.tokens[codigo_barras] = tokens
+        for token in tokens:
+            lista = self.listas.get(token)
+            if lista is None:
+                self.listas[token] = {codigo_barras}
+                self.vocabulario_vigente = False
+            else:
+                lista.add(codigo_barras)
+
+    def eliminar(self, codigo_barras: str) -> None:
+        """Quita un producto del índice"""
+        if codigo_barras not in self.textos:
+            return
+        self.version += 1
+        self.quitar_tokens(codigo_barras)
+        del self.textos[codigo_barras]
+        del self.tokens[codigo_barras]
+        del self.posicion[codigo_barras]
+
+    def quitar_tokens(self, codigo_barras: str) -> None:
+        for token in self.tokens[codigo_barras]:
+            lista = self.listas[token]
+            lista.discard(codigo_barras)
+            if not lista:
+                del self.listas[token]
+                self.vocabulario_vigente = False
+
+    def actualizar_vocabulario(self) -> None:
+        """Regenera el vocabulario concatenado si cambiaron las palabras indexadas"""
+        if self.vocabulario_vigente:
+            return
+        self.vocabulario = list(self.listas)
+        self.inicios = []
+        posicion = 0
+        for token in self.vocabulario:
+            self.inicios.append(posicion)
+            posicion += len(token) + 1
+        self.texto_vocabulario = '\n'.join(self.vocabulario)
+        self.vocabulario_vigente = True
+
+    def tokens_con(self, fragmento: str) -> List[str]:
+        """Palabras del vocabulario que contienen el fragmento"""
+        self.actualizar_vocabulario()
+        encontrados = []
+        inicio = self.texto_vocabulario.find(fragmento)
+        while inicio != -1:
+            indice = bisect_right(self.inicios, inicio) - 1
+            encontrados.append(self.vocabulario[indice])
+            # Continuar desde la siguiente palabra para no repetir esta
+            if indice + 1 >= len(self.inicios):
+                break
+            inicio = self.texto_vocabulario.find(fragmento, self.inicios[indice + 1])
+        return encontrados
+
+    def candidatos(self, consulta: str) -> Iterable[str]:
+        """Códigos que podrían contener la consulta (ya en minúsculas)"""
+        fragmentos = PATRON_TOKEN.findall(consulta)
+        if not fragmentos:
+            return self.textos
+        # El fragmento más largo es el más selectivo
+        fragmento = max(fragmentos, key=len)
+        resultado = set()
+        for token in self.tokens_con(fragmento):
+            resultado.update(self.listas[token])
+        return resultado
+
+    def coincide(self, codigo_barras: str, consulta: str) -> bool:
+        """Indica si algún campo del producto contiene la consulta (ya en minúsculas)"""
+        return any(consulta in texto for texto in self.textos[codigo_barras])
+
+    def buscar(self, consulta: str) -> List[str]:
+        """Códigos de barras cuyos campos contienen la consulta, en el orden del inventario"""
+        consulta = consulta.lower()
+        candidatos = self.candidatos(consulta)
+        encontrados = [cb for cb in candidatos if self.coincide(cb, consulta)]
+        if candidatos is not self.textos:
+            encontrados.sort(key=self.posicion.__getitem__)
+        return encontrados
+
+    def clave_relevancia(self, consulta: str) -> Callable[[str], tuple]:
+        """Clave de orden por relevancia (menor es mejor): campo, inicio de palabra y largo del texto"""
+        consulta = consulta.lower()
+
+        def clave(codigo_barras: str) -> tuple:
+            for campo, texto in enumerate(self.textos[codigo_barras]):
+                inicio = texto.find(consulta)
+                if inicio != -1:
+                    if inicio == 0:
+                        tipo = 0
+                    elif not texto[inicio - 1].isalnum():
+                        tipo = 1
+                    else:
+                        tipo = 2
+                    return (campo, tipo, len(texto))
+            return (len(self.CAMPOS), 0, 0)
+        return clave
+
+    def buscar_top_k(self, consulta: str, k: int, clave: Callable = None) -> List[str]:
+        """Los k mejores resultados según la clave; sin clave, los primeros k en orden de inventario"""
+        consulta = consulta.lower()
+        candidatos = self.candidatos(consulta)
+        if candidatos is not self.textos:
+            candidatos = sorted(candidatos, key=self.posicion.__getitem__)
+        coincidencias = (cb for cb in candidatos if self.coincide(cb, consulta))
+        return seleccionar_top_k(coincidencias, k, clave)
+
+
+def seleccionar_top_k(codigos: Iterable[str], k: int, clave: Callable = None) -> List[str]:
+    """Toma los k primeros códigos (se detiene al juntarlos) o los k menores según la clave"""
+    if clave is None:
+        return list(islice(codigos, k))
+    # Montículo acotado a k elementos; los empates conservan el orden de entrada
+    return heapq.nsmallest(k, codigos, key=clave)
+
+
+class SesionBusqueda:
+    """Búsqueda incremental para el autocompletado: reutiliza los resultados de la consulta anterior"""
+    def __init__(self, indice: IndiceProductos, capacidad_cache: int = 64):
+        self.indice = indice
+        self.capacidad_cache = capacidad_cache
+        self.cache = OrderedDict()  # consulta -> códigos de barras (las más recientes al final)
+        self.consulta_anterior = None
+        self.resultados_anteriores = []
+        self.version = indice.version
+        self.estadisticas = {'cache': 0, 'refinadas': 0, 'indice': 0}
+
+    def reiniciar(self) -> None:
+        """Descarta la consulta anterior y las consultas recientes"""
+        self.cache.clear()
+        self.consulta_anterior = None
+        self.resultados_anteriores = []
+        self.version = self.indice.version
+
+    def buscar(self, consulta: str) -> List[str]:
+        """Códigos de barras que coinciden con la consulta, en el orden del inventario"""
+        consulta = consulta.lower()
+        # Si el inventario cambió, los resultados guardados ya no son válidos
+        if self.version != self.indice.version:
+            self.reiniciar()
+
+        if consulta in self.cache:
+            self.cache.move_to_end(consulta)
+            resultados = self.cache[consulta]
+            self.estadisticas['cache'] += 1
+        elif self.consulta_anterior is not None and self.consulta_anterior in consulta:
+            # Todo lo que contiene la consulta nueva contiene también la anterior
+            resultados = [cb for cb in self.resultados_anteriores if self.indice.coincide(cb, consulta)]
+            self.estadisticas['refinadas'] += 1
+        else:
+            # Borrado o edición en medio del texto: se vuelve al índice
+            resultados = self.indice.buscar(consulta)
+            self.estadisticas['indice'] += 1
+
+        self.cache[consulta] = resultados
+        if len(self.cache) > self.capacidad_cache:
+            self.cache.popitem(last=False)
+        self.consulta_anterior = consulta
+        self.resultados_anteriores = resultados
+        return list(resultados)
+
+    def buscar_top_k(self, consulta: str, k: int, clave: Callable = None) -> List[str]:
+        """Los k mejores resultados de la consulta según la clave (ver IndiceProductos.buscar_top_k)"""
+        return seleccionar_top_k(iter(self.buscar(consulta)), k, clave)
+
+
+class IndiceCodigos:
+    """Índices hash de los códigos alternos de los productos"""
+    CAMPOS = ('codigo', 'numero_producto', 'codigoA', 'codigoB', 'codigoC')
+
+    def __init__(self):
+        self.indices = {campo: {} for campo in self.CAMPOS}  # campo -> código -> códigos de barras
+        self.valores = {}     # codigo_barras -> ((campo, código), ...)
+        self.posicion = {}
+        self.siguiente_posicion = 0
+
+    def construir(self, productos: Dict[str, Dict]) -> Dict:
+        """Reconstruye los índices y retorna los códigos repetidos entre productos"""
+        self.__init__()
+        for codigo_barras, producto in productos.items():
+            self.agregar(codigo_barras, producto)
+        return self.buscar_duplicados()
+
+    def agregar(self, codigo_barras: str, producto: Dict) -> None:
+        """Indexa los códigos de un producto nuevo o modificado"""
+        if codigo_barras in self.valores:
+            self.quitar_valores(codigo_barras)
+        else:
+            self.posicion[codigo_barras] = self.siguiente_posicion
+            self.siguiente_posicion += 1
+
+        valores = tuple((campo, producto.get(campo)) for campo in self.CAMPOS
+                        if producto.get(campo) not in (None, ''))
+        self.valores[codigo_barras] = valores
+        for campo, valor in valores:
+            self.indices[campo].setdefault(valor, set()).add(codigo_barras)
+
+    def eliminar(self, codigo_barras: str) -> None:
+        """Quita los códigos de un producto"""
+        if codigo_barras not in self.valores:
+            return
+        self.quitar_valores(codigo_barras)
+        del self.valores[codigo_barras]
+        del self.posicion[codigo_barras]
+
+    def quitar_valores(self, codigo_barras: str) -> None:
+        for campo, valor in self.valores[codigo_barras]:
+            codigos = self.indices[campo][valor]
+            codigos.discard(codigo_barras)
+            if not codigos:
+                del self.indices[campo][valor]
+
+    def buscar(self, codigo: str) -> Optional[str]:
+        """Código de barras del primer producto (en orden de inventario) con ese código en cualquier campo"""
+        candidatos = [cb for indice in self.indices.values() for cb in indice.get(codigo, ())]
+        if not candidatos:
+            return None
+        return min(candidatos, key=self.posicion.__getitem__)
+
+    def buscar_por_campo(self, campo: str, codigo: str) -> List[str]:
+        """Códigos de barras de los productos con ese código en el campo indicado"""
+        return sorted(self.indices[campo].get(codigo, ()), key=self.posicion.__getitem__)
+
+    def buscar_duplicados(self) -> Dict:
+        """Códigos que aparecen en más de un producto, con los códigos de barras que los comparten"""
+        por_codigo = {}
+        for indice in self.indices.values():
+            for valor, codigos in indice.items():
+                por_codigo.setdefault(valor, set()).update(codigos)
+        return {valor: sorted(codigos, key=self.posicion.__getitem__)
+                for valor, codigos in por_codigo.items() if len(codigos) > 1}
+
+
+# Palabras equivalentes en el mostrador (se buscan unas por otras)
+GRUPOS_SINONIMOS = [
+    ('desarmador', 'destornillador'),
+    ('apagador', 'interruptor'),
+    ('contacto', 'enchufe', 'tomacorriente'),
+    ('foco', 'bombilla', 'lampara'),
+    ('pegamento', 'adhesivo'),
+    ('taquete', 'ancla'),
+]
+
+# Parámetros de BM25 y pesos de cada tipo de coincidencia
+K1 = 1.2
+B = 0.75
+PESOS_CAMPOS = {'nombre': 2.0, 'descripcion': 1.0, 'clasificacion': 1.0, 'fabricante': 1.0, 'tipo': 1.0}
+PESO_SINONIMO = 0.9
+PESO_PREFIJO = 0.8
+PESO_DIFUSO = 0.7
+PESO_POPULARIDAD = 0.1
+DISTANCIA_MAXIMA = 2
+LIMITE_PREFIJOS = 50
+LIMITE_PREFIJOS_CORTOS = 10  # prefijos de dos letras: coinciden con demasiadas palabras
+LIMITE_CANDIDATOS_DIFUSOS = 200
+
+
+def normalizar(texto) -> str:
+    """Minúsculas sin acentos ('Ángulo' -> 'angulo')"""
+    texto = str(texto or '').lower()
+    if texto.isascii():
+        return texto
+    return ''.join(c for c in unicodedata.normalize('NFKD', texto) if not unicodedata.combining(c))
+
+
+def trigramas(termino: str) -> set:
+    relleno = f"${termino}$"
+    return {relleno[i:i + 3] for i in range(len(relleno) - 2)}
+
+
+def distancia_edicion(a: str, b: str, maximo: int) -> int:
+    """Distancia de Levenshtein; retorna maximo + 1 en cuanto se sabe que la supera"""
+    if abs(len(a) - len(b)) > maximo:
+        return maximo + 1
+    anterior = list(range(len(b) + 1))
+    for i, ca in enumerate(a, start=1):
+        actual = [i]
+        for j, cb in enumerate(b, start=1):
+            actual.append(min(anterior[j] + 1, actual[j - 1] + 1, anterior[j - 1] + (ca != cb)))
+        if min(actual) > maximo:
+            return maximo + 1
+        anterior = actual
+    return anterior[-1]
+
+
+def techo_distancia(termino: str) -> int:
+    """Errores de escritura tolerados según el largo de la palabra"""
+    if len(termino) < 4:
+        return 0
+    return min(DISTANCIA_MAXIMA, 1 if len(termino) <= 5 else 2)
+
+
+class BuscadorDifuso:
+    """Búsqueda tolerante a errores y acentos, ordenada por BM25 y popularidad de venta"""
+    def __init__(self, grupos_sinonimos: List[tuple] = None):
+        self.terminos = {}    # codigo_barras -> palabras del producto
+        self.largo = {}       # codigo_barras -> largo ponderado del producto
+        self.largo_total = 0.0
+        self.largo_promedio = 0.0
+        # palabra -> {codigo_barras: parte de BM25 que depende de la frecuencia y el largo}
+        self.listas = {}
+        self.trigramas = {}   # trigrama -> palabras que lo contienen
+        self.vocabulario_ordenado = []
+        self.vocabulario_vigente = False
+        self.popularidad = {}  # codigo_barras -> unidades vendidas
+        self.sinonimos = {}
+        for grupo in (GRUPOS_SINONIMOS if grupos_sinonimos is None else grupos_sinonimos):
+            for palabra in grupo:
+                self.sinonimos[normalizar(palabra)] = tuple(normalizar(p) for p in grupo if p != palabra)
+
+    @staticmethod
+    def frecuencias(producto: Dict) -> Dict[str, float]:
+        """Frecuencia de cada palabra del producto, ponderada por campo"""
+        frecuencias = {}
+        for campo, peso in PESOS_CAMPOS.items():
+            for termino in PATRON_TOKEN.findall(normalizar(producto.get(campo))):
+                frecuencias[termino] = frecuencias.get(termino, 0) + peso
+        return frecuencias
+
+    def construir(self, productos: Dict[str, Dict]) -> None:
+        """Reconstruye el índice conservando la popularidad y los sinónimos"""
+        for codigo_barras in list(self.terminos):
+            self.eliminar(codigo_barras)
+        por_producto = {cb: self.frecuencias(producto) for cb, producto in productos.items()}
+        if por_producto:
+            self.largo_promedio = sum(sum(f.values()) for f in por_producto.values()) / len(por_producto)
+        for codigo_barras, frecuencias in por_producto.items():
+            self.insertar(codigo_barras, frecuencias)
+
+    def agregar(self, codigo_barras: str, producto: Dict) -> None:
+        """Indexa un producto nuevo o modificado"""
+        self.eliminar(codigo_barras)
+        self.insertar(codigo_barras, self.frecuencias(producto))
+
+    def insertar(self, codigo_barras: str, frecuencias: Dict[str, float]) -> None:
+        largo = sum(frecuencias.values())
+        self.terminos[codigo_barras] = tuple(frecuencias)
+        self.largo[codigo_barras] = largo
+        self.largo_total += largo
+        # El largo promedio se fija al construir; las altas sueltas usan el promedio vigente
+        if not self.largo_promedio:
+            self.largo_promedio = largo or 1.0
+        normal = K1 * (1 - B + B * largo / self.largo_promedio)
+        for termino, frecuencia in frecuencias.items():
+            lista = self.listas.get(termino)
+            if lista is None:
+                lista = self.listas[termino] = {}
+                for trigrama in trigramas(termino):
+                    self.trigramas.setdefault(trigrama, set()).add(termino)
+                self.vocabulario_vigente = False
+            lista[codigo_barras] = frecuencia * (K1 + 1) / (frecuencia + normal)
+
+    def eliminar(self, codigo_barras: str) -> None:
+        """Quita un producto del índice"""
+        if codigo_barras not in self.terminos:
+            return
+        for termino in self.terminos.pop(codigo_barras):
+            lista = self.listas[termino]
+            del lista[codigo_barras]
+            if not lista:
+                del self.listas[termino]
+                for trigrama in trigramas(termino):
+                    self.trigramas[trigrama].discard(termino)
+                self.vocabulario_vigente = False
+        self.largo_total -= self.largo.pop(codigo_barras)
+
+    def registrar_venta(self, codigo_barras: str, cantidad) -> None:
+        """Suma unidades vendidas a la popularidad de un producto"""
+        self.popularidad[codigo_barras] = self.popularidad.get(codigo_barras, 0) + cantidad
+
+    def fijar_popularidad(self, popularidad: Dict[str, float]) -> None:
+        """Reemplaza la popularidad por las unidades vendidas de cada producto"""
+        self.popularidad = dict(popularidad)
+
+    def terminos_con_prefijo(self, prefijo: str) -> List[str]:
+        if not self.vocabulario_vigente:
+            self.vocabulario_ordenado = sorted(self.listas)
+            self.vocabulario_vigente = True
+        inicio = bisect_right(self.vocabulario_ordenado, prefijo)
+        limite = LIMITE_PREFIJOS if len(prefijo) > 2 else LIMITE_PREFIJOS_CORTOS
+        encontrados = []
+        for termino in islice(self.vocabulario_ordenado, inicio, inicio + limite):
+            if not termino.startswith(prefijo):
+                break
+            encontrados.append(termino)
+        return encontrados
+
+    def terminos_parecidos(self, termino: str) -> Dict[str, int]:
+        """Palabras del vocabulario a no más de techo_distancia() ediciones"""
+        maximo = techo_distancia(termino)
+        if not maximo:
+            return {}
+        coincidencias = Counter()
+        for trigrama in trigramas(termino):
+            coincidencias.update(self.trigramas.get(trigrama, ()))
+        # Sólo se mide la distancia de las palabras con más trigramas en común
+        parecidos = {}
+        for candidato, comunes in coincidencias.most_common(LIMITE_CANDIDATOS_DIFUSOS):
+            if comunes < 2:
+                break
+            distancia = distancia_edicion(termino, candidato, maximo)
+            if distancia <= maximo:
+                parecidos[candidato] = distancia
+        return parecidos
+
+    def expandir(self, termino: str) -> Dict[str, float]:
+        """Palabras del vocabulario que cuentan como coincidencia del término, con su peso"""
+        expansiones = {}
+        if termino in self.listas:
+            expansiones[termino] = 1.0
+        for sinonimo in self.sinonimos.get(termino, ()):
+            if sinonimo in self.listas:
+                expansiones.setdefault(sinonimo, PESO_SINONIMO)
+        if len(termino) >= 2:
+            # Palabra incompleta mientras se escribe; las más cercanas en largo pesan más
+            for completo in self.terminos_con_prefijo(termino):
+                expansiones.setdefault(completo, PESO_PREFIJO * len(termino) / len(completo))
+        # Sólo se corrigen errores de escritura si la palabra no existe tal cual
+        if termino not in self.listas:
+            for parecido, distancia in self.terminos_parecidos(termino).items():
+                expansiones.setdefault(parecido, PESO_DIFUSO * (1 - distancia / (len(termino) + 1)))
+        return expansiones
+
+    def buscar(self, consulta: str, k: int = 10) -> List[Tuple[str, float]]:
+        """Los k productos con mayor puntaje; todas las palabras conocidas de la consulta deben coincidir"""
+        total_productos = len(self.terminos)
+        expansiones = [self.expandir(t) for t in dict.fromkeys(PATRON_TOKEN.findall(normalizar(consulta)))]
+        expansiones = [e for e in expansiones if e]
+        if not total_productos or not expansiones:
+            return []
+        # Primero la palabra más selectiva: las siguientes sólo revisan los productos que quedan
+        frecuencia_documental = [min(total_productos, sum(len(self.listas[t]) for t in e)) for e in expansiones]
+        orden = sorted(range(len(expansiones)), key=frecuencia_documental.__getitem__)
+
+        puntajes = None
+        for i in orden:
+            # Un solo idf por palabra de la consulta: la coincidencia exacta pesa más que sus variantes
+            df = frecuencia_documental[i]
+            idf = math.log(1 + (total_productos - df + 0.5) / (df + 0.5))
+            # Cada producto cuenta con la variante de mayor peso que contiene
+            mejores = {}
+            for termino, peso in sorted(expansiones[i].items(), key=itemgetter(1)):
+                factor = peso * idf
+                lista = self.listas[termino]
+                if puntajes is not None and len(puntajes) < len(lista):
+                    pares = ((cb, lista[cb]) for cb in puntajes if cb in lista)
+                else:
+                    pares = lista.items()
+                mejores.update({cb: factor * parte for cb, parte in pares})
+            if puntajes is None:
+                puntajes = mejores
+            else:
+                if len(mejores) < len(puntajes):
+                    puntajes = {cb: valor + puntajes[cb] for cb, valor in mejores.items() if cb in puntajes}
+                else:
+                    puntajes = {cb: valor + mejores[cb] for cb, valor in puntajes.items() if cb in mejores}
+            if not puntajes:
+                return []
+
+        # La popularidad sólo cambia el puntaje de los productos con ventas
+        if len(self.popularidad) < len(puntajes):
+            vendidos = [cb for cb in self.popularidad if cb in puntajes]
+        else:
+            vendidos = [cb for cb in puntajes if cb in self.popularidad]
+        for cb in vendidos:
+            puntajes[cb] *= 1 + PESO_POPULARIDAD * math.log1p(self.popularidad[cb])
+        return heapq.nlargest(k, puntajes.items(), key=itemgetter(1))
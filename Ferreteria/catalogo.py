@@ -0,0 +1,70 @@
+# catalogo.py - Catálogo versionado de productos referenciado por las líneas de venta
+
+from typing import Dict
+from almacenamiento import Almacenamiento, obtener_almacenamiento
+
+
+# Datos del producto que una línea de venta obtiene del catálogo (nombre, cantidad,
+# precio aplicado y costo se guardan en la propia línea)
+CAMPOS_CATALOGO = (
+    'codigo', 'numero_producto', 'descripcion', 'clasificacion', 'precio_minorista',
+    'precio_mayoreo', 'proveedor', 'unidad', 'fabricante', 'tipo', 'codigoA', 'codigoB', 'codigoC'
+)
+
+
+def ficha_producto(datos_producto: Dict) -> Dict:
+    """Extrae los campos de catálogo de un producto, omitiendo los vacíos"""
+    ficha = {}
+    for campo in CAMPOS_CATALOGO:
+        valor = datos_producto.get(campo)
+        if valor not in (None, ''):
+            ficha[campo] = valor
+    return ficha
+
+
+class CatalogoVersionado:
+    """Fichas de producto por versión ('codigo_barras@n'); cada cambio de un producto crea una versión nueva"""
+    def __init__(self, almacenamiento: Almacenamiento = None):
+        self.almacenamiento = almacenamiento or obtener_almacenamiento()
+        self.fichas = self.almacenamiento.cargar('catalogo')
+        # codigo_barras -> número de la versión más reciente
+        self.versiones = {}
+        for referencia in self.fichas:
+            codigo_barras, _, numero = referencia.rpartition('@')
+            if numero.isdigit() and int(numero) > self.versiones.get(codigo_barras, 0):
+                self.versiones[codigo_barras] = int(numero)
+        self.pendientes = []
+
+    def version(self, codigo_barras: str, datos_producto: Dict) -> int:
+        """Número de la versión vigente del producto (crea una nueva si sus datos cambiaron)"""
+        ficha = ficha_producto(datos_producto)
+        numero = self.versiones.get(codigo_barras, 0)
+        if numero and self.fichas.get(f"{codigo_barras}@{numero}") == ficha:
+            return numero
+        numero += 1
+        referencia = f"{codigo_barras}@{numero}"
+        self.fichas[referencia] = ficha
+        self.versiones[codigo_barras] = numero
+        self.pendientes.append(referencia)
+        return numero
+
+    def guardar_pendientes(self) -> None:
+        """Persiste las versiones nuevas (antes de guardar la venta que las referencia)"""
+        if self.pendientes:
+            self.almacenamiento.guardar_registros('catalogo', self.fichas, self.pendientes, inmediato=True)
+            self.pendientes = []
+
+    def resolver(self, codigo_barras: str, version: int) -> Dict:
+        """Ficha de una versión del producto ({} si no existe)"""
+        return self.fichas.get(f"{codigo_barras}@{version}", {})
+
+
+_catalogo_compartido = None
+
+
+def obtener_catalogo() -> CatalogoVersionado:
+    """Retorna el catálogo versionado compartido por todos los gestores"""
+    global _catalogo_compartido
+    if _catalogo_compartido is None:
+        _catalogo_compartido = CatalogoVersionado()
+    return _catalogo_compartido
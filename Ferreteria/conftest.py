@@ -0,0 +1,18 @@
+# conftest.py - Cada prueba trabaja en un directorio vacío con sus propios almacenamiento, catálogo y reglas
+
+import pytest
+
+import almacenamiento
+import catalogo
+import precios
+
+
+@pytest.fixture
+def entorno(tmp_path, monkeypatch):
+    """Directorio temporal como directorio de trabajo y almacenamiento JSON sin escritura diferida"""
+    monkeypatch.chdir(tmp_path)
+    alm = almacenamiento.AlmacenamientoJSON(escritura_diferida=False)
+    monkeypatch.setattr(almacenamiento, '_almacenamiento_compartido', alm)
+    monkeypatch.setattr(catalogo, '_catalogo_compartido', None)
+    monkeypatch.setattr(precios, '_reglas_compartidas', None)
+    return alm
@@ -0,0 +1,47 @@
+# dinero.py - Importes en centavos enteros (aritmética exacta para precios, IVA y cambio)
+
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Iterable
+
+
+# Tasa de IVA en puntos porcentuales (16%)
+TASA_IVA = 16
+
+
+def a_centavos(valor) -> int:
+    """Convierte un importe en pesos (float, int, str o Decimal) a centavos, redondeando medio centavo hacia arriba"""
+    if isinstance(valor, int):
+        return valor * 100
+    if not valor:
+        return 0
+    # str() conserva el valor que se capturó (2.675 -> '2.675') en lugar del binario aproximado
+    return int(Decimal(str(valor)).scaleb(2).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def a_pesos(centavos: int) -> float:
+    """Convierte centavos a pesos (float con exactamente dos decimales significativos)"""
+    return centavos / 100
+
+
+def porcentaje(centavos: int, puntos: int) -> int:
+    """Calcula un porcentaje entero de un importe, redondeando medio centavo alejándose de cero"""
+    if centavos < 0:
+        return -porcentaje(-centavos, puntos)
+    return (centavos * puntos + 50) // 100
+
+
+def calcular_iva(subtotal: int) -> int:
+    """IVA de un subtotal en centavos"""
+    return porcentaje(subtotal, TASA_IVA)
+
+
+def sumar(importes: Iterable) -> int:
+    """Suma importes en pesos convirtiendo cada uno a centavos (totales de reportes sin deriva)"""
+    return sum(a_centavos(importe) for importe in importes)
+
+
+def formatear(centavos: int) -> str:
+    """Formatea centavos como moneda ($1,234.50)"""
+    signo = '-' if centavos < 0 else ''
+    pesos, resto = divmod(abs(centavos), 100)
+    return f"{signo}${pesos:,}.{resto:02d}"
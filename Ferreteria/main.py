@@ -3,12 +3,15 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 from datetime import datetime
+import dinero
+from tareas import obtener_ejecutor
 from metodos import (
     Gestor_Inventario, GestorVentas, GestorProveedores, GestorClientes,
     ProductoVenta, GeneradorReportes, GeneradorTicket, validar_numero, 
-    formatear_moneda, obtener_regimenes_fiscales, obtener_usos_cfdi
+    formatear_moneda, obtener_regimenes_fiscales, obtener_usos_cfdi, VentaRegistrada
 )
 from estilos import *
+from tabla_virtual import TablaVirtual
 
 
 class PuntoVenta:
@@ -26,6 +29,8 @@ class PuntoVenta:
         self.gestor_proveedores = GestorProveedores()
         self.gestor_clientes = GestorClientes()
         self.generador_reportes = GeneradorReportes(self.gestor_ventas)
+        self.sesion_busqueda = self.gestor_inventario.crear_sesion_busqueda()
+        self.codigos_sugeridos = []  # Código de barras de cada renglón de la lista de sugerencias
         
         # Variables
         self.var_descripcion = tk.StringVar()  # Cambiado de var_codigo a var_descripcion
@@ -35,6 +40,20 @@ class PuntoVenta:
         # Crear interfaz con pestañas
         self.crear_interfaz()
         self.actualizar_totales()
+        
+        # Guardar cambios pendientes antes de cerrar
+        self.root.protocol("WM_DELETE_WINDOW", self.cerrar_aplicacion)
+    
+    def cerrar_aplicacion(self):
+        """Cancela las tareas en curso, espera las escrituras pendientes y cierra la aplicación"""
+        ejecutor = obtener_ejecutor()
+        en_curso = ejecutor.en_curso()
+        if en_curso and not messagebox.askyesno(
+                "Confirmar", f"Hay {en_curso} importación(es) o exportación(es) en curso.\n¿Cancelarlas y salir?"):
+            return
+        ejecutor.cerrar()
+        self.gestor_inventario.almacenamiento.flush()
+        self.root.destroy()
     
     def crear_interfaz(self):
         """Crea la interfaz gráfica completa con pestañas"""
@@ -90,7 +109,7 @@ class PuntoVenta:
         frame_superior.pack(fill=tk.X, pady=(0, 5))
         
         # DESCRIPCIÓN del producto
-        tk.Label(frame_superior, text="Descripción:", **ESTILO_LABEL_NORMAL).grid(
+        tk.Label(frame_superior, text="Código o descripción:", **ESTILO_LABEL_NORMAL).grid(
             row=0, column=0, padx=PADDING_GENERAL, pady=PADDING_GENERAL, sticky="w"
         )
         self.entry_descripcion = tk.Entry(frame_superior, textvariable=self.var_descripcion, **ESTILO_ENTRY, width=25)
@@ -142,21 +161,22 @@ class PuntoVenta:
         """Actualiza la lista de sugerencias mientras el usuario escribe"""
         descripcion = self.var_descripcion.get().strip()
         self.lista_sugerencias.delete(0, tk.END)
+        self.codigos_sugeridos = []
         
         if not descripcion:
             return
         
-        # Buscar productos que coincidan
-        resultados = self.gestor_inventario.buscar_producto_por_descripcion(descripcion)
+        # Los 10 productos más relevantes, tolerando errores de escritura, acentos y sinónimos
+        self.codigos_sugeridos = self.gestor_inventario.buscar_sugerencias(descripcion, 10, self.sesion_busqueda)
         
-        # Mostrar hasta 10 resultados
-        for codigo_barras, producto in resultados[:10]:
+        for codigo_barras in self.codigos_sugeridos:
+            producto = self.gestor_inventario.obtener_producto(codigo_barras)
             nombre = producto.get('nombre', '')
             precio = producto.get('precio_minorista', 0)
             stock = producto.get('stock', 0)
             
             # Mostrar nombre, precio y stock
-            texto = f"{nombre} - ${precio:.2f} (Stock: {stock})"
+            texto = f"{nombre} - {formatear_moneda(precio)} (Stock: {stock})"
             self.lista_sugerencias.insert(tk.END, texto)
     
     def seleccionar_producto_sugerido(self, event=None):
@@ -166,20 +186,27 @@ class PuntoVenta:
             return
         
         indice = seleccion[0]
-        descripcion = self.var_descripcion.get().strip()
+        if indice >= len(self.codigos_sugeridos):
+            return
         
-        if not descripcion:
+        # La lista guarda el código de barras de cada sugerencia: se agrega ese producto, sin buscar de nuevo
+        resultado = self.gestor_ventas.agregar_producto_por_codigo(self.codigos_sugeridos[indice], 1)
+        
+        if not resultado[0]:
+            messagebox.showerror("Error", resultado[1])
             return
         
-        # Buscar el producto nuevamente para obtener datos completos
-        resultados = self.gestor_inventario.buscar_producto_por_descripcion(descripcion)
+        messagebox.showinfo("Éxito", resultado[1])
         
-        if indice < len(resultados):
-            # Establecer cantidad en 1 por defecto
-            self.var_cantidad.set("1")
-            
-            # Agregar el producto
-            self.agregar_producto()
+        self.actualizar_tabla()
+        self.actualizar_totales()
+        
+        # Limpiar campos
+        self.var_descripcion.set("")
+        self.var_cantidad.set("1")
+        self.lista_sugerencias.delete(0, tk.END)
+        self.codigos_sugeridos = []
+        self.entry_descripcion.focus()
 
     
     def crear_pestana_inventario(self, parent):
@@ -489,92 +516,64 @@ class PuntoVenta:
     
     def crear_tabla_inventario(self, parent):
         """Crea la tabla de inventario"""
-        frame_tabla = tk.Frame(parent, **ESTILO_FRAME_SECUNDARIO)
-        frame_tabla.pack(fill=tk.BOTH, expand=True)
-        
-        scrollbar = ttk.Scrollbar(frame_tabla)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        
         columnas = ("Cód. Barras", "Código", "No. Prod", "Nombre", "Descripción", "Clasificación", 
                    "P. Minorista", "P. Mayoreo", "Costo", "Proveedor", "Unidad", "Fabricante", 
                    "Tipo", "Stock")
-        self.tabla_inventario = ttk.Treeview(
-            frame_tabla, columns=columnas, show="headings", yscrollcommand=scrollbar.set, height=15
-        )
-        
         anchos = {
             "Cód. Barras": 100, "Código": 80, "No. Prod": 70, "Nombre": 150, 
             "Descripción": 150, "Clasificación": 100, "P. Minorista": 90, 
             "P. Mayoreo": 90, "Costo": 80, "Proveedor": 100, "Unidad": 60,
             "Fabricante": 100, "Tipo": 80, "Stock": 60
         }
-        for col in columnas:
-            self.tabla_inventario.heading(col, text=col)
-            self.tabla_inventario.column(col, width=anchos.get(col, 100), anchor="center")
-        
-        self.tabla_inventario.pack(fill=tk.BOTH, expand=True, padx=PADDING_GENERAL, pady=PADDING_GENERAL)
-        scrollbar.config(command=self.tabla_inventario.yview)
+        campos = (None, 'codigo', 'numero_producto', 'nombre', 'descripcion', 'clasificacion',
+                  'precio_minorista', 'precio_mayoreo', 'costo', 'proveedor', 'unidad', 'fabricante',
+                  'tipo', 'stock')
+        self.vista_inventario = TablaVirtual(
+            parent, columnas, anchos, campos, self.gestor_inventario.obtener_todos, self.fila_inventario
+        )
+        self.tabla_inventario = self.vista_inventario.arbol
         
         self.tabla_inventario.bind('<Double-Button-1>', lambda e: self.cargar_producto_seleccionado())
         self.actualizar_tabla_inventario()
     
     def crear_tabla_clientes(self, parent):
         """Crea la tabla de clientes"""
-        frame_tabla = tk.Frame(parent, **ESTILO_FRAME_SECUNDARIO)
-        frame_tabla.pack(fill=tk.BOTH, expand=True)
-        
-        scrollbar = ttk.Scrollbar(frame_tabla)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        
         columnas = ("RFC", "Razón Social", "Régimen Fiscal", "Uso CFDI", "Código Postal", 
                    "Dirección Fiscal", "Estado", "Ciudad", "Municipio", "Colonia", 
                    "Teléfono", "Correo")
-        self.tabla_clientes = ttk.Treeview(
-            frame_tabla, columns=columnas, show="headings", yscrollcommand=scrollbar.set, height=15
-        )
-        
         anchos = {
             "RFC": 120, "Razón Social": 200, "Régimen Fiscal": 150, "Uso CFDI": 100,
             "Código Postal": 90, "Dirección Fiscal": 200, "Estado": 100, "Ciudad": 100,
             "Municipio": 100, "Colonia": 120, "Teléfono": 100, "Correo": 150
         }
-        for col in columnas:
-            self.tabla_clientes.heading(col, text=col)
-            self.tabla_clientes.column(col, width=anchos.get(col, 100), anchor="center")
-        
-        self.tabla_clientes.pack(fill=tk.BOTH, expand=True, padx=PADDING_GENERAL, pady=PADDING_GENERAL)
-        scrollbar.config(command=self.tabla_clientes.yview)
+        campos = (None, 'razon_social', 'regimen_fiscal', 'uso_cfdi', 'codigo_postal', 'direccion_fiscal',
+                  'estado', 'ciudad', 'municipio', 'colonia', 'telefono', 'correo')
+        self.vista_clientes = TablaVirtual(
+            parent, columnas, anchos, campos, self.gestor_clientes.obtener_todos, self.fila_cliente
+        )
+        self.tabla_clientes = self.vista_clientes.arbol
         
         self.tabla_clientes.bind('<Double-Button-1>', lambda e: self.cargar_cliente_seleccionado())
         self.actualizar_tabla_clientes()
     
     def crear_tabla_proveedores(self, parent):
         """Crea la tabla de proveedores"""
-        frame_tabla = tk.Frame(parent, **ESTILO_FRAME_SECUNDARIO)
-        frame_tabla.pack(fill=tk.BOTH, expand=True)
-        
-        scrollbar = ttk.Scrollbar(frame_tabla)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        
         columnas = ("ID", "Alias", "RFC", "Razón Social", "Personal", "Teléfono", 
                    "Código Postal", "Estado", "Ciudad", "Municipio", "Colonia", 
                    "Dirección", "Fax", "Correo", "Página Web", "Tipo Pago", "Condiciones")
-        self.tabla_proveedores = ttk.Treeview(
-            frame_tabla, columns=columnas, show="headings", yscrollcommand=scrollbar.set, height=15
-        )
-        
         anchos = {
             "ID": 80, "Alias": 100, "RFC": 120, "Razón Social": 180, "Personal": 120,
             "Teléfono": 100, "Código Postal": 90, "Estado": 100, "Ciudad": 100,
             "Municipio": 100, "Colonia": 120, "Dirección": 180, "Fax": 100,
             "Correo": 150, "Página Web": 150, "Tipo Pago": 80, "Condiciones": 150
         }
-        for col in columnas:
-            self.tabla_proveedores.heading(col, text=col)
-            self.tabla_proveedores.column(col, width=anchos.get(col, 100), anchor="center")
-        
-        self.tabla_proveedores.pack(fill=tk.BOTH, expand=True, padx=PADDING_GENERAL, pady=PADDING_GENERAL)
-        scrollbar.config(command=self.tabla_proveedores.yview)
+        campos = (None, 'alias', 'rfc', 'razon_social', 'personal', 'telefono', 'codigo_postal', 'estado',
+                  'ciudad', 'municipio', 'colonia', 'direccion', 'fax', 'correo', 'pagina_web', 'tipo_pago',
+                  'condiciones')
+        self.vista_proveedores = TablaVirtual(
+            parent, columnas, anchos, campos, self.gestor_proveedores.obtener_todos, self.fila_proveedor
+        )
+        self.tabla_proveedores = self.vista_proveedores.arbol
         
         self.tabla_proveedores.bind('<Double-Button-1>', lambda e: self.cargar_proveedor_seleccionado())
         self.actualizar_tabla_proveedores()
@@ -588,81 +587,79 @@ class PuntoVenta:
     
     def actualizar_tabla_inventario(self):
         """Actualiza la tabla de inventario"""
-        if hasattr(self, 'tabla_inventario'):
-            for item in self.tabla_inventario.get_children():
-                self.tabla_inventario.delete(item)
-            
-            for codigo_barras, producto in self.gestor_inventario.obtener_todos().items():
-                # Formatear precios
-                precio_minorista = formatear_moneda(producto.get('precio_minorista', 0))
-                precio_mayoreo = formatear_moneda(producto.get('precio_mayoreo', 0))
-                costo = formatear_moneda(producto.get('costo', 0))
-                
-                self.tabla_inventario.insert("", tk.END, values=(
-                    codigo_barras,
-                    producto.get('codigo', ''),
-                    producto.get('numero_producto', ''),
-                    producto.get('nombre', ''),
-                    producto.get('descripcion', ''),
-                    producto.get('clasificacion', ''),
-                    precio_minorista,
-                    precio_mayoreo,
-                    costo,
-                    producto.get('proveedor', ''),
-                    producto.get('unidad', 'pz'),
-                    producto.get('fabricante', ''),
-                    producto.get('tipo', ''),
-                    producto.get('stock', 0)
-                ))
+        if hasattr(self, 'vista_inventario'):
+            self.vista_inventario.refrescar()
+    
+    @staticmethod
+    def fila_inventario(codigo_barras, producto):
+        """Valores de la fila de un producto (sólo se calculan para las filas visibles)"""
+        return (
+            codigo_barras,
+            producto.get('codigo', ''),
+            producto.get('numero_producto', ''),
+            producto.get('nombre', ''),
+            producto.get('descripcion', ''),
+            producto.get('clasificacion', ''),
+            formatear_moneda(producto.get('precio_minorista', 0)),
+            formatear_moneda(producto.get('precio_mayoreo', 0)),
+            formatear_moneda(producto.get('costo', 0)),
+            producto.get('proveedor', ''),
+            producto.get('unidad', 'pz'),
+            producto.get('fabricante', ''),
+            producto.get('tipo', ''),
+            producto.get('stock', 0)
+        )
     
     def actualizar_tabla_clientes(self):
         """Actualiza la tabla de clientes"""
-        if hasattr(self, 'tabla_clientes'):
-            for item in self.tabla_clientes.get_children():
-                self.tabla_clientes.delete(item)
-            
-            for rfc, cliente in self.gestor_clientes.obtener_todos().items():
-                self.tabla_clientes.insert("", tk.END, values=(
-                    rfc,
-                    cliente.get('razon_social', ''),
-                    cliente.get('regimen_fiscal', ''),
-                    cliente.get('uso_cfdi', ''),
-                    cliente.get('codigo_postal', ''),
-                    cliente.get('direccion_fiscal', ''),
-                    cliente.get('estado', ''),
-                    cliente.get('ciudad', ''),
-                    cliente.get('municipio', ''),
-                    cliente.get('colonia', ''),
-                    cliente.get('telefono', ''),
-                    cliente.get('correo', '')
-                ))
+        if hasattr(self, 'vista_clientes'):
+            self.vista_clientes.refrescar()
+    
+    @staticmethod
+    def fila_cliente(rfc, cliente):
+        """Valores de la fila de un cliente"""
+        return (
+            rfc,
+            cliente.get('razon_social', ''),
+            cliente.get('regimen_fiscal', ''),
+            cliente.get('uso_cfdi', ''),
+            cliente.get('codigo_postal', ''),
+            cliente.get('direccion_fiscal', ''),
+            cliente.get('estado', ''),
+            cliente.get('ciudad', ''),
+            cliente.get('municipio', ''),
+            cliente.get('colonia', ''),
+            cliente.get('telefono', ''),
+            cliente.get('correo', '')
+        )
     
     def actualizar_tabla_proveedores(self):
         """Actualiza la tabla de proveedores"""
-        if hasattr(self, 'tabla_proveedores'):
-            for item in self.tabla_proveedores.get_children():
-                self.tabla_proveedores.delete(item)
-            
-            for id_prov, proveedor in self.gestor_proveedores.obtener_todos().items():
-                self.tabla_proveedores.insert("", tk.END, values=(
-                    id_prov,
-                    proveedor.get('alias', ''),
-                    proveedor.get('rfc', ''),
-                    proveedor.get('razon_social', ''),
-                    proveedor.get('personal', ''),
-                    proveedor.get('telefono', ''),
-                    proveedor.get('codigo_postal', ''),
-                    proveedor.get('estado', ''),
-                    proveedor.get('ciudad', ''),
-                    proveedor.get('municipio', ''),
-                    proveedor.get('colonia', ''),
-                    proveedor.get('direccion', ''),
-                    proveedor.get('fax', ''),
-                    proveedor.get('correo', ''),
-                    proveedor.get('pagina_web', ''),
-                    proveedor.get('tipo_pago', ''),
-                    proveedor.get('condiciones', '')
-                ))
+        if hasattr(self, 'vista_proveedores'):
+            self.vista_proveedores.refrescar()
+    
+    @staticmethod
+    def fila_proveedor(id_prov, proveedor):
+        """Valores de la fila de un proveedor"""
+        return (
+            id_prov,
+            proveedor.get('alias', ''),
+            proveedor.get('rfc', ''),
+            proveedor.get('razon_social', ''),
+            proveedor.get('personal', ''),
+            proveedor.get('telefono', ''),
+            proveedor.get('codigo_postal', ''),
+            proveedor.get('estado', ''),
+            proveedor.get('ciudad', ''),
+            proveedor.get('municipio', ''),
+            proveedor.get('colonia', ''),
+            proveedor.get('direccion', ''),
+            proveedor.get('fax', ''),
+            proveedor.get('correo', ''),
+            proveedor.get('pagina_web', ''),
+            proveedor.get('tipo_pago', ''),
+            proveedor.get('condiciones', '')
+        )
     
     def cargar_producto_seleccionado(self):
         """Carga el producto seleccionado en el formulario"""
@@ -784,8 +781,9 @@ class PuntoVenta:
                 stock=int(self.var_inv_stock.get())
             )
             messagebox.showinfo("Éxito", "Producto agregado correctamente")
+            # Sólo se ubica la fila nueva en la vista (la tabla completa se relee al importar)
+            self.vista_inventario.actualizar_clave(self.var_inv_codigo_barras.get())
             self.limpiar_formulario_inventario()
-            self.actualizar_tabla_inventario()
         except Exception as e:
             messagebox.showerror("Error", f"Error al agregar producto: {str(e)}")
     
@@ -845,8 +843,8 @@ class PuntoVenta:
                 stock=int(self.var_inv_stock.get())
             )
             messagebox.showinfo("Éxito", "Producto editado correctamente")
+            self.vista_inventario.actualizar_clave(self.var_inv_codigo_barras.get())
             self.limpiar_formulario_inventario()
-            self.actualizar_tabla_inventario()
         except Exception as e:
             messagebox.showerror("Error", f"Error al editar producto: {str(e)}")
     
@@ -860,8 +858,8 @@ class PuntoVenta:
             try:
                 if self.gestor_inventario.eliminar_producto(self.var_inv_codigo_barras.get()):
                     messagebox.showinfo("Éxito", "Producto eliminado correctamente")
+                    self.vista_inventario.quitar_clave(self.var_inv_codigo_barras.get())
                     self.limpiar_formulario_inventario()
-                    self.actualizar_tabla_inventario()
                 else:
                     messagebox.showerror("Error", "Producto no encontrado")
             except Exception as e:
@@ -913,8 +911,8 @@ class PuntoVenta:
         
         if exito:
             messagebox.showinfo("Éxito", mensaje)
+            self.vista_clientes.actualizar_clave(self.var_cli_rfc.get().upper())
             self.limpiar_formulario_clientes()
-            self.actualizar_tabla_clientes()
         else:
             messagebox.showerror("Error", mensaje)
     
@@ -948,8 +946,8 @@ class PuntoVenta:
         
         if exito:
             messagebox.showinfo("Éxito", mensaje)
+            self.vista_clientes.actualizar_clave(self.var_cli_rfc.get().upper())
             self.limpiar_formulario_clientes()
-            self.actualizar_tabla_clientes()
         else:
             messagebox.showerror("Error", mensaje)
     
@@ -964,8 +962,8 @@ class PuntoVenta:
             
             if exito:
                 messagebox.showinfo("Éxito", mensaje)
+                self.vista_clientes.quitar_clave(self.var_cli_rfc.get().upper())
                 self.limpiar_formulario_clientes()
-                self.actualizar_tabla_clientes()
             else:
                 messagebox.showerror("Error", mensaje)
     
@@ -1008,8 +1006,8 @@ class PuntoVenta:
         
         if exito:
             messagebox.showinfo("Éxito", mensaje)
+            self.vista_proveedores.actualizar_clave(self.var_prov_id.get().upper())
             self.limpiar_formulario_proveedores()
-            self.actualizar_tabla_proveedores()
             self.actualizar_combo_proveedores()
         else:
             messagebox.showerror("Error", mensaje)
@@ -1042,8 +1040,8 @@ class PuntoVenta:
         
         if exito:
             messagebox.showinfo("Éxito", mensaje)
+            self.vista_proveedores.actualizar_clave(self.var_prov_id.get().upper())
             self.limpiar_formulario_proveedores()
-            self.actualizar_tabla_proveedores()
             self.actualizar_combo_proveedores()
         else:
             messagebox.showerror("Error", mensaje)
@@ -1059,8 +1057,9 @@ class PuntoVenta:
             
             if exito:
                 messagebox.showinfo("Éxito", mensaje)
+                # La baja sólo marca al proveedor como inactivo: su fila se actualiza
+                self.vista_proveedores.actualizar_clave(self.var_prov_id.get().upper())
                 self.limpiar_formulario_proveedores()
-                self.actualizar_tabla_proveedores()
                 self.actualizar_combo_proveedores()
             else:
                 messagebox.showerror("Error", mensaje)
@@ -1086,30 +1085,46 @@ class PuntoVenta:
         self.var_prov_condiciones.set("")
     
     def importar_inventario(self):
-        """Importa inventario desde archivo"""
+        """Importa inventario desde JSON, CSV o XLSX (formato de la plantilla)"""
         ruta = filedialog.askopenfilename(
-            filetypes=[("Archivos JSON", "*.json"), ("Todos los archivos", "*.*")]
+            filetypes=[("Inventario", "*.csv *.xlsx *.json"), ("CSV", "*.csv"), ("Excel", "*.xlsx"),
+                       ("Archivos JSON", "*.json"), ("Todos los archivos", "*.*")]
         )
         if ruta:
-            respuesta = messagebox.askyesno("Importar", "¿Desea sobrescribir el inventario existente?")
-            exito, mensaje = self.gestor_inventario.importar_inventario(ruta, respuesta)
-            if exito:
-                messagebox.showinfo("Éxito", mensaje)
-                self.actualizar_tabla_inventario()
+            if ruta.lower().endswith('.json'):
+                respuesta = messagebox.askyesno("Importar", "¿Desea sobrescribir el inventario existente?")
+                trabajo = lambda progreso: self.gestor_inventario.leer_inventario(ruta, respuesta)
             else:
-                messagebox.showerror("Error", mensaje)
+                # Qué hacer con los códigos de barras que ya existen en el inventario
+                if not messagebox.askyesno("Importar", "¿Actualizar los productos que ya existen?\n(No = omitirlos)"):
+                    modo = 'omitir'
+                elif messagebox.askyesno("Importar", "¿Reemplazar el registro completo de los existentes?\n"
+                                                     "(No = actualizar sólo las columnas con datos)"):
+                    modo = 'sobrescribir'
+                else:
+                    modo = 'actualizar'
+                trabajo = lambda progreso: self.gestor_inventario.leer_inventario(ruta, modo=modo, progreso=progreso)
+            ejecutar_tarea(self.root, "Importando inventario", trabajo, self.aplicar_importacion_inventario)
+    
+    def aplicar_importacion_inventario(self, cambios, reemplazar):
+        """Aplica en el hilo de Tk los productos leídos en segundo plano y actualiza la tabla"""
+        self.gestor_inventario.aplicar_importacion_inventario(cambios, reemplazar)
+        self.actualizar_tabla_inventario()
     
     def exportar_inventario(self):
-        """Exporta inventario a archivo"""
+        """Exporta inventario a XLSX (formato de la plantilla) o JSON"""
         ruta = filedialog.asksaveasfilename(
-            defaultextension=".json",
-            filetypes=[("Archivos JSON", "*.json"), ("Todos los archivos", "*.*")]
+            defaultextension=".xlsx",
+            filetypes=[("Excel", "*.xlsx"), ("Archivos JSON", "*.json"), ("Todos los archivos", "*.*")]
         )
         if ruta:
-            if self.gestor_inventario.exportar_inventario(ruta):
-                messagebox.showinfo("Éxito", "Inventario exportado correctamente")
+            if ruta.lower().endswith('.xlsx'):
+                trabajo = lambda progreso: self.gestor_inventario.exportar_inventario_xlsx(ruta, progreso)
             else:
-                messagebox.showerror("Error", "Error al exportar inventario")
+                trabajo = lambda progreso: ((True, "Inventario exportado correctamente")
+                                            if self.gestor_inventario.exportar_inventario(ruta)
+                                            else (False, "Error al exportar inventario"))
+            ejecutar_tarea(self.root, "Exportando inventario", trabajo)
     
     def generar_plantilla_inventario(self):
         """Genera plantilla CSV para inventario"""
@@ -1132,18 +1147,16 @@ class PuntoVenta:
         )
         if ruta:
             respuesta = messagebox.askyesno("Importar", "¿Desea sobrescribir los clientes existentes?")
-            
-            # Detectar formato por extensión
-            if ruta.lower().endswith('.xlsx'):
-                exito, mensaje = self.gestor_clientes.importar_clientes_xlsx(ruta, respuesta)
-            else:
-                exito, mensaje = self.gestor_clientes.importar_clientes_csv(ruta, respuesta)
-            
-            if exito:
-                messagebox.showinfo("Éxito", mensaje)
-                self.actualizar_tabla_clientes()
-            else:
-                messagebox.showerror("Error", mensaje)
+            ejecutar_tarea(
+                self.root, "Importando clientes",
+                lambda progreso: self.gestor_clientes.leer_clientes_tabla(ruta, respuesta, progreso),
+                self.aplicar_importacion_clientes
+            )
+    
+    def aplicar_importacion_clientes(self, importados):
+        """Aplica en el hilo de Tk los clientes leídos en segundo plano y actualiza la tabla"""
+        self.gestor_clientes.aplicar_importacion_clientes(importados)
+        self.actualizar_tabla_clientes()
     
     def exportar_clientes_csv(self):
         """Exporta clientes a CSV o XLSX"""
@@ -1154,14 +1167,10 @@ class PuntoVenta:
         if ruta:
             # Detectar formato por extensión
             if ruta.lower().endswith('.xlsx'):
-                exito, mensaje = self.gestor_clientes.exportar_clientes_xlsx(ruta)
-            else:
-                exito, mensaje = self.gestor_clientes.exportar_clientes_csv(ruta)
-            
-            if exito:
-                messagebox.showinfo("Éxito", mensaje)
+                trabajo = lambda progreso: self.gestor_clientes.exportar_clientes_xlsx(ruta, progreso)
             else:
-                messagebox.showerror("Error", mensaje)
+                trabajo = lambda progreso: self.gestor_clientes.exportar_clientes_csv(ruta, progreso)
+            ejecutar_tarea(self.root, "Exportando clientes", trabajo)
     
     def generar_plantilla_clientes(self):
         """Genera plantilla CSV para clientes"""
@@ -1184,19 +1193,21 @@ class PuntoVenta:
         )
         if ruta:
             respuesta = messagebox.askyesno("Importar", "¿Desea sobrescribir los proveedores existentes?")
-            
-            # Detectar formato por extensión
-            if ruta.lower().endswith('.xlsx'):
-                exito, mensaje = self.gestor_proveedores.importar_proveedores_xlsx(ruta, respuesta)
-            else:
-                exito, mensaje = self.gestor_proveedores.importar_proveedores_csv(ruta, respuesta)
-            
-            if exito:
-                messagebox.showinfo("Éxito", mensaje)
-                self.actualizar_tabla_proveedores()
-                self.actualizar_combo_proveedores()
-            else:
-                messagebox.showerror("Error", mensaje)
+            ejecutar_tarea(
+                self.root, "Importando proveedores",
+                lambda progreso: self.gestor_proveedores.leer_proveedores_tabla(ruta, respuesta, progreso),
+                self.aplicar_importacion_proveedores
+            )
+    
+    def aplicar_importacion_proveedores(self, importados):
+        """Aplica en el hilo de Tk los proveedores leídos en segundo plano y actualiza tabla y combo"""
+        self.gestor_proveedores.aplicar_importacion_proveedores(importados)
+        self.refrescar_proveedores()
+    
+    def refrescar_proveedores(self):
+        """Actualiza la tabla y el combo de proveedores"""
+        self.actualizar_tabla_proveedores()
+        self.actualizar_combo_proveedores()
     
     def exportar_proveedores_csv(self):
         """Exporta proveedores a CSV o XLSX"""
@@ -1207,14 +1218,10 @@ class PuntoVenta:
         if ruta:
             # Detectar formato por extensión
             if ruta.lower().endswith('.xlsx'):
-                exito, mensaje = self.gestor_proveedores.exportar_proveedores_xlsx(ruta)
-            else:
-                exito, mensaje = self.gestor_proveedores.exportar_proveedores_csv(ruta)
-            
-            if exito:
-                messagebox.showinfo("Éxito", mensaje)
+                trabajo = lambda progreso: self.gestor_proveedores.exportar_proveedores_xlsx(ruta, progreso=progreso)
             else:
-                messagebox.showerror("Error", mensaje)
+                trabajo = lambda progreso: self.gestor_proveedores.exportar_proveedores_csv(ruta, progreso=progreso)
+            ejecutar_tarea(self.root, "Exportando proveedores", trabajo)
     
     def generar_plantilla_proveedores(self):
         """Genera plantilla CSV para proveedores"""
@@ -1372,12 +1379,12 @@ class PuntoVenta:
         self.root.bind('<F6>', lambda e: self.abrir_reportes())
     
     def agregar_producto(self):
-        """Agrega un producto a la venta por descripción"""
+        """Agrega un producto a la venta por código de barras, código alterno o descripción"""
         descripcion = self.var_descripcion.get().strip()
         cantidad_str = self.var_cantidad.get().strip()
         
         if not descripcion:
-            messagebox.showwarning("Advertencia", "Ingrese una descripción del producto")
+            messagebox.showwarning("Advertencia", "Ingrese un código o una descripción del producto")
             return
         
         if not validar_numero(cantidad_str, "int"):
@@ -1389,8 +1396,8 @@ class PuntoVenta:
             messagebox.showerror("Error", "La cantidad debe ser mayor a 0")
             return
         
-        # Buscar producto por descripción
-        resultado = self.gestor_ventas.agregar_producto_por_descripcion(descripcion, cantidad)
+        # Lo escaneado se resuelve por código; la descripción sólo si no es un código conocido
+        resultado = self.gestor_ventas.agregar_producto_por_entrada(descripcion, cantidad)
         
         if not resultado[0]:
             messagebox.showerror("Error", resultado[1])
@@ -1439,23 +1446,21 @@ class PuntoVenta:
                 formatear_moneda(producto.obtener_precio_unitario()),
                 producto.cantidad,
                 formatear_moneda(producto.subtotal()),
-                "Sí" if producto.cantidad >= 6 else "No"
+                "Sí" if producto.es_mayoreo() else "No"
             ))
     
     def actualizar_totales(self):
         """Actualiza los totales de la venta"""
-        subtotal = self.gestor_ventas.calcular_subtotal()
-        iva = self.gestor_ventas.calcular_iva(subtotal)
-        total = subtotal + iva
+        subtotal, iva, total = self.gestor_ventas.calcular_totales_centavos()
         
-        self.label_subtotal.config(text=formatear_moneda(subtotal))
-        self.label_iva.config(text=formatear_moneda(iva))
-        self.label_total.config(text=formatear_moneda(total))
+        self.label_subtotal.config(text=dinero.formatear(subtotal))
+        self.label_iva.config(text=dinero.formatear(iva))
+        self.label_total.config(text=dinero.formatear(total))
         
         # Calcular cambio si hay pago
         if self.var_pago.get() and validar_numero(self.var_pago.get()):
             pago = float(self.var_pago.get())
-            cambio = self.gestor_ventas.calcular_cambio(pago, total)
+            cambio = self.gestor_ventas.calcular_cambio(pago, dinero.a_pesos(total))
             self.label_cambio.config(text=f"Cambio: {formatear_moneda(cambio)}")
         else:
             self.label_cambio.config(text="Cambio: $0.00")
@@ -1528,7 +1533,65 @@ class PuntoVenta:
     
     def abrir_reportes(self):
         """Abre la ventana de reportes"""
-        VentanaReportes(self.root, self.generador_reportes)
+        VentanaReportes(self.root, self.generador_reportes, self.gestor_clientes, self.gestor_proveedores)
+
+
+def ejecutar_tarea(ventana, titulo, trabajo, al_terminar=None):
+    """Envía trabajo(progreso) al ejecutor de tareas y muestra su avance en un diálogo con opción de cancelar
+
+    trabajo retorna (exito, mensaje, *datos); si tuvo éxito, al_terminar(*datos) se ejecuta en el hilo de Tk,
+    que es el único que modifica los gestores y sus índices.
+    """
+    tarea = obtener_ejecutor().enviar(titulo, trabajo)
+    
+    dialogo = tk.Toplevel(ventana)
+    dialogo.title(titulo)
+    dialogo.configure(bg=COLOR_FONDO)
+    dialogo.resizable(False, False)
+    dialogo.transient(ventana)
+    # Modal: mientras corre la tarea no se editan los datos que está leyendo o escribiendo
+    dialogo.grab_set()
+    dialogo.protocol("WM_DELETE_WINDOW", tarea.cancelar)
+    
+    label_avance = tk.Label(dialogo, text=f"{titulo}...", width=40, **ESTILO_LABEL_NORMAL)
+    label_avance.pack(padx=20, pady=(20, 10))
+    tk.Button(dialogo, text="CANCELAR", command=tarea.cancelar, **ESTILO_BOTON_PELIGRO).pack(pady=(0, 20))
+    
+    def revisar():
+        if not tarea.terminada:
+            if tarea.cancelada:
+                label_avance.config(text="Cancelando...")
+            else:
+                label_avance.config(text=f"{titulo}... {tarea.avance:,} filas")
+            dialogo.after(200, revisar)
+            return
+        dialogo.grab_release()
+        dialogo.destroy()
+        exito, mensaje, *datos = tarea.resultado()
+        if exito:
+            # Los cambios leídos por la tarea se aplican aquí, con una sola actualización de la tabla
+            if al_terminar:
+                al_terminar(*datos)
+            messagebox.showinfo("Éxito", mensaje, parent=ventana)
+        else:
+            messagebox.showerror("Error", mensaje, parent=ventana)
+    
+    revisar()
+
+
+def leer_rango_fechas(var_desde, var_hasta):
+    """Lee un rango de fechas AAAA-MM-DD (vacío = sin límite); retorna None si alguna es inválida"""
+    rango = []
+    for var in (var_desde, var_hasta):
+        texto = var.get().strip()
+        if texto:
+            try:
+                datetime.strptime(texto, '%Y-%m-%d')
+            except ValueError:
+                messagebox.showerror("Error", f"Fecha inválida: {texto} (use AAAA-MM-DD)")
+                return None
+        rango.append(texto or None)
+    return tuple(rango)
 
 
 class VentanaHistorialVentas:
@@ -1536,6 +1599,7 @@ class VentanaHistorialVentas:
     
     def __init__(self, parent, gestor_ventas):
         self.gestor_ventas = gestor_ventas
+        self.generador_reportes = GeneradorReportes(gestor_ventas)
         
         # Crear ventana
         self.ventana = tk.Toplevel(parent)
@@ -1643,14 +1707,22 @@ class VentanaHistorialVentas:
             **ESTILO_BOTON_EXITO,
             width=20
         ).pack(side=tk.LEFT, padx=5)
+        
+        tk.Button(
+            frame_botones, 
+            text="COMPACTAR HISTORIAL", 
+            command=self.compactar_historial,
+            **ESTILO_BOTON_SECUNDARIO,
+            width=20
+        ).pack(side=tk.LEFT, padx=5)
     
     def cargar_ventas(self):
         """Carga todas las ventas en la tabla"""
         for item in self.tabla.get_children():
             self.tabla.delete(item)
         
-        ventas = self.gestor_ventas.obtener_historial()
-        ventas.reverse()  # Más recientes primero
+        # Copia invertida: no se altera el orden del historial en memoria
+        ventas = list(reversed(self.gestor_ventas.obtener_historial()))  # Más recientes primero
         
         for venta in ventas:
             self.tabla.insert("", tk.END, values=(
@@ -1670,29 +1742,36 @@ class VentanaHistorialVentas:
             messagebox.showwarning("Advertencia", "Ingrese un folio")
             return
         
-        if not folio.isdigit():
-            messagebox.showwarning("Advertencia", "El folio debe ser un número")
+        # Se acepta un folio ("15") o un rango ("10-20")
+        partes = [parte.strip() for parte in folio.split('-')]
+        if len(partes) > 2 or not all(parte.isdigit() for parte in partes):
+            messagebox.showwarning("Advertencia", "El folio debe ser un número o un rango (ej. 10-20)")
             return
         
-        venta = self.gestor_ventas.buscar_venta_por_folio(int(folio))
+        if len(partes) == 2:
+            ventas = self.gestor_ventas.buscar_ventas_por_rango_folio(int(partes[0]), int(partes[1]))
+        else:
+            venta = self.gestor_ventas.buscar_venta_por_folio(int(folio))
+            ventas = [venta] if venta else []
         
-        if not venta:
+        if not ventas:
             messagebox.showerror("Error", f"No se encontró venta con folio: {folio}")
             return
         
-        # Limpiar tabla y mostrar solo esta venta
+        # Limpiar tabla y mostrar las ventas encontradas
         for item in self.tabla.get_children():
             self.tabla.delete(item)
         
-        self.tabla.insert("", tk.END, values=(
-            venta.get('folio', 'N/A'),
-            venta['fecha'],
-            formatear_moneda(venta['total']),
-            formatear_moneda(venta['iva']),
-            formatear_moneda(venta['subtotal']),
-            len(venta['productos']),
-            formatear_moneda(venta.get('descuento_total', 0))
-        ))
+        for venta in ventas:
+            self.tabla.insert("", tk.END, values=(
+                venta.get('folio', 'N/A'),
+                venta['fecha'],
+                formatear_moneda(venta['total']),
+                formatear_moneda(venta['iva']),
+                formatear_moneda(venta['subtotal']),
+                len(venta['productos']),
+                formatear_moneda(venta.get('descuento_total', 0))
+            ))
     
     def buscar_venta_por_descripcion(self):
         """Busca ventas por descripción"""
@@ -1768,7 +1847,7 @@ class VentanaHistorialVentas:
         tabla.column("Producto", width=150)
         tabla.column("Descripción", width=200)
         
-        for prod in venta['productos']:
+        for prod in VentaRegistrada.de(venta).lineas():
             tabla.insert("", tk.END, values=(
                 prod['nombre'],
                 prod.get('descripcion', '')[:30] + "..." if len(prod.get('descripcion', '')) > 30 else prod.get('descripcion', ''),
@@ -1814,52 +1893,41 @@ class VentanaHistorialVentas:
         ruta_ticket = GeneradorTicket.guardar_ticket(venta, f"ticket_reimpreso_{folio}.txt")
         messagebox.showinfo("Éxito", f"Ticket guardado en:\n{ruta_ticket}")
     
+    def compactar_historial(self):
+        """Consolida el diario de ventas en un snapshot"""
+        if not messagebox.askyesno("Confirmar", "¿Compactar el diario de ventas?"):
+            return
+        
+        exito, mensaje = self.gestor_ventas.compactar_historial()
+        if exito:
+            messagebox.showinfo("Éxito", mensaje)
+        else:
+            messagebox.showerror("Error", mensaje)
+    
     def exportar_historial(self):
-        """Exporta el historial de ventas a CSV"""
+        """Exporta el historial de ventas a CSV o XLSX"""
         ruta = filedialog.asksaveasfilename(
             defaultextension=".csv",
-            filetypes=[("Archivos CSV", "*.csv"), ("Todos los archivos", "*.*")]
+            filetypes=[("Archivos CSV", "*.csv"), ("Excel", "*.xlsx"), ("Todos los archivos", "*.*")]
         )
         
         if not ruta:
             return
         
-        try:
-            ventas = self.gestor_ventas.obtener_historial()
-            
-            if not ventas:
-                messagebox.showerror("Error", "No hay ventas para exportar")
-                return
-            
-            import csv
-            with open(ruta, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                writer.writerow(['Folio', 'Fecha', 'Subtotal', 'IVA', 'Total', 'Pago', 'Cambio', 'Productos', 'Descuento'])
-                
-                for venta in ventas:
-                    writer.writerow([
-                        venta.get('folio', ''),
-                        venta.get('fecha', ''),
-                        venta.get('subtotal', 0),
-                        venta.get('iva', 0),
-                        venta.get('total', 0),
-                        venta.get('pago', 0),
-                        venta.get('cambio', 0),
-                        len(venta.get('productos', [])),
-                        venta.get('descuento_total', 0)
-                    ])
-            
-            messagebox.showinfo("Éxito", f"Historial exportado a:\n{ruta}")
-            
-        except Exception as e:
-            messagebox.showerror("Error", f"Error al exportar: {str(e)}")
+        if ruta.lower().endswith('.xlsx'):
+            exportar = lambda progreso: self.generador_reportes.exportar_ventas_xlsx(ruta, progreso=progreso)
+        else:
+            exportar = lambda progreso: self.generador_reportes.exportar_historial(ruta, progreso=progreso)
+        ejecutar_tarea(self.ventana, "Exportando ventas", exportar)
 
 
 class VentanaReportes:
     """Ventana para ver reportes de ventas"""
     
-    def __init__(self, parent, generador_reportes):
+    def __init__(self, parent, generador_reportes, gestor_clientes=None, gestor_proveedores=None):
         self.generador_reportes = generador_reportes
+        self.gestor_clientes = gestor_clientes
+        self.gestor_proveedores = gestor_proveedores
         
         # Crear ventana
         self.ventana = tk.Toplevel(parent)
@@ -1867,6 +1935,10 @@ class VentanaReportes:
         self.ventana.geometry("900x600")
         self.ventana.configure(bg=COLOR_FONDO)
         
+        # Variables
+        self.var_desde = tk.StringVar()
+        self.var_hasta = tk.StringVar()
+        
         self.crear_interfaz()
     
     def crear_interfaz(self):
@@ -1889,6 +1961,30 @@ class VentanaReportes:
             width=20
         ).pack(side=tk.LEFT, padx=10, pady=10)
         
+        tk.Button(
+            frame_botones, 
+            text="SEMANA", 
+            command=self.reporte_semana_actual,
+            **ESTILO_BOTON_EXITO,
+            width=10
+        ).pack(side=tk.LEFT, padx=10, pady=10)
+        
+        tk.Button(
+            frame_botones, 
+            text="MES", 
+            command=self.reporte_mes_actual,
+            **ESTILO_BOTON_EXITO,
+            width=10
+        ).pack(side=tk.LEFT, padx=10, pady=10)
+        
+        tk.Button(
+            frame_botones, 
+            text="ANÁLISIS", 
+            command=self.reporte_analitico,
+            **ESTILO_BOTON_PRINCIPAL,
+            width=10
+        ).pack(side=tk.LEFT, padx=10, pady=10)
+        
         tk.Button(
             frame_botones, 
             text="GENERAR REPORTE CSV", 
@@ -1905,6 +2001,23 @@ class VentanaReportes:
             width=25
         ).pack(side=tk.LEFT, padx=10, pady=10)
         
+        tk.Button(
+            frame_botones, 
+            text="PAQUETE DEL MES (XLSX)", 
+            command=self.exportar_paquete_mensual,
+            **ESTILO_BOTON_PRINCIPAL,
+            width=25
+        ).pack(side=tk.LEFT, padx=10, pady=10)
+        
+        # Rango de fechas para las exportaciones CSV
+        frame_rango = tk.Frame(frame_principal, **ESTILO_FRAME_SECUNDARIO)
+        frame_rango.pack(fill=tk.X, pady=(0, 10))
+        
+        tk.Label(frame_rango, text="Exportar desde (AAAA-MM-DD):", **ESTILO_LABEL_NORMAL).pack(side=tk.LEFT, padx=10)
+        tk.Entry(frame_rango, textvariable=self.var_desde, **ESTILO_ENTRY, width=12).pack(side=tk.LEFT, padx=5)
+        tk.Label(frame_rango, text="hasta:", **ESTILO_LABEL_NORMAL).pack(side=tk.LEFT, padx=10)
+        tk.Entry(frame_rango, textvariable=self.var_hasta, **ESTILO_ENTRY, width=12).pack(side=tk.LEFT, padx=5)
+        
         # Text widget para mostrar reportes
         frame_texto = tk.Frame(frame_principal, **ESTILO_FRAME_SECUNDARIO)
         frame_texto.pack(fill=tk.BOTH, expand=True)
@@ -1924,72 +2037,127 @@ class VentanaReportes:
     def reporte_dia_actual(self):
         """Genera reporte de ventas del día actual"""
         reporte = self.generador_reportes.generar_reporte_diario()
+        self.mostrar_resumen("REPORTE DE VENTAS DEL DÍA", f"Fecha: {reporte['fecha']}", reporte)
+    
+    def reporte_semana_actual(self):
+        """Genera reporte de ventas de la semana actual"""
+        reporte = self.generador_reportes.generar_reporte_semanal()
+        self.mostrar_resumen("REPORTE DE VENTAS DE LA SEMANA",
+                             f"Del {reporte['desde']} al {reporte['hasta']}", reporte, por_dia=True)
+    
+    def reporte_mes_actual(self):
+        """Genera reporte de ventas del mes actual"""
+        reporte = self.generador_reportes.generar_reporte_mensual()
+        self.mostrar_resumen("REPORTE DE VENTAS DEL MES", f"Mes: {reporte['mes']}", reporte, por_dia=True)
+    
+    def reporte_analitico(self):
+        """Muestra más vendidos, ingresos por clasificación y proveedor, margen y ventas por hora"""
+        gestor_ventas = self.generador_reportes.gestor_ventas
+        if gestor_ventas.analitica is None:
+            # La primera vez se lee todo el historial: en segundo plano, y al terminar se muestra el reporte
+            ejecutar_tarea(self.ventana, "Preparando análisis", gestor_ventas.preparar_analitica,
+                           self.reporte_analitico)
+            return
+        reporte = self.generador_reportes.generar_reporte_analitico()
+        margen = reporte['margen']
+        
+        texto = "=" * 50 + "\n"
+        texto += "ANÁLISIS DE VENTAS (historial completo)\n"
+        texto += "=" * 50 + "\n\n"
+        texto += f"Importe: {formatear_moneda(margen['importe'])}  Costo: {formatear_moneda(margen['costo'])}\n"
+        texto += f"Margen: {formatear_moneda(margen['margen'])} ({margen['porcentaje']}%)\n"
+        
+        texto += "\nMÁS VENDIDOS\n" + "-" * 50 + "\n"
+        for prod in reporte['mas_vendidos']:
+            texto += f"{prod['nombre']} ({prod['codigo_barras']}): {prod['unidades']} - {formatear_moneda(prod['importe'])}\n"
+        
+        for titulo, clave in (("POR CLASIFICACIÓN", 'por_clasificacion'), ("POR PROVEEDOR", 'por_proveedor')):
+            campo = 'clasificacion' if clave == 'por_clasificacion' else 'proveedor'
+            texto += f"\n{titulo}\n" + "-" * 50 + "\n"
+            for fila in reporte[clave]:
+                texto += (f"{fila[campo]}: {formatear_moneda(fila['importe'])} "
+                          f"(margen {formatear_moneda(fila['margen'])})\n")
+        
+        texto += "\nPOR HORA\n" + "-" * 50 + "\n"
+        for hora, lineas, importe in reporte['por_hora']:
+            texto += f"{hora:02d}:00 - {lineas} líneas - {formatear_moneda(importe)}\n"
+        texto += "\n" + "=" * 50 + "\n\n"
         
+        self.mostrar_reporte(texto)
+    
+    def mostrar_resumen(self, titulo, periodo, reporte, por_dia=False):
+        """Muestra un resumen de ventas leído de los agregados diarios"""
         texto = "=" * 50 + "\n"
-        texto += f"REPORTE DE VENTAS DEL DÍA\n"
-        texto += f"Fecha: {reporte['fecha']}\n"
+        texto += f"{titulo}\n"
+        texto += f"{periodo}\n"
         texto += "=" * 50 + "\n\n"
         texto += f"Cantidad de ventas: {reporte['cantidad_ventas']}\n"
         texto += f"Total vendido: {formatear_moneda(reporte['total'])}\n"
+        texto += f"IVA: {formatear_moneda(reporte['iva'])}\n"
+        texto += f"Descuento por mayoreo: {formatear_moneda(reporte['descuento'])}\n"
+        texto += f"Unidades vendidas: {reporte['unidades']}\n"
+        texto += f"Costo de lo vendido: {formatear_moneda(reporte['costo'])}\n"
+        if por_dia and reporte['dias']:
+            texto += "\n" + "-" * 50 + "\n"
+            for dia, total, ventas in reporte['dias']:
+                texto += f"{dia}: {ventas} ventas - {formatear_moneda(total)}\n"
         texto += "\n" + "=" * 50 + "\n\n"
         
         self.mostrar_reporte(texto)
     
     def generar_reporte_csv(self):
         """Genera reporte en formato CSV"""
-        try:
-            self.generador_reportes.generar_reporte_csv()
-            messagebox.showinfo("Éxito", "Reporte CSV generado exitosamente")
-        except Exception as e:
-            messagebox.showerror("Error", f"Error al generar reporte CSV: {str(e)}")
+        rango = leer_rango_fechas(self.var_desde, self.var_hasta)
+        if rango is None:
+            return
+        
+        ejecutar_tarea(
+            self.ventana, "Generando reporte CSV",
+            lambda progreso: self.generador_reportes.generar_reporte_csv(
+                'reporte_ventas.csv', *rango, progreso=progreso)
+        )
     
     def exportar_datos_completos(self):
         """Exporta datos completos de ventas"""
+        rango = leer_rango_fechas(self.var_desde, self.var_hasta)
+        if rango is None:
+            return
+        
         ruta = filedialog.asksaveasfilename(
             defaultextension=".csv",
-            filetypes=[("Archivos CSV", "*.csv"), ("Todos los archivos", "*.*")]
+            filetypes=[("Archivos CSV", "*.csv"), ("Excel", "*.xlsx"), ("Todos los archivos", "*.*")]
         )
         
         if not ruta:
             return
         
-        try:
-            import csv
-            from metodos import GestorVentas
-            
-            # Obtener todas las ventas
-            ventas = self.generador_reportes.gestor_ventas.obtener_historial()
-            
-            if not ventas:
-                messagebox.showerror("Error", "No hay datos para exportar")
-                return
-            
-            # Crear archivo CSV
-            with open(ruta, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                writer.writerow(['Folio', 'Fecha', 'Producto', 'Descripción', 'Cantidad', 
-                               'Precio Unitario', 'Subtotal', 'IVA', 'Total', 'Pago', 'Cambio'])
-                
-                for venta in ventas:
-                    for producto in venta.get('productos', []):
-                        writer.writerow([
-                            venta.get('folio', ''),
-                            venta.get('fecha', ''),
-                            producto.get('nombre', ''),
-                            producto.get('descripcion', ''),
-                            producto.get('cantidad', 0),
-                            producto.get('precio_aplicado', producto.get('precio', 0)),
-                            producto.get('subtotal', 0),
-                            venta.get('iva', 0),
-                            venta.get('total', 0),
-                            venta.get('pago', 0),
-                            venta.get('cambio', 0)
-                        ])
-            
-            messagebox.showinfo("Éxito", f"Datos exportados a:\n{ruta}")
-            
-        except Exception as e:
-            messagebox.showerror("Error", f"Error al exportar datos: {str(e)}")
+        if ruta.lower().endswith('.xlsx'):
+            exportar = lambda progreso: self.generador_reportes.exportar_ventas_xlsx(ruta, *rango, progreso=progreso)
+        else:
+            exportar = lambda progreso: self.generador_reportes.exportar_datos_completos(ruta, *rango, progreso=progreso)
+        ejecutar_tarea(self.ventana, "Exportando ventas", exportar)
+    
+    def exportar_paquete_mensual(self):
+        """Exporta catálogo, clientes, proveedores y ventas del mes en un solo XLSX (mes del campo 'desde' o el actual)"""
+        rango = leer_rango_fechas(self.var_desde, self.var_hasta)
+        if rango is None:
+            return
+        mes = rango[0][:7] if rango[0] else datetime.now().strftime('%Y-%m')
+        
+        ruta = filedialog.asksaveasfilename(
+            defaultextension=".xlsx",
+            filetypes=[("Excel", "*.xlsx"), ("Todos los archivos", "*.*")],
+            initialfile=f"paquete_{mes}.xlsx"
+        )
+        
+        if not ruta:
+            return
+        
+        ejecutar_tarea(
+            self.ventana, "Exportando paquete del mes",
+            lambda progreso: self.generador_reportes.exportar_paquete_mensual(
+                ruta, mes, self.gestor_clientes, self.gestor_proveedores, progreso)
+        )
     
     def mostrar_reporte(self, texto):
         """Muestra el reporte en el text widget"""
@@ -1,12 +1,21 @@
 # metodos.py - Logica del negocio y funciones del punto de venta
 
-from datetime import datetime
-from typing import List, Dict, Optional, Tuple
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 import json
 import os
 import csv
 import re
+import time
+from contextlib import contextmanager
+from bisect import bisect_left, bisect_right, insort
+from itertools import islice
 from openpyxl import Workbook, load_workbook
+import dinero
+from precios import obtener_reglas_precios
+from catalogo import CAMPOS_CATALOGO, obtener_catalogo
+from almacenamiento import Almacenamiento, obtener_almacenamiento, mes_de_venta, MES_SIN_FECHA
+from busqueda import IndiceProductos, IndiceCodigos, SesionBusqueda, BuscadorDifuso
 
 def validar_email(email: str) -> bool:
     """Valida el formato de un correo electronico"""
@@ -32,9 +41,97 @@ def validar_numero(valor, tipo: str = "float") -> bool:
         return False
 
 
+# Filas que se validan y aplican por lote en las importaciones masivas
+FILAS_POR_LOTE = 5000
+
+
+@contextmanager
+def abrir_tabla(ruta: str):
+    """Abre un CSV o XLSX y entrega (encabezados, iterador de filas); el XLSX se lee en modo sólo lectura"""
+    if ruta.lower().endswith('.xlsx'):
+        wb = load_workbook(ruta, read_only=True, data_only=True)
+        try:
+            filas = wb.active.iter_rows(values_only=True)
+            encabezados = [texto_celda(valor) for valor in next(filas, ())]
+            yield encabezados, filas
+        finally:
+            wb.close()
+    else:
+        with open(ruta, 'r', encoding='utf-8-sig', newline='') as f:
+            filas = csv.reader(f)
+            encabezados = [valor.strip() for valor in next(filas, [])]
+            yield encabezados, filas
+
+
+def lotes(filas: Iterable, tamano: int = FILAS_POR_LOTE) -> Iterator[list]:
+    """Agrupa un iterador de filas en listas de hasta `tamano` elementos"""
+    filas = iter(filas)
+    while True:
+        lote = list(islice(filas, tamano))
+        if not lote:
+            return
+        yield lote
+
+
+def texto_celda(valor) -> str:
+    """Texto de una celda de CSV o XLSX (los números enteros de Excel llegan como float: 7501.0 -> '7501')"""
+    if valor is None:
+        return ''
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return str(valor).strip()
+
+
+def registros_tabla(filas: Iterable, columnas: List[Tuple[int, str]],
+                    progreso: Callable[[int], None] = None) -> Iterator[Tuple[int, Dict[str, str]]]:
+    """Recorre las filas por lotes como (línea, {campo: texto}) con columnas ya ubicadas; omite filas vacías"""
+    leidas = 0
+    for lote in lotes(filas):
+        for linea, fila in enumerate(lote, start=leidas + 2):
+            registro = {campo: texto_celda(fila[indice]) if indice < len(fila) else '' for indice, campo in columnas}
+            if any(registro.values()):
+                yield linea, registro
+        leidas += len(lote)
+        if progreso:
+            progreso(leidas)
+
+
+def escribir_xlsx(ruta: str, hojas: List[Tuple[str, List[str], Iterable[list]]],
+                  progreso: Callable[[int], None] = None) -> int:
+    """Escribe un XLSX en modo sólo escritura (cada fila va directo al archivo); una hoja por (título, encabezados, filas)"""
+    wb = Workbook(write_only=True)
+    # Se arma en un temporal que sólo reemplaza a ruta si tiene filas: un error, una cancelación
+    # o un periodo vacío no dejan un archivo a medias ni borran el que ya existía
+    temporal = ruta + '.tmp'
+    escritas = 0
+    try:
+        for titulo, encabezados, filas in hojas:
+            ws = wb.create_sheet(title=titulo)
+            ws.append(encabezados)
+            for fila in filas:
+                ws.append(fila)
+                escritas += 1
+                if progreso and escritas % FILAS_POR_LOTE == 0:
+                    progreso(escritas)
+        wb.save(temporal)
+        if escritas:
+            os.replace(temporal, ruta)
+    except BaseException:
+        # Hojas sin guardar: se cierran para liberar sus archivos temporales de openpyxl
+        for ws in wb.worksheets:
+            ws.close()
+        raise
+    finally:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+    if progreso:
+        progreso(escritas)
+    return escritas
+
+
 def formatear_moneda(valor: float) -> str:
     """Formatea un valor como moneda"""
-    return f"${valor:,.2f}"
+    return dinero.formatear(dinero.a_centavos(valor))
 
 
 def obtener_regimenes_fiscales() -> List[Dict[str, str]]:
@@ -95,37 +192,79 @@ def obtener_usos_cfdi() -> List[Dict[str, str]]:
         {'clave': 'D15', 'descripcion': 'Pago referente a servicios funerarios'},
     ]
 
+def campo_producto(clave: str, defecto=''):
+    """Atributo de sólo lectura que se lee del diccionario del producto"""
+    return property(lambda self: self.datos.get(clave, defecto))
+
+
 class ProductoVenta:
-    """Clase para representar un producto en la venta"""
+    """Clase para representar un producto en la venta (referencia al producto, sin copiar sus campos)"""
+    __slots__ = ('codigo_barras', 'datos', 'cantidad', 'centavos_minorista', 'centavos_mayoreo', 'tabla_precios')
+    
+    codigo = campo_producto('codigo')
+    numero_producto = campo_producto('numero_producto')
+    nombre = campo_producto('nombre')
+    descripcion = campo_producto('descripcion')
+    clasificacion = campo_producto('clasificacion')
+    proveedor = campo_producto('proveedor')
+    unidad = campo_producto('unidad', 'pz')
+    fabricante = campo_producto('fabricante')
+    tipo = campo_producto('tipo')
+    codigoA = campo_producto('codigoA')
+    codigoB = campo_producto('codigoB')
+    codigoC = campo_producto('codigoC')
+    
     def __init__(self, codigo_barras: str, datos_producto: Dict, cantidad: int = 1):
         self.codigo_barras = codigo_barras
-        self.codigo = datos_producto.get('codigo', '')
-        self.numero_producto = datos_producto.get('numero_producto', '')
-        self.nombre = datos_producto.get('nombre', '')
-        self.descripcion = datos_producto.get('descripcion', '')
-        self.clasificacion = datos_producto.get('clasificacion', '')
-        self.precio_minorista = float(datos_producto.get('precio_minorista', 0))
-        self.precio_mayoreo = float(datos_producto.get('precio_mayoreo', 0))
-        self.costo = float(datos_producto.get('costo', 0))
-        self.proveedor = datos_producto.get('proveedor', '')
-        self.unidad = datos_producto.get('unidad', 'pz')
-        self.fabricante = datos_producto.get('fabricante', '')
-        self.tipo = datos_producto.get('tipo', '')
-        self.codigoA = datos_producto.get('codigoA', '')
-        self.codigoB = datos_producto.get('codigoB', '')
-        self.codigoC = datos_producto.get('codigoC', '')
+        self.datos = datos_producto
         self.cantidad = cantidad
+        # Precios en centavos enteros: toda la aritmética de la venta se hace con ellos
+        self.centavos_minorista = dinero.a_centavos(datos_producto.get('precio_minorista', 0))
+        self.centavos_mayoreo = dinero.a_centavos(datos_producto.get('precio_mayoreo', 0))
+        # Escalas de precio por volumen vigentes al capturar la línea (no cambian durante la venta)
+        self.tabla_precios = obtener_reglas_precios().tabla(
+            codigo_barras, self.clasificacion, self.centavos_minorista, self.centavos_mayoreo
+        )
+    
+    @property
+    def precio_minorista(self) -> float:
+        return dinero.a_pesos(self.centavos_minorista)
+    
+    @property
+    def precio_mayoreo(self) -> float:
+        return dinero.a_pesos(self.centavos_mayoreo)
+    
+    @property
+    def costo(self) -> float:
+        return float(self.datos.get('costo', 0) or 0)
     
     def obtener_precio_unitario(self) -> float:
-        """Obtiene el precio unitario según la cantidad (regla: 6+ piezas = mayoreo)"""
-        if self.cantidad >= 6:
-            return self.precio_mayoreo
-        return self.precio_minorista
+        """Obtiene el precio unitario según la cantidad y las escalas de precio del producto"""
+        return dinero.a_pesos(self.precio_unitario_centavos())
+    
+    def precio_unitario_centavos(self) -> int:
+        """Precio unitario en centavos según la cantidad"""
+        return self.tabla_precios.precio(self.cantidad)
+    
+    def es_mayoreo(self) -> bool:
+        """Indica si la cantidad alcanza una escala de precio por volumen"""
+        return self.tabla_precios.es_mayoreo(self.cantidad)
+    
+    def subtotal_centavos(self) -> int:
+        """Subtotal del producto en centavos"""
+        return self.precio_unitario_centavos() * self.cantidad
+    
+    def ahorro_centavos(self) -> int:
+        """Ahorro en centavos por precio de mayoreo (0 si no aplica)"""
+        escala = self.tabla_precios.escala(self.cantidad)
+        if escala:
+            # Una escala con precio mayor al base (regla con precio fijo) no es un ahorro negativo
+            return max(self.tabla_precios.precio_base - self.tabla_precios.precios[escala], 0) * self.cantidad
+        return 0
     
     def subtotal(self) -> float:
         """Calcula el subtotal del producto aplicando precio según cantidad"""
-        precio_unitario = self.obtener_precio_unitario()
-        return precio_unitario * self.cantidad
+        return dinero.a_pesos(self.subtotal_centavos())
     
     def to_dict(self) -> Dict:
         """Convierte el producto a diccionario"""
@@ -150,30 +289,310 @@ class ProductoVenta:
             "codigoC": self.codigoC,
             "cantidad": self.cantidad,
             "subtotal": self.subtotal(),
-            "es_mayoreo": self.cantidad >= 6
+            "es_mayoreo": self.es_mayoreo(),
+            "ahorro": dinero.a_pesos(self.ahorro_centavos())
         }
+    
+    def linea_venta(self, version: int) -> Dict:
+        """Línea compacta para el historial; el resto de los datos se obtiene de la versión del catálogo"""
+        return {
+            "codigo_barras": self.codigo_barras,
+            "nombre": self.nombre,
+            "cantidad": self.cantidad,
+            "precio_aplicado": self.obtener_precio_unitario(),
+            "costo": self.costo,
+            "version": version,
+            # La escala y el ahorro se guardan como los calculó el carrito (las reglas pueden cambiar)
+            "es_mayoreo": self.es_mayoreo(),
+            "ahorro": dinero.a_pesos(self.ahorro_centavos())
+        }
+
+
+def expandir_linea(linea: Dict) -> Dict:
+    """Línea de venta con todos sus campos (las líneas completas del formato anterior se devuelven igual)"""
+    if 'version' not in linea:
+        return linea
+    ficha = obtener_catalogo().resolver(linea.get('codigo_barras', ''), linea['version'])
+    cantidad = linea.get('cantidad', 0)
+    precio_aplicado = dinero.a_centavos(linea.get('precio_aplicado', 0))
+    precio_minorista = dinero.a_centavos(ficha.get('precio_minorista', 0))
+    if 'es_mayoreo' in linea:
+        es_mayoreo = bool(linea['es_mayoreo'])
+        ahorro = dinero.a_centavos(linea.get('ahorro', 0))
+    else:
+        # Líneas compactas sin escala guardada: mayoreo es un precio por debajo del minorista de esa versión
+        es_mayoreo = precio_aplicado < precio_minorista
+        ahorro = (precio_minorista - precio_aplicado) * cantidad if es_mayoreo else 0
+    completa = {campo: '' for campo in CAMPOS_CATALOGO}
+    completa.update(ficha)
+    completa.update({
+        "codigo_barras": linea.get('codigo_barras', ''),
+        "nombre": linea.get('nombre', ''),
+        "precio_minorista": dinero.a_pesos(precio_minorista),
+        "precio_mayoreo": float(ficha.get('precio_mayoreo', 0)),
+        "precio_aplicado": dinero.a_pesos(precio_aplicado),
+        "costo": linea.get('costo', 0),
+        "unidad": ficha.get('unidad', 'pz'),
+        "cantidad": cantidad,
+        "subtotal": dinero.a_pesos(precio_aplicado * cantidad),
+        "es_mayoreo": es_mayoreo,
+        "ahorro": dinero.a_pesos(ahorro)
+    })
+    return completa
+
+
+def ahorro_linea(linea: Dict) -> int:
+    """Ahorro por mayoreo de una línea completa en centavos (el guardado, o el del minorista en registros anteriores)"""
+    if 'ahorro' in linea:
+        return dinero.a_centavos(linea['ahorro'])
+    if not linea.get('es_mayoreo', False):
+        return 0
+    precio = linea.get('precio_aplicado', linea.get('precio', 0))
+    return (dinero.a_centavos(linea.get('precio_minorista', 0)) - dinero.a_centavos(precio)) * linea.get('cantidad', 0)
+
+
+def detalle_de_lineas(lineas: List[Dict]) -> Dict:
+    """Desglose de precios minorista/mayoreo a partir de líneas de venta completas"""
+    detalle = {
+        'productos_minorista': [],
+        'productos_mayoreo': [],
+        'total_minorista': 0,
+        'total_mayoreo': 0,
+        'descuento_total': 0
+    }
+    total_minorista = total_mayoreo = descuento_total = 0
+    for prod in lineas:
+        cantidad = prod.get('cantidad', 0)
+        precio = dinero.a_centavos(prod.get('precio_aplicado', prod.get('precio', 0)))
+        subtotal = dinero.a_centavos(prod.get('subtotal', 0))
+        if prod.get('es_mayoreo', False):
+            ahorro = ahorro_linea(prod)
+            detalle['productos_mayoreo'].append({
+                'nombre': prod.get('nombre', ''),
+                'cantidad': cantidad,
+                'precio_mayoreo': dinero.a_pesos(precio),
+                'precio_minorista': prod.get('precio_minorista', 0),
+                'subtotal': dinero.a_pesos(subtotal),
+                'ahorro': dinero.a_pesos(ahorro)
+            })
+            total_mayoreo += subtotal
+            descuento_total += ahorro
+        else:
+            detalle['productos_minorista'].append({
+                'nombre': prod.get('nombre', ''),
+                'cantidad': cantidad,
+                'precio': dinero.a_pesos(precio),
+                'subtotal': dinero.a_pesos(subtotal)
+            })
+            total_minorista += subtotal
+    detalle['total_minorista'] = dinero.a_pesos(total_minorista)
+    detalle['total_mayoreo'] = dinero.a_pesos(total_mayoreo)
+    detalle['descuento_total'] = dinero.a_pesos(descuento_total)
+    return detalle
+
+
+def registros_venta(ventas: List[Dict]) -> List['VentaRegistrada']:
+    """Envuelve los registros leídos del almacenamiento"""
+    return [VentaRegistrada.de(venta) for venta in ventas]
+
+
+# Campos que los registros anteriores guardaban y que ahora se derivan de las líneas y el pago
+CAMPOS_DERIVADOS_VENTA = ('detalle_precios', 'productos_con_descuento', 'descuento_total', 'cambio')
+
+
+class VentaRegistrada(dict):
+    """Registro de venta con sólo los datos de origen; los campos derivados se calculan al pedirse y se memorizan"""
+    __slots__ = ('derivados',)
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Fuera del diccionario: lo memorizado no se guarda junto con la venta
+        self.derivados = {}
+    
+    @classmethod
+    def de(cls, venta: Dict) -> 'VentaRegistrada':
+        """Envuelve un registro (los que ya están envueltos se devuelven igual)"""
+        return venta if isinstance(venta, cls) else cls(venta)
+    
+    def __missing__(self, clave):
+        if clave not in CAMPOS_DERIVADOS_VENTA:
+            raise KeyError(clave)
+        if clave not in self.derivados:
+            self.derivados[clave] = self.calcular(clave)
+        return self.derivados[clave]
+    
+    def get(self, clave, defecto=None):
+        if clave in self or clave in CAMPOS_DERIVADOS_VENTA:
+            return self[clave]
+        return defecto
+    
+    def lineas(self) -> List[Dict]:
+        """Líneas de la venta con todos sus campos"""
+        if 'lineas' not in self.derivados:
+            self.derivados['lineas'] = [expandir_linea(linea) for linea in dict.get(self, 'productos', [])]
+        return self.derivados['lineas']
+    
+    def calcular(self, clave: str):
+        """Calcula un campo derivado (los registros anteriores ya lo traen guardado)"""
+        if clave == 'cambio':
+            pago = dinero.a_centavos(dict.get(self, 'pago', 0))
+            return dinero.a_pesos(max(0, pago - dinero.a_centavos(dict.get(self, 'total', 0))))
+        if clave == 'detalle_precios':
+            return detalle_de_lineas(self.lineas())
+        if clave == 'productos_con_descuento':
+            return len(self['detalle_precios']['productos_mayoreo'])
+        return self['detalle_precios']['descuento_total']
+
+
+class CarritoVenta:
+    """Productos de la venta actual indexados por código de barras, con totales acumulados en centavos"""
+    def __init__(self):
+        # codigo_barras -> ProductoVenta (el dict conserva el orden de captura)
+        self.lineas = {}
+        self.reiniciar_totales()
+
+    def reiniciar_totales(self) -> None:
+        """Pone en cero los totales acumulados"""
+        self.subtotal = 0
+        self.total_minorista = 0
+        self.total_mayoreo = 0
+        self.descuento_total = 0
+        self.lineas_mayoreo = 0
+
+    def __len__(self) -> int:
+        return len(self.lineas)
+
+    def __iter__(self):
+        return iter(self.lineas.values())
+
+    def __contains__(self, codigo_barras: str) -> bool:
+        return codigo_barras in self.lineas
+
+    def obtener(self, codigo_barras: str) -> Optional[ProductoVenta]:
+        """Obtiene la línea de un producto, o None si no está en la venta"""
+        return self.lineas.get(codigo_barras)
+
+    def acumular(self, prod: ProductoVenta, signo: int) -> None:
+        """Suma (signo=1) o resta (signo=-1) el aporte de una línea a los totales"""
+        subtotal = prod.subtotal_centavos()
+        self.subtotal += signo * subtotal
+        if prod.es_mayoreo():
+            self.total_mayoreo += signo * subtotal
+            self.descuento_total += signo * prod.ahorro_centavos()
+            self.lineas_mayoreo += signo
+        else:
+            self.total_minorista += signo * subtotal
+
+    def agregar(self, prod: ProductoVenta) -> None:
+        """Agrega una línea nueva (o reemplaza la existente del mismo código)"""
+        self.eliminar(prod.codigo_barras)
+        self.lineas[prod.codigo_barras] = prod
+        self.acumular(prod, 1)
+
+    def cambiar_cantidad(self, codigo_barras: str, cantidad: int) -> Optional[ProductoVenta]:
+        """Cambia la cantidad de una línea ajustando los totales sólo por la diferencia"""
+        prod = self.lineas.get(codigo_barras)
+        if prod is None:
+            return None
+        self.acumular(prod, -1)
+        prod.cantidad = cantidad
+        self.acumular(prod, 1)
+        return prod
+
+    def eliminar(self, codigo_barras: str) -> Optional[ProductoVenta]:
+        """Quita una línea de la venta y descuenta su aporte de los totales"""
+        prod = self.lineas.pop(codigo_barras, None)
+        if prod is not None:
+            self.acumular(prod, -1)
+        return prod
+
+    def limpiar(self) -> None:
+        """Vacía la venta"""
+        self.lineas = {}
+        self.reiniciar_totales()
+
+
+# Columnas de plantilla_inventario.csv y el campo del producto que llena cada una
+COLUMNAS_INVENTARIO = {
+    'Codigo Barras': 'codigo_barras',
+    'Codigo': 'codigo',
+    'Numero Producto': 'numero_producto',
+    'Nombre': 'nombre',
+    'Descripcion': 'descripcion',
+    'Clasificacion': 'clasificacion',
+    'Precio Minorista': 'precio_minorista',
+    'Precio Mayoreo': 'precio_mayoreo',
+    'Costo': 'costo',
+    'Proveedor': 'proveedor',
+    'Unidad': 'unidad',
+    'Fabricante': 'fabricante',
+    'Tipo': 'tipo',
+    'Codigo A': 'codigoA',
+    'Codigo B': 'codigoB',
+    'Codigo C': 'codigoC',
+    'Stock': 'stock'
+}
+CAMPOS_IMPORTE = ('precio_minorista', 'precio_mayoreo', 'costo')
+# actualizar: sólo las columnas con datos; omitir: no toca los existentes; sobrescribir: reemplaza el registro
+MODOS_IMPORTACION = ('actualizar', 'omitir', 'sobrescribir')
+
+
+def producto_vacio(fecha: str) -> Dict:
+    """Producto con los valores por defecto de agregar_producto"""
+    return {
+        'codigo': '', 'numero_producto': '', 'nombre': '', 'descripcion': '', 'clasificacion': '',
+        'precio_minorista': 0, 'precio_mayoreo': 0, 'costo': 0, 'proveedor': '', 'unidad': 'pz',
+        'fabricante': '', 'tipo': '', 'codigoA': '', 'codigoB': '', 'codigoC': '', 'stock': 0,
+        'fecha_creacion': fecha, 'fecha_actualizacion': fecha
+    }
 
 
 class Gestor_Inventario:
     """Clase para gestionar el inventario de productos"""
-    def __init__(self):
+    def __init__(self, almacenamiento: Almacenamiento = None):
         self.productos = {}
+        self.indice = IndiceProductos()
+        self.indice_codigos = IndiceCodigos()
+        self.buscador = BuscadorDifuso()
+        self.codigos_duplicados = {}
+        self.almacenamiento = almacenamiento or obtener_almacenamiento()
         self.cargar_inventario()
     
     def cargar_inventario(self, archivo: str = 'inventario.json') -> None:
-        """Carga el inventario desde archivo JSON"""
-        if os.path.exists(archivo):
-            try:
-                with open(archivo, 'r', encoding='utf-8') as f:
-                    self.productos = json.load(f)
-            except Exception as e:
-                print(f"Error al cargar inventario: {e}")
+        """Carga el inventario desde el almacenamiento"""
+        try:
+            self.productos = self.almacenamiento.cargar('inventario', archivo)
+        except Exception as e:
+            print(f"Error al cargar inventario: {e}")
+        self.construir_indices()
+    
+    def construir_indices(self) -> None:
+        """Reconstruye los índices de búsqueda y reporta códigos repetidos"""
+        self.indice.construir(self.productos)
+        self.buscador.construir(self.productos)
+        self.codigos_duplicados = self.indice_codigos.construir(self.productos)
+        if self.codigos_duplicados:
+            ejemplos = ', '.join(f"{codigo} ({len(cbs)} productos)"
+                                 for codigo, cbs in list(self.codigos_duplicados.items())[:5])
+            print(f"Advertencia: {len(self.codigos_duplicados)} códigos repetidos en el inventario: {ejemplos}")
+    
+    def indexar_producto(self, codigo_barras: str) -> None:
+        """Actualiza los índices de búsqueda de un producto"""
+        self.indice.agregar(codigo_barras, self.productos[codigo_barras])
+        self.indice_codigos.agregar(codigo_barras, self.productos[codigo_barras])
+        self.buscador.agregar(codigo_barras, self.productos[codigo_barras])
     
     def guardar_inventario(self, archivo: str = 'inventario.json') -> None:
-        """Guarda el inventario en archivo JSON"""
+        """Guarda el inventario completo en el almacenamiento"""
         try:
-            with open(archivo, 'w', encoding='utf-8') as f:
-                json.dump(self.productos, f, ensure_ascii=False, indent=2)
+            self.almacenamiento.guardar('inventario', self.productos, archivo)
+        except Exception as e:
+            print(f"Error al guardar inventario: {e}")
+    
+    def persistir_productos(self, codigos: List[str], eliminados: List[str] = None) -> None:
+        """Guarda sólo los productos modificados o eliminados"""
+        try:
+            self.almacenamiento.guardar_registros('inventario', self.productos, codigos, eliminados)
         except Exception as e:
             print(f"Error al guardar inventario: {e}")
     
@@ -189,10 +608,55 @@ class Gestor_Inventario:
         """Actualiza el stock de un producto"""
         if codigo in self.productos:
             self.productos[codigo]['stock'] = self.productos[codigo].get('stock', 0) + cantidad
-            self.guardar_inventario()
+            self.persistir_productos([codigo])
             return True
         return False
     
+    def aplicar_movimientos_stock(self, movimientos: List[Tuple[str, int]],
+                                  permitir_negativo: bool = False) -> Tuple[bool, str]:
+        """Aplica un lote de movimientos de stock (ventas, recepción de mercancía, conteos) con una sola escritura"""
+        # Todo el lote se valida junto; si algo falla no se aplica ningún movimiento
+        # Agrupar movimientos del mismo producto
+        deltas = {}
+        for codigo, cantidad in movimientos:
+            deltas[codigo] = deltas.get(codigo, 0) + cantidad
+        
+        if not deltas:
+            return (True, "No hay movimientos de stock por aplicar")
+        
+        # Validar el lote completo antes de tocar el inventario
+        for codigo, delta in deltas.items():
+            if codigo not in self.productos:
+                return (False, f"Producto no encontrado: {codigo}")
+            nuevo_stock = self.productos[codigo].get('stock', 0) + delta
+            if nuevo_stock < 0 and not permitir_negativo:
+                nombre = self.productos[codigo].get('nombre', codigo)
+                return (False, f"Stock insuficiente para: {nombre}")
+        
+        # Aplicar en memoria conservando los valores anteriores para revertir
+        anteriores = {codigo: self.productos[codigo].get('stock', 0) for codigo in deltas}
+        for codigo, delta in deltas.items():
+            self.productos[codigo]['stock'] = anteriores[codigo] + delta
+        
+        # Escritura inmediata: el lote debe poder revertirse si el guardado falla
+        try:
+            self.almacenamiento.guardar_registros('inventario', self.productos, list(deltas), inmediato=True)
+        except Exception as e:
+            for codigo, stock in anteriores.items():
+                self.productos[codigo]['stock'] = stock
+            return (False, f"Error al guardar inventario, movimientos revertidos: {str(e)}")
+        
+        return (True, f"Stock actualizado: {len(deltas)} productos")
+    
+    def ajustar_conteo_fisico(self, conteos: Dict[str, int]) -> Tuple[bool, str]:
+        """Ajusta el stock al conteo físico indicado para cada código de barras"""
+        movimientos = []
+        for codigo, conteo in conteos.items():
+            if codigo not in self.productos:
+                return (False, f"Producto no encontrado: {codigo}")
+            movimientos.append((codigo, conteo - self.productos[codigo].get('stock', 0)))
+        return self.aplicar_movimientos_stock(movimientos)
+    
     def agregar_producto(self, 
                         codigo_barras: str,
                         codigo: str,
@@ -232,7 +696,8 @@ class Gestor_Inventario:
             'fecha_creacion': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
             'fecha_actualizacion': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         }
-        self.guardar_inventario()
+        self.indexar_producto(codigo_barras)
+        self.persistir_productos([codigo_barras])
     
     def editar_producto(self,
                        codigo_barras: str,
@@ -275,33 +740,71 @@ class Gestor_Inventario:
                     datetime.now().strftime('%Y-%m-%d %H:%M:%S')),
                 'fecha_actualizacion': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             }
-            self.guardar_inventario()
+            self.indexar_producto(codigo_barras)
+            self.persistir_productos([codigo_barras])
     
     def eliminar_producto(self, codigo_barras: str) -> bool:
         """Elimina un producto del inventario"""
         if codigo_barras in self.productos:
             del self.productos[codigo_barras]
-            self.guardar_inventario()
+            self.indice.eliminar(codigo_barras)
+            self.indice_codigos.eliminar(codigo_barras)
+            self.buscador.eliminar(codigo_barras)
+            self.persistir_productos([], eliminados=[codigo_barras])
             return True
         return False
     
     # MODIFICADO: Ahora busca principalmente por descripción
     def buscar_producto_por_descripcion(self, descripcion: str) -> List[Tuple[str, Dict]]:
         """Busca productos por descripción (ahora el método principal para punto de venta)"""
-        resultados = []
-        descripcion_lower = descripcion.lower()
-        
-        for codigo_barras, producto in self.productos.items():
-            # Buscar en múltiples campos relacionados con la descripción
-            if (descripcion_lower in producto.get('descripcion', '').lower() or
-                descripcion_lower in producto.get('nombre', '').lower() or
-                descripcion_lower in producto.get('clasificacion', '').lower() or
-                descripcion_lower in producto.get('fabricante', '').lower() or
-                descripcion_lower in producto.get('tipo', '').lower()):
-                
-                resultados.append((codigo_barras, producto))
-        
-        return resultados
+        # Busca en nombre, descripción, clasificación, fabricante y tipo mediante el índice
+        return [(codigo_barras, self.productos[codigo_barras])
+                for codigo_barras in self.indice.buscar(descripcion)]
+    
+    def clave_orden(self, consulta: str, orden: str = 'relevancia'):
+        """Clave para ordenar resultados: 'relevancia', 'stock' (mayor primero), 'nombre' o 'inventario' (None)"""
+        if orden == 'relevancia':
+            return self.indice.clave_relevancia(consulta)
+        if orden == 'stock':
+            return lambda cb: -(self.productos[cb].get('stock', 0) or 0)
+        if orden == 'nombre':
+            return lambda cb: str(self.productos[cb].get('nombre', '')).lower()
+        if orden == 'inventario':
+            return None
+        raise ValueError(f"Orden de búsqueda no válido: {orden}")
+    
+    def buscar_top_k(self, consulta: str, k: int = 10, orden: str = 'relevancia') -> List[Tuple[str, Dict]]:
+        """Busca por descripción y retorna sólo los k mejores resultados según el orden indicado"""
+        codigos = self.indice.buscar_top_k(consulta, k, self.clave_orden(consulta, orden))
+        return [(codigo_barras, self.productos[codigo_barras]) for codigo_barras in codigos]
+    
+    def buscar_difuso(self, consulta: str, k: int = 10) -> List[Tuple[str, Dict]]:
+        """Busca tolerando errores de escritura, acentos y sinónimos; ordena por relevancia y ventas"""
+        return [(codigo_barras, self.productos[codigo_barras])
+                for codigo_barras, _ in self.buscador.buscar(consulta, k)]
+    
+    def buscar_sugerencias(self, consulta: str, k: int = 10, sesion: SesionBusqueda = None) -> List[str]:
+        """Códigos de barras para el autocompletado: búsqueda difusa, completada con coincidencias de texto"""
+        codigos = [codigo_barras for codigo_barras, _ in self.buscador.buscar(consulta, k)]
+        if len(codigos) < k:
+            # Fragmentos a media palabra (ej. 'arti') sólo los encuentra la búsqueda por texto
+            clave = self.clave_orden(consulta, 'relevancia')
+            exactos = sesion.buscar_top_k(consulta, k, clave) if sesion else self.indice.buscar_top_k(consulta, k, clave)
+            vistos = set(codigos)
+            codigos.extend(cb for cb in exactos if cb not in vistos)
+        return codigos[:k]
+    
+    def registrar_popularidad(self, codigo_barras: str, cantidad) -> None:
+        """Registra unidades vendidas de un producto para ordenar la búsqueda"""
+        self.buscador.registrar_venta(codigo_barras, cantidad)
+    
+    def fijar_popularidad(self, popularidad: Dict[str, float]) -> None:
+        """Reemplaza las unidades vendidas por producto (totales de todo el historial)"""
+        self.buscador.fijar_popularidad(popularidad)
+    
+    def crear_sesion_busqueda(self) -> SesionBusqueda:
+        """Crea una sesión de búsqueda incremental por descripción (autocompletado)"""
+        return SesionBusqueda(self.indice)
     
     # Método auxiliar para búsqueda por código (para otras funcionalidades)
     def buscar_producto_por_codigo(self, codigo_busqueda: str) -> Optional[Tuple[str, Dict]]:
@@ -310,17 +813,17 @@ class Gestor_Inventario:
         if codigo_busqueda in self.productos:
             return (codigo_busqueda, self.productos[codigo_busqueda])
         
-        # 2. Buscar en los demás campos de código
-        for cb, producto in self.productos.items():
-            if (producto.get('codigo') == codigo_busqueda or
-                producto.get('numero_producto') == codigo_busqueda or
-                producto.get('codigoA') == codigo_busqueda or
-                producto.get('codigoB') == codigo_busqueda or
-                producto.get('codigoC') == codigo_busqueda):
-                return (cb, producto)
+        # 2. Buscar en los índices de los demás campos de código
+        cb = self.indice_codigos.buscar(codigo_busqueda)
+        if cb is not None:
+            return (cb, self.productos[cb])
         
         return None
     
+    def obtener_codigos_duplicados(self) -> Dict[str, List[str]]:
+        """Retorna los códigos alternos que comparten varios productos"""
+        return self.indice_codigos.buscar_duplicados()
+    
     def tiene_stock(self, codigo_barras: str, cantidad: int) -> bool:
         """Verifica si hay stock disponible"""
         if codigo_barras in self.productos:
@@ -336,21 +839,182 @@ class Gestor_Inventario:
                 resultados.append((codigo_barras, producto))
         return resultados
     
-    def importar_inventario(self, ruta: str, sobrescribir: bool = False) -> Tuple[bool, str]:
-        """Importa inventario desde un archivo JSON"""
+    def importar_inventario(self, ruta: str, sobrescribir: bool = False, modo: str = None,
+                            progreso: Callable[[int], None] = None) -> Tuple[bool, str]:
+        """Importa inventario desde un archivo JSON, o desde CSV/XLSX con el formato de la plantilla"""
+        exito, mensaje, cambios, reemplazar = self.leer_inventario(ruta, sobrescribir, modo, progreso)
+        if exito:
+            self.aplicar_importacion_inventario(cambios, reemplazar)
+        return (exito, mensaje)
+    
+    def leer_inventario(self, ruta: str, sobrescribir: bool = False, modo: str = None,
+                        progreso: Callable[[int], None] = None) -> Tuple[bool, str, Dict[str, Dict], bool]:
+        """Lee y valida un archivo de inventario sin modificar el inventario: (exito, mensaje, cambios, reemplazar)"""
+        if not ruta.lower().endswith('.json'):
+            exito, mensaje, cambios = self.leer_inventario_tabla(
+                ruta, modo or ('sobrescribir' if sobrescribir else 'actualizar'), progreso
+            )
+            return (exito, mensaje, cambios, False)
         try:
             with open(ruta, 'r', encoding='utf-8') as f:
                 datos_importados = json.load(f)
-            
-            if sobrescribir:
-                self.productos = datos_importados
-            else:
-                self.productos.update(datos_importados)
-            
+            return (True, f"Inventario importado: {len(datos_importados)} productos", datos_importados, sobrescribir)
+        except Exception as e:
+            return (False, f"Error al importar: {str(e)}", {}, False)
+    
+    def aplicar_importacion_inventario(self, cambios: Dict[str, Dict], reemplazar: bool = False) -> None:
+        """Aplica al inventario, sus índices y el almacenamiento los productos leídos por leer_inventario"""
+        if reemplazar:
+            self.productos = dict(cambios)
+            self.construir_indices()
             self.guardar_inventario()
-            return (True, f"Inventario importado: {len(datos_importados)} productos")
+            return
+        if not cambios:
+            return
+        self.productos.update(cambios)
+        # Índices y almacenamiento se actualizan una sola vez
+        if len(cambios) * 2 > len(self.productos):
+            self.construir_indices()
+        else:
+            for codigo_barras in cambios:
+                self.indexar_producto(codigo_barras)
+        self.persistir_productos(list(cambios))
+    
+    @staticmethod
+    def validar_lote_inventario(lote: List[tuple], columnas: List[Tuple[int, str]], primera_linea: int,
+                                importes: Dict) -> Tuple[List[Tuple[int, str, Dict]], List[Tuple[int, str]]]:
+        """Convierte un lote de filas a (línea, codigo_barras, campos); los importes repetidos se convierten una vez"""
+        validos, errores = [], []
+        for linea, fila in enumerate(lote, start=primera_linea):
+            campos = {}
+            for indice, campo in columnas:
+                if indice < len(fila):
+                    texto = texto_celda(fila[indice])
+                    if texto:
+                        campos[campo] = texto
+            codigo_barras = campos.pop('codigo_barras', '')
+            if not codigo_barras:
+                if campos:
+                    errores.append((linea, "Código de barras vacío"))
+                continue
+            try:
+                for campo in CAMPOS_IMPORTE:
+                    if campo in campos:
+                        texto = campos[campo]
+                        valor = importes.get(texto)
+                        if valor is None:
+                            valor = float(texto.replace('$', '').replace(',', ''))
+                            if valor < 0:
+                                raise ValueError(f"{campo} negativo: {texto}")
+                            importes[texto] = valor
+                        campos[campo] = valor
+                if 'stock' in campos:
+                    stock = float(campos['stock'].replace(',', ''))
+                    if not stock.is_integer():
+                        raise ValueError(f"stock no entero: {campos['stock']}")
+                    campos['stock'] = int(stock)
+            except ValueError as e:
+                errores.append((linea, f"Valor inválido ({e})"))
+                continue
+            validos.append((linea, codigo_barras, campos))
+        return validos, errores
+    
+    def importar_inventario_tabla(self, ruta: str, modo: str = 'actualizar',
+                                  progreso: Callable[[int], None] = None) -> Tuple[bool, str]:
+        """Importa productos por lotes desde un CSV o XLSX con las columnas de plantilla_inventario.csv"""
+        exito, mensaje, cambios = self.leer_inventario_tabla(ruta, modo, progreso)
+        if exito:
+            self.aplicar_importacion_inventario(cambios)
+        return (exito, mensaje)
+    
+    def leer_inventario_tabla(self, ruta: str, modo: str = 'actualizar',
+                              progreso: Callable[[int], None] = None) -> Tuple[bool, str, Dict[str, Dict]]:
+        """Lee y valida por lotes un CSV o XLSX de inventario; retorna los productos a aplicar sin tocar el inventario"""
+        if modo not in MODOS_IMPORTACION:
+            return (False, f"Modo de importación desconocido: {modo}", {})
+        if not os.path.exists(ruta):
+            return (False, f"Archivo no encontrado: {ruta}", {})
+        
+        inicio = time.perf_counter()
+        ahora = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        cambios = {}
+        omitidos = 0
+        errores = []
+        leidas = 0
+        importes = {}
+        try:
+            with abrir_tabla(ruta) as (encabezados, filas):
+                if 'Codigo Barras' not in encabezados:
+                    return (False, "El archivo debe contener la columna: Codigo Barras", {})
+                columnas = [(i, COLUMNAS_INVENTARIO[e]) for i, e in enumerate(encabezados) if e in COLUMNAS_INVENTARIO]
+                
+                for lote in lotes(filas):
+                    validos, errores_lote = self.validar_lote_inventario(lote, columnas, leidas + 2, importes)
+                    errores.extend(errores_lote)
+                    leidas += len(lote)
+                    for linea, codigo_barras, campos in validos:
+                        actual = cambios.get(codigo_barras) or self.productos.get(codigo_barras)
+                        if actual is not None and modo == 'omitir':
+                            omitidos += 1
+                            continue
+                        if actual is None or modo == 'sobrescribir':
+                            # Registro completo: nombre y precio minorista son obligatorios
+                            if 'nombre' not in campos or 'precio_minorista' not in campos:
+                                errores.append((linea, "Producto sin Nombre o Precio Minorista"))
+                                continue
+                            producto = producto_vacio((actual or {}).get('fecha_creacion', ahora))
+                        else:
+                            producto = dict(actual)
+                        producto.update(campos)
+                        producto['fecha_actualizacion'] = ahora
+                        cambios[codigo_barras] = producto
+                    if progreso:
+                        progreso(leidas)
         except Exception as e:
-            return (False, f"Error al importar: {str(e)}")
+            return (False, f"Error al importar: {str(e)}", {})
+        
+        nuevos = sum(1 for codigo_barras in cambios if codigo_barras not in self.productos)
+        errores.sort()
+        
+        segundos = time.perf_counter() - inicio
+        mensaje = (f"Importación completada: {leidas} filas en {segundos:.1f} s "
+                   f"({leidas / segundos if segundos else leidas:,.0f} filas/s)\n"
+                   f"{nuevos} productos nuevos, {len(cambios) - nuevos} actualizados, "
+                   f"{omitidos} omitidos, {len(errores)} con errores")
+        if errores:
+            reporte = os.path.splitext(ruta)[0] + '_errores.csv'
+            try:
+                with open(reporte, 'w', newline='', encoding='utf-8-sig') as f:
+                    writer = csv.writer(f)
+                    writer.writerow(['Linea', 'Error'])
+                    writer.writerows(errores)
+                mensaje += f"\nDetalle de errores: {reporte}"
+            except OSError as e:
+                print(f"No se pudo escribir el reporte de errores: {e}")
+            mensaje += "\n" + "\n".join(f"Línea {linea}: {error}" for linea, error in errores[:10])
+        
+        # El archivo se procesó: omitir o no cambiar nada también es una importación exitosa
+        return (True, mensaje, cambios)
+    
+    def filas_inventario(self) -> Iterator[list]:
+        """Una fila por producto con las columnas de la plantilla (el archivo se puede volver a importar)"""
+        campos = list(COLUMNAS_INVENTARIO.values())[1:]
+        # Copia de las llaves: la exportación corre en otro hilo mientras se edita el inventario
+        for codigo_barras, producto in list(self.productos.items()):
+            yield [codigo_barras] + [producto.get(campo, '') for campo in campos]
+    
+    def exportar_inventario_xlsx(self, ruta: str = 'inventario_exportado.xlsx',
+                                 progreso: Callable[[int], None] = None) -> Tuple[bool, str]:
+        """Exporta el inventario a un archivo XLSX con las columnas de la plantilla"""
+        try:
+            if not self.productos:
+                return (False, "No hay productos para exportar")
+            
+            escritas = escribir_xlsx(ruta, [("Inventario", list(COLUMNAS_INVENTARIO), self.filas_inventario())], progreso)
+            return (True, f"Inventario exportado exitosamente: {escritas} productos en {ruta}")
+        
+        except Exception as e:
+            return (False, f"Error al exportar inventario a XLSX: {str(e)}")
     
     def exportar_inventario(self, ruta: str) -> bool:
         """Exporta el inventario a un archivo JSON"""
@@ -365,7 +1029,7 @@ class Gestor_Inventario:
     def obtener_producto_para_venta(self, codigo_barras: str, cantidad: int = 1) -> Optional[ProductoVenta]:
         """Obtiene un producto listo para agregar a venta"""
         if codigo_barras in self.productos:
-            producto_data = self.productos[codigo_barras].copy()
+            producto_data = self.productos[codigo_barras]
             # Verificar stock disponible
             if producto_data.get('stock', 0) >= cantidad:
                 return ProductoVenta(codigo_barras, producto_data, cantidad)
@@ -395,25 +1059,7 @@ class Gestor_Inventario:
     def generar_plantilla_csv(self, ruta: str = 'plantilla_inventario.csv') -> Tuple[bool, str]:
         """Genera un archivo CSV de plantilla con los campos requeridos para inventario"""
         try:
-            campos = [
-                'Codigo Barras',
-                'Codigo',
-                'Numero Producto',
-                'Nombre',
-                'Descripcion',
-                'Clasificacion',
-                'Precio Minorista',
-                'Precio Mayoreo',
-                'Costo',
-                'Proveedor',
-                'Unidad',
-                'Fabricante',
-                'Tipo',
-                'Codigo A',
-                'Codigo B',
-                'Codigo C',
-                'Stock'
-            ]
+            campos = list(COLUMNAS_INVENTARIO)
             
             with open(ruta, 'w', newline='', encoding='utf-8-sig') as f:
                 writer = csv.writer(f)
@@ -445,29 +1091,332 @@ class Gestor_Inventario:
             return (False, f"Error al generar plantilla: {str(e)}")
 
 
+class AgregadosDiarios:
+    """Totales de ventas por día materializados (en centavos), actualizados con cada venta"""
+    CAMPOS = ('ventas', 'total_centavos', 'iva_centavos', 'descuento_centavos', 'unidades', 'costo_centavos')
+    # Campos que se comparan contra el historial al verificar (se obtienen sin expandir las líneas)
+    CAMPOS_VERIFICADOS = ('ventas', 'total_centavos', 'iva_centavos')
+    
+    def __init__(self, almacenamiento: Almacenamiento):
+        self.almacenamiento = almacenamiento
+        try:
+            self.dias = almacenamiento.cargar('agregados_diarios')
+        except Exception as e:
+            print(f"Error al cargar agregados diarios: {e}")
+            self.dias = {}
+        self.dias_ordenados = sorted(self.dias)
+    
+    @staticmethod
+    def dia_de_venta(venta: Dict) -> str:
+        fecha = venta.get('fecha') or ''
+        return fecha[:10] if len(fecha) >= 10 else MES_SIN_FECHA
+    
+    @staticmethod
+    def mes_de_dia(dia: str) -> str:
+        return dia if dia == MES_SIN_FECHA else dia[:7]
+    
+    @staticmethod
+    def aportes(venta: Dict) -> Dict[str, int]:
+        """Lo que una venta suma a la fila de su día"""
+        unidades = costo = 0
+        for linea in venta.get('productos', []):
+            cantidad = linea.get('cantidad', 0) or 0
+            unidades += cantidad
+            costo += dinero.a_centavos(linea.get('costo', 0)) * cantidad
+        if dict.__contains__(venta, 'descuento_total'):
+            # Registro anterior: el descuento viene guardado
+            descuento = dinero.a_centavos(venta['descuento_total'])
+        else:
+            descuento = 0
+            for linea in map(expandir_linea, venta.get('productos', [])):
+                descuento += ahorro_linea(linea)
+        return {
+            'ventas': 1,
+            'total_centavos': dinero.a_centavos(venta.get('total', 0)),
+            'iva_centavos': dinero.a_centavos(venta.get('iva', 0)),
+            'descuento_centavos': descuento,
+            'unidades': unidades,
+            'costo_centavos': costo
+        }
+    
+    def acumular(self, venta: Dict) -> str:
+        """Suma la venta a la fila de su día y devuelve el día"""
+        dia = self.dia_de_venta(venta)
+        fila = self.dias.get(dia)
+        if fila is None:
+            fila = self.dias[dia] = dict.fromkeys(self.CAMPOS, 0)
+            insort(self.dias_ordenados, dia)
+        for campo, valor in self.aportes(venta).items():
+            fila[campo] = fila.get(campo, 0) + valor
+        return dia
+    
+    def registrar(self, venta: Dict) -> None:
+        """Agrega una venta nueva y guarda sólo la fila de su día"""
+        dia = self.acumular(venta)
+        self.almacenamiento.guardar_registros('agregados_diarios', self.dias, [dia])
+    
+    def reconstruir(self, ventas: List[Dict], dias: List[str] = None) -> None:
+        """Recalcula las filas a partir del historial (sólo las de los días indicados, si se dan)"""
+        if dias is None:
+            self.dias = {}
+        else:
+            dias = set(dias)
+            self.dias = {dia: fila for dia, fila in self.dias.items() if dia not in dias}
+        self.dias_ordenados = sorted(self.dias)
+        for venta in ventas:
+            self.acumular(venta)
+        self.almacenamiento.guardar('agregados_diarios', self.dias)
+    
+    def dias_distintos(self, ventas: Iterable[Dict]) -> List[str]:
+        """Días cuya cantidad de ventas, total o IVA no coincide con el de las ventas dadas (en una pasada)"""
+        historial = {}
+        for venta in ventas:
+            dia = self.dia_de_venta(venta)
+            fila = historial.get(dia)
+            if fila is None:
+                fila = historial[dia] = [0, 0, 0]
+            fila[0] += 1
+            fila[1] += dinero.a_centavos(venta.get('total', 0))
+            fila[2] += dinero.a_centavos(venta.get('iva', 0))
+        vacia = [0] * len(self.CAMPOS_VERIFICADOS)
+        return sorted(
+            dia for dia in set(historial) | set(self.dias)
+            if historial.get(dia, vacia) != [self.dias.get(dia, {}).get(campo, 0) for campo in self.CAMPOS_VERIFICADOS]
+        )
+    
+    def filas(self, desde: str, hasta: str) -> List[Tuple[str, Dict]]:
+        """Filas de los días entre desde y hasta (inclusive, formato AAAA-MM-DD)"""
+        inicio = bisect_left(self.dias_ordenados, desde)
+        fin = bisect_right(self.dias_ordenados, hasta)
+        return [(dia, self.dias[dia]) for dia in self.dias_ordenados[inicio:fin]]
+    
+    def resumen(self, desde: str, hasta: str) -> Dict:
+        """Suma las filas del periodo y las convierte a pesos"""
+        totales = dict.fromkeys(self.CAMPOS, 0)
+        filas = self.filas(desde, hasta)
+        for _, fila in filas:
+            for campo in self.CAMPOS:
+                totales[campo] += fila.get(campo, 0)
+        return {
+            'desde': desde,
+            'hasta': hasta,
+            'cantidad_ventas': totales['ventas'],
+            'total': dinero.a_pesos(totales['total_centavos']),
+            'iva': dinero.a_pesos(totales['iva_centavos']),
+            'descuento': dinero.a_pesos(totales['descuento_centavos']),
+            'unidades': totales['unidades'],
+            'costo': dinero.a_pesos(totales['costo_centavos']),
+            'dias': [(dia, dinero.a_pesos(fila.get('total_centavos', 0)), fila.get('ventas', 0))
+                     for dia, fila in filas]
+        }
+
+
 class GestorVentas:
     """Clase para gestionar las ventas con nueva lógica de precios"""
-    def __init__(self, gestor_inventario: Gestor_Inventario = None):
-        self.productos_venta = []
+    def __init__(self, gestor_inventario: Gestor_Inventario = None, almacenamiento: Almacenamiento = None):
+        self.productos_venta = CarritoVenta()
         self.historial_ventas = []
+        # Índice folio -> venta y folios ordenados para consultas por rango
+        self.indice_folios = {}
+        self.folios_ordenados = []
+        self.numero_folio = 1
+        # Meses del historial que aún no se cargan en memoria y sus estadísticas
+        self.meses_pendientes = set()
+        self.estadisticas_meses = {}
+        # Consultas y tiempo de la captura en caja por ruta de resolución
+        self.metricas_entrada = {ruta: {'consultas': 0, 'tiempo_total': 0.0, 'tiempo_maximo': 0.0}
+                                 for ruta in ('codigo_barras', 'codigo_alterno', 'descripcion', 'sin_resultado')}
         self.gestor_inventario = gestor_inventario
+        self.almacenamiento = almacenamiento or obtener_almacenamiento()
         self.cargar_historial()
-        self.numero_folio = len(self.historial_ventas) + 1
+        self.sembrar_popularidad()
+        # Totales por día para los reportes; se comparan con el historial la primera vez que se usan
+        self.agregados = AgregadosDiarios(self.almacenamiento)
+        self.agregados_verificados = False
+        # Columnas para análisis; se construyen en la primera consulta y luego crecen con cada venta
+        self.analitica = None
+    
+    def sembrar_popularidad(self) -> None:
+        """Fija la popularidad con las unidades vendidas de cada producto en todo el historial (en una pasada)"""
+        if not self.gestor_inventario:
+            return
+        unidades = {}
+        try:
+            # Recorre también los meses que no están cargados en memoria
+            for venta in self.almacenamiento.iterar_ventas():
+                for producto in venta.get('productos', []):
+                    codigo_barras = producto.get('codigo_barras')
+                    if codigo_barras:
+                        unidades[codigo_barras] = unidades.get(codigo_barras, 0) + (producto.get('cantidad', 0) or 0)
+        except Exception as e:
+            print(f"Error al calcular la popularidad de los productos: {e}")
+            return
+        # Se reemplazan los conteos: sembrar de nuevo no duplica las ventas
+        self.gestor_inventario.fijar_popularidad(unidades)
+    
+    def actualizar_popularidad(self, ventas: List[Dict]) -> None:
+        """Suma al inventario las unidades vendidas de cada producto (orden de la búsqueda)"""
+        if not self.gestor_inventario:
+            return
+        for venta in ventas:
+            for producto in venta.get('productos', []):
+                if producto.get('codigo_barras'):
+                    self.gestor_inventario.registrar_popularidad(producto['codigo_barras'],
+                                                                 producto.get('cantidad', 0) or 0)
     
     def cargar_historial(self, archivo: str = 'ventas.json') -> None:
-        """Carga el historial de ventas desde archivo JSON"""
-        if os.path.exists(archivo):
+        """Carga el historial de ventas (con particiones mensuales, sólo el mes en curso)"""
+        self.meses_pendientes = set()
+        self.estadisticas_meses = {}
+        try:
+            estadisticas = self.almacenamiento.estadisticas_ventas()
+            if estadisticas is None:
+                self.historial_ventas = registros_venta(self.almacenamiento.cargar_ventas(archivo))
+            else:
+                # Los meses anteriores se cargan cuando una consulta los necesita
+                mes_actual = datetime.now().strftime('%Y-%m')
+                self.estadisticas_meses = dict(estadisticas)
+                self.meses_pendientes = set(estadisticas) - {mes_actual}
+                self.historial_ventas = (registros_venta(self.almacenamiento.cargar_ventas_mes(mes_actual))
+                                         if mes_actual in estadisticas else [])
+        except Exception as e:
+            print(f"Error al cargar ventas: {e}")
+        self.reconstruir_indice_folios()
+        # El siguiente folio considera también los meses no cargados
+        for datos in self.estadisticas_meses.values():
+            if datos.get('ultimo_folio'):
+                self.numero_folio = max(self.numero_folio, datos['ultimo_folio'] + 1)
+    
+    def cargar_meses(self, meses: List[str] = None) -> None:
+        """Carga los meses pendientes del historial (todos si no se indican)"""
+        pendientes = self.meses_pendientes if meses is None else self.meses_pendientes & set(meses)
+        if not pendientes:
+            return
+        for mes in sorted(pendientes):
             try:
-                with open(archivo, 'r', encoding='utf-8') as f:
-                    self.historial_ventas = json.load(f)
+                ventas = registros_venta(self.almacenamiento.cargar_ventas_mes(mes))
             except Exception as e:
-                print(f"Error al cargar ventas: {e}")
+                print(f"Error al cargar ventas de {mes}: {e}")
+                continue
+            self.meses_pendientes.discard(mes)
+            self.historial_ventas.extend(ventas)
+            for venta in ventas:
+                self.indexar_venta(venta)
+        # Orden cronológico por mes; el orden dentro de cada mes se conserva
+        self.historial_ventas.sort(key=mes_de_venta)
+    
+    def cargar_meses_por_folio(self, folio_inicio: int, folio_fin: int) -> None:
+        """Carga los meses pendientes cuyo rango de folios se cruza con el indicado"""
+        meses = []
+        for mes in self.meses_pendientes:
+            datos = self.estadisticas_meses.get(mes, {})
+            primero, ultimo = datos.get('primer_folio'), datos.get('ultimo_folio')
+            if primero is None or ultimo is None or (primero <= folio_fin and ultimo >= folio_inicio):
+                meses.append(mes)
+        self.cargar_meses(meses)
+    
+    def reconstruir_indice_folios(self) -> None:
+        """Reconstruye el índice de folios a partir del historial"""
+        self.indice_folios = {}
+        self.folios_ordenados = []
+        self.numero_folio = 1
+        for venta in self.historial_ventas:
+            self.indexar_venta(venta)
+    
+    def indexar_venta(self, venta: Dict) -> None:
+        """Agrega una venta al índice de folios y ajusta el siguiente folio"""
+        try:
+            folio = int(venta.get('folio'))
+        except (TypeError, ValueError):
+            return
+        # Con folios duplicados se conserva la primera venta, como en la búsqueda lineal
+        if folio in self.indice_folios:
+            return
+        self.indice_folios[folio] = venta
+        if not self.folios_ordenados or folio > self.folios_ordenados[-1]:
+            self.folios_ordenados.append(folio)
+        else:
+            insort(self.folios_ordenados, folio)
+        # El siguiente folio sigue al mayor registrado aunque haya huecos
+        self.numero_folio = max(self.numero_folio, folio + 1)
+    
+    def desindexar_venta(self, venta: Dict) -> None:
+        """Quita una venta del índice de folios (venta que no se pudo guardar)"""
+        folio = venta.get('folio')
+        if self.indice_folios.get(folio) is not venta:
+            return
+        del self.indice_folios[folio]
+        self.folios_ordenados.pop(bisect_left(self.folios_ordenados, folio))
+        if folio == self.numero_folio - 1:
+            self.numero_folio = folio
+    
+    def verificar_agregados(self) -> None:
+        """Recalcula los agregados de los días cuya cantidad de ventas, total o IVA no coincide con el historial"""
+        estadisticas = self.almacenamiento.estadisticas_ventas()
+        if estadisticas is None:
+            self.cargar_meses()
+            dias = self.agregados.dias_distintos(self.historial_ventas)
+        else:
+            # Se recorren directo del almacenamiento, sin cargar los meses en memoria
+            dias = self.agregados.dias_distintos(self.almacenamiento.iterar_ventas())
+        
+        if dias:
+            por_recalcular = set(dias)
+            if estadisticas is None:
+                ventas = self.historial_ventas
+            else:
+                # Sólo se vuelven a leer los meses de los días que difieren
+                meses = sorted({AgregadosDiarios.mes_de_dia(dia) for dia in dias} & set(estadisticas))
+                ventas = (v for mes in meses for v in self.almacenamiento.cargar_ventas_mes(mes))
+            self.agregados.reconstruir(
+                [v for v in ventas if AgregadosDiarios.dia_de_venta(v) in por_recalcular], dias
+            )
+            print(f"Agregados diarios recalculados: {', '.join(dias)}")
+        self.agregados_verificados = True
+    
+    def reconstruir_agregados(self) -> None:
+        """Recalcula todos los agregados diarios a partir del historial completo"""
+        self.cargar_meses()
+        self.agregados.reconstruir(self.historial_ventas)
+        self.agregados_verificados = True
+    
+    def obtener_agregados(self) -> AgregadosDiarios:
+        """Agregados diarios, verificados contra el historial en el primer uso"""
+        if not self.agregados_verificados:
+            self.verificar_agregados()
+        return self.agregados
+    
+    def iterar_ventas(self, desde: str = None, hasta: str = None) -> Iterator['VentaRegistrada']:
+        """Recorre las ventas del rango directamente del almacenamiento, sin cargarlas en el historial"""
+        for venta in self.almacenamiento.iterar_ventas(desde, hasta):
+            yield VentaRegistrada(venta)
+    
+    def obtener_analitica(self, progreso: Callable[[int], None] = None) -> 'AnaliticaVentas':
+        """Líneas de todo el historial en columnas (se construyen una sola vez, leyendo el almacenamiento por lotes)"""
+        if self.analitica is None:
+            # NumPy sólo se carga cuando se usa el análisis
+            from analitica import AnaliticaVentas
+            analitica = AnaliticaVentas()
+            leidas = 0
+            # Los meses no se cargan en el historial: cada lote se descarta tras pasarlo a columnas
+            for lote in lotes(self.almacenamiento.iterar_ventas()):
+                analitica.agregar_ventas(lote)
+                leidas += len(lote)
+                if progreso:
+                    progreso(leidas)
+            self.analitica = analitica
+        return self.analitica
+    
+    def preparar_analitica(self, progreso: Callable[[int], None] = None) -> Tuple[bool, str]:
+        """Construye las columnas del análisis (para ejecutarse como tarea en segundo plano)"""
+        analitica = self.obtener_analitica(progreso)
+        return (True, f"Análisis preparado: {analitica.tamano:,} líneas de venta")
     
     def guardar_historial(self, archivo: str = 'ventas.json') -> None:
-        """Guarda el historial de ventas en archivo JSON"""
+        """Guarda el historial de ventas completo"""
+        self.cargar_meses()
         try:
-            with open(archivo, 'w', encoding='utf-8') as f:
-                json.dump(self.historial_ventas, f, ensure_ascii=False, indent=2)
+            self.almacenamiento.guardar_ventas(self.historial_ventas, archivo)
         except Exception as e:
             print(f"Error al guardar ventas: {e}")
     
@@ -483,15 +1432,86 @@ class GestorVentas:
         if cantidad <= 0:
             return (False, "La cantidad debe ser mayor a 0", None)
         
-        # Buscar productos por descripción
-        resultados = self.gestor_inventario.buscar_producto_por_descripcion(descripcion)
+        # El mejor resultado de la búsqueda difusa; si no hay, la primera coincidencia de texto
+        resultados = (self.gestor_inventario.buscar_difuso(descripcion, 1) or
+                      self.gestor_inventario.buscar_top_k(descripcion, 1, 'inventario'))
         
         if not resultados:
             return (False, f"No se encontraron productos con: '{descripcion}'", None)
         
         # Si hay múltiples resultados, tomamos el primero
         # (En una interfaz gráfica, se mostraría una lista para seleccionar)
-        codigo_barras, producto_data = resultados[0]
+        codigo_barras, _ = resultados[0]
+        return self.agregar_producto_por_codigo(codigo_barras, cantidad)
+    
+    @staticmethod
+    def es_codigo(entrada: str) -> bool:
+        """Indica si la captura parece un código (lector de barras o código alterno) y no una descripción"""
+        return bool(entrada) and not any(c.isspace() for c in entrada) and any(c.isdigit() for c in entrada)
+    
+    def resolver_entrada(self, entrada: str) -> Tuple[Optional[str], str]:
+        """Resuelve la captura de caja a un código de barras; retorna (código o None, ruta usada)"""
+        entrada = entrada.strip()
+        es_codigo = self.es_codigo(entrada)
+        if es_codigo:
+            # Lector de barras: búsqueda directa en el inventario y luego en los códigos alternos
+            if self.gestor_inventario.obtener_producto(entrada) is not None:
+                return (entrada, 'codigo_barras')
+            codigo_barras = self.gestor_inventario.indice_codigos.buscar(entrada)
+            if codigo_barras is not None:
+                return (codigo_barras, 'codigo_alterno')
+        
+        # Sólo si no es un código conocido se busca por descripción; un código desconocido
+        # no pasa por la búsqueda difusa para no confundirlo con otro número parecido
+        resultados = [] if es_codigo else self.gestor_inventario.buscar_difuso(entrada, 1)
+        resultados = resultados or self.gestor_inventario.buscar_top_k(entrada, 1, 'inventario')
+        if resultados:
+            return (resultados[0][0], 'descripcion')
+        return (None, 'sin_resultado')
+    
+    def agregar_producto_por_entrada(self, entrada: str, cantidad: int = 1) -> Tuple[bool, str, Optional[ProductoVenta]]:
+        """Agrega a la venta lo capturado en caja: código de barras, código alterno o descripción"""
+        if not self.gestor_inventario:
+            return (False, "No hay gestor de inventario configurado", None)
+        
+        if not entrada.strip():
+            return (False, "Capture un código o una descripción", None)
+        
+        inicio = time.perf_counter()
+        codigo_barras, ruta = self.resolver_entrada(entrada)
+        transcurrido = time.perf_counter() - inicio
+        
+        metricas = self.metricas_entrada[ruta]
+        metricas['consultas'] += 1
+        metricas['tiempo_total'] += transcurrido
+        metricas['tiempo_maximo'] = max(metricas['tiempo_maximo'], transcurrido)
+        
+        if codigo_barras is None:
+            return (False, f"No se encontraron productos con: '{entrada.strip()}'", None)
+        return self.agregar_producto_por_codigo(codigo_barras, cantidad)
+    
+    def obtener_metricas_entrada(self) -> Dict[str, Dict]:
+        """Retorna consultas, latencia promedio y máxima (ms) de cada ruta de captura"""
+        return {
+            ruta: {
+                'consultas': datos['consultas'],
+                'latencia_promedio_ms': datos['tiempo_total'] / datos['consultas'] * 1000 if datos['consultas'] else 0.0,
+                'latencia_maxima_ms': datos['tiempo_maximo'] * 1000
+            }
+            for ruta, datos in self.metricas_entrada.items()
+        }
+    
+    def agregar_producto_por_codigo(self, codigo_barras: str, cantidad: int = 1) -> Tuple[bool, str, Optional[ProductoVenta]]:
+        """Agrega a la venta el producto con el código de barras indicado (ej. una sugerencia seleccionada)"""
+        if not self.gestor_inventario:
+            return (False, "No hay gestor de inventario configurado", None)
+        
+        if cantidad <= 0:
+            return (False, "La cantidad debe ser mayor a 0", None)
+        
+        producto_data = self.gestor_inventario.obtener_producto(codigo_barras)
+        if producto_data is None:
+            return (False, f"Producto no encontrado: {codigo_barras}", None)
         
         # Verificar stock
         if not self.gestor_inventario.tiene_stock(codigo_barras, cantidad):
@@ -502,31 +1522,32 @@ class GestorVentas:
         producto_venta = ProductoVenta(codigo_barras, producto_data, cantidad)
         
         # Verificar si el producto ya existe en la venta
-        for prod in self.productos_venta:
-            if prod.codigo_barras == codigo_barras:
-                # Calcular nueva cantidad total
-                nueva_cantidad = prod.cantidad + cantidad
-                
-                # Verificar stock con la nueva cantidad
-                if not self.gestor_inventario.tiene_stock(codigo_barras, nueva_cantidad):
-                    stock_disponible = producto_data.get('stock', 0)
-                    return (False, f"Stock insuficiente para la cantidad total. Disponible: {stock_disponible}", None)
-                
-                prod.cantidad = nueva_cantidad
-                mensaje = f"Producto actualizado: {prod.nombre} - {nueva_cantidad} {prod.unidad}"
-                
-                # Calcular si ahora aplica precio mayoreo
-                if nueva_cantidad >= 6 and prod.cantidad < 6:
-                    mensaje += f" - Ahora aplica precio mayoreo"
-                
-                return (True, mensaje, producto_venta)
+        prod = self.productos_venta.obtener(codigo_barras)
+        if prod is not None:
+            # Calcular nueva cantidad total
+            nueva_cantidad = prod.cantidad + cantidad
+            
+            # Verificar stock con la nueva cantidad
+            if not self.gestor_inventario.tiene_stock(codigo_barras, nueva_cantidad):
+                stock_disponible = producto_data.get('stock', 0)
+                return (False, f"Stock insuficiente para la cantidad total. Disponible: {stock_disponible}", None)
+            
+            escala_anterior = prod.tabla_precios.escala(prod.cantidad)
+            self.productos_venta.cambiar_cantidad(codigo_barras, nueva_cantidad)
+            mensaje = f"Producto actualizado: {prod.nombre} - {nueva_cantidad} {prod.unidad}"
+            
+            # Calcular si ahora aplica precio mayoreo (o una escala mayor)
+            if prod.tabla_precios.escala(nueva_cantidad) > escala_anterior:
+                mensaje += f" - Ahora aplica precio mayoreo"
+            
+            return (True, mensaje, producto_venta)
         
         # Si no existe, agregarlo
-        self.productos_venta.append(producto_venta)
+        self.productos_venta.agregar(producto_venta)
         mensaje = f"Producto agregado: {producto_venta.nombre} - {cantidad} {producto_venta.unidad}"
         
         # Indicar si aplica precio mayoreo
-        if cantidad >= 6:
+        if producto_venta.es_mayoreo():
             mensaje += f" - Aplica precio mayoreo"
         
         return (True, mensaje, producto_venta)
@@ -537,102 +1558,103 @@ class GestorVentas:
         if not self.gestor_inventario:
             return (False, "No hay gestor de inventario configurado")
         
+        producto_data = self.gestor_inventario.obtener_producto(producto.codigo_barras)
+        stock_disponible = producto_data.get('stock', 0) if producto_data else 0
+        
         # Verificar stock disponible
         if not self.gestor_inventario.tiene_stock(producto.codigo_barras, producto.cantidad):
-            producto_data = self.gestor_inventario.obtener_producto(producto.codigo_barras)
-            stock_disponible = producto_data.get('stock', 0) if producto_data else 0
             return (False, f"Stock insuficiente. Disponible: {stock_disponible}")
         
         # Verificar si el producto ya existe en la venta
-        for prod in self.productos_venta:
-            if prod.codigo_barras == producto.codigo_barras:
-                # Calcular nueva cantidad total
-                nueva_cantidad = prod.cantidad + producto.cantidad
-                
-                # Verificar stock con la nueva cantidad
-                if not self.gestor_inventario.tiene_stock(producto.codigo_barras, nueva_cantidad):
-                    stock_disponible = producto_data.get('stock', 0) if producto_data else 0
-                    return (False, f"Stock insuficiente para la cantidad total. Disponible: {stock_disponible}")
-                
-                prod.cantidad = nueva_cantidad
-                return (True, f"Producto actualizado: {prod.nombre} - {nueva_cantidad} {prod.unidad}")
+        prod = self.productos_venta.obtener(producto.codigo_barras)
+        if prod is not None:
+            # Calcular nueva cantidad total
+            nueva_cantidad = prod.cantidad + producto.cantidad
+            
+            # Verificar stock con la nueva cantidad
+            if not self.gestor_inventario.tiene_stock(producto.codigo_barras, nueva_cantidad):
+                return (False, f"Stock insuficiente para la cantidad total. Disponible: {stock_disponible}")
+            
+            self.productos_venta.cambiar_cantidad(producto.codigo_barras, nueva_cantidad)
+            return (True, f"Producto actualizado: {prod.nombre} - {nueva_cantidad} {prod.unidad}")
         
-        self.productos_venta.append(producto)
+        self.productos_venta.agregar(producto)
         return (True, f"Producto agregado: {producto.nombre}")
     
     def eliminar_producto(self, codigo_barras: str) -> bool:
         """Elimina un producto de la venta actual"""
-        for i, prod in enumerate(self.productos_venta):
-            if prod.codigo_barras == codigo_barras:
-                self.productos_venta.pop(i)
-                return True
-        return False
+        return self.productos_venta.eliminar(codigo_barras) is not None
     
     def eliminar_producto_por_descripcion(self, descripcion: str) -> Tuple[bool, str]:
         """Elimina un producto de la venta buscando por descripción"""
         descripcion_lower = descripcion.lower()
         
-        for i, prod in enumerate(self.productos_venta):
+        for prod in self.productos_venta:
             if (descripcion_lower in prod.descripcion.lower() or
                 descripcion_lower in prod.nombre.lower()):
                 
                 nombre_eliminado = prod.nombre
-                self.productos_venta.pop(i)
+                self.productos_venta.eliminar(prod.codigo_barras)
                 return (True, f"Producto eliminado: {nombre_eliminado}")
         
         return (False, f"No se encontró producto con: '{descripcion}'")
     
     def obtener_productos_venta(self) -> List[ProductoVenta]:
-        """Obtiene los productos de la venta actual"""
-        return self.productos_venta
+        """Obtiene los productos de la venta actual (en orden de captura)"""
+        return list(self.productos_venta)
     
     def calcular_subtotal(self) -> float:
-        """Calcula el subtotal de la venta"""
-        return sum(prod.subtotal() for prod in self.productos_venta)
+        """Calcula el subtotal de la venta (acumulado por el carrito)"""
+        return dinero.a_pesos(self.productos_venta.subtotal)
+    
+    def calcular_totales_centavos(self) -> Tuple[int, int, int]:
+        """Subtotal, IVA y total de la venta actual en centavos"""
+        subtotal = self.productos_venta.subtotal
+        iva = dinero.calcular_iva(subtotal)
+        return subtotal, iva, subtotal + iva
     
     def calcular_iva(self, subtotal: float = None) -> float:
         """Calcula el IVA de la venta (16%)"""
         if subtotal is None:
-            subtotal = self.calcular_subtotal()
-        return subtotal * 0.16
+            return dinero.a_pesos(self.calcular_totales_centavos()[1])
+        return dinero.a_pesos(dinero.calcular_iva(dinero.a_centavos(subtotal)))
     
     def calcular_total(self) -> float:
         """Calcula el total de la venta"""
-        subtotal = self.calcular_subtotal()
-        iva = self.calcular_iva(subtotal)
-        return subtotal + iva
+        return dinero.a_pesos(self.calcular_totales_centavos()[2])
     
     def calcular_cambio(self, pago: float, total: float = None) -> float:
         """Calcula el cambio"""
         if total is None:
-            total = self.calcular_total()
-        return max(0, pago - total)
+            total_centavos = self.calcular_totales_centavos()[2]
+        else:
+            total_centavos = dinero.a_centavos(total)
+        return dinero.a_pesos(max(0, dinero.a_centavos(pago) - total_centavos))
     
     def obtener_detalle_precios(self) -> Dict:
         """Obtiene detalle de precios aplicados en la venta"""
+        # Los totales ya están acumulados en el carrito; sólo se arma el desglose por línea
         detalle = {
             'productos_minorista': [],
             'productos_mayoreo': [],
-            'total_minorista': 0,
-            'total_mayoreo': 0,
-            'descuento_total': 0
+            'total_minorista': dinero.a_pesos(self.productos_venta.total_minorista),
+            'total_mayoreo': dinero.a_pesos(self.productos_venta.total_mayoreo),
+            'descuento_total': dinero.a_pesos(self.productos_venta.descuento_total)
         }
         
         for prod in self.productos_venta:
             precio_unitario = prod.obtener_precio_unitario()
             subtotal = prod.subtotal()
             
-            if prod.cantidad >= 6:
+            if prod.es_mayoreo():
                 detalle['productos_mayoreo'].append({
                     'nombre': prod.nombre,
                     'cantidad': prod.cantidad,
-                    'precio_mayoreo': prod.precio_mayoreo,
+                    'precio_mayoreo': precio_unitario,
                     'precio_minorista': prod.precio_minorista,
                     'subtotal': subtotal,
-                    'ahorro': (prod.precio_minorista - prod.precio_mayoreo) * prod.cantidad
+                    'ahorro': dinero.a_pesos(prod.ahorro_centavos())
                 })
-                detalle['total_mayoreo'] += subtotal
-                detalle['descuento_total'] += (prod.precio_minorista - prod.precio_mayoreo) * prod.cantidad
             else:
                 detalle['productos_minorista'].append({
                     'nombre': prod.nombre,
@@ -640,7 +1662,6 @@ class GestorVentas:
                     'precio': precio_unitario,
                     'subtotal': subtotal
                 })
-                detalle['total_minorista'] += subtotal
         
         return detalle
     
@@ -655,40 +1676,52 @@ class GestorVentas:
                 if not self.gestor_inventario.tiene_stock(prod.codigo_barras, prod.cantidad):
                     return (False, f"Stock insuficiente para: {prod.nombre}", None)
         
-        subtotal = self.calcular_subtotal()
-        iva = self.calcular_iva(subtotal)
-        total = subtotal + iva
-        
-        if pago < total:
-            return (False, f"Pago insuficiente. Total: ${total:.2f}", None)
+        subtotal, iva, total = self.calcular_totales_centavos()
+        pago_centavos = dinero.a_centavos(pago)
         
-        cambio = self.calcular_cambio(pago, total)
+        if pago_centavos < total:
+            return (False, f"Pago insuficiente. Total: {dinero.formatear(total)}", None)
         
-        # Obtener detalle de precios aplicados
-        detalle_precios = self.obtener_detalle_precios()
+        # Líneas compactas que referencian la versión del producto en el catálogo
+        catalogo = obtener_catalogo()
+        lineas = [prod.linea_venta(catalogo.version(prod.codigo_barras, prod.datos))
+                  for prod in self.productos_venta]
         
-        venta = {
+        # Sólo datos de origen: detalle de precios, descuento y cambio se derivan al consultarse
+        venta = VentaRegistrada({
             'folio': self.numero_folio,
             'fecha': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'productos': [prod.to_dict() for prod in self.productos_venta],
-            'subtotal': subtotal,
-            'iva': iva,
-            'total': total,
-            'pago': pago,
-            'cambio': cambio,
-            'detalle_precios': detalle_precios,
-            'productos_con_descuento': len(detalle_precios['productos_mayoreo']),
-            'descuento_total': detalle_precios['descuento_total']
-        }
-        
-        # Actualizar stock en inventario
+            'productos': lineas,
+            'subtotal': dinero.a_pesos(subtotal),
+            'iva': dinero.a_pesos(iva),
+            'total': dinero.a_pesos(total),
+            'pago': dinero.a_pesos(pago_centavos)
+        })
+        
+        # Descontar el stock de todas las líneas en un solo lote (una sola escritura)
         if self.gestor_inventario:
-            for prod in self.productos_venta:
-                self.gestor_inventario.actualizar_stock(prod.codigo_barras, -prod.cantidad)
+            exito, mensaje = self.gestor_inventario.aplicar_movimientos_stock(
+                [(prod.codigo_barras, -prod.cantidad) for prod in self.productos_venta]
+            )
+            if not exito:
+                return (False, mensaje, None)
         
         self.historial_ventas.append(venta)
-        self.numero_folio += 1
-        self.guardar_historial()
+        self.indexar_venta(venta)
+        catalogo.guardar_pendientes()
+        if not self.almacenamiento.anexar_venta(venta, self.historial_ventas):
+            # La venta no quedó en disco: se deshace para no perder stock ni reutilizar el folio
+            self.historial_ventas.pop()
+            self.desindexar_venta(venta)
+            if self.gestor_inventario:
+                self.gestor_inventario.aplicar_movimientos_stock(
+                    [(prod.codigo_barras, prod.cantidad) for prod in self.productos_venta]
+                )
+            return (False, "No se pudo guardar la venta; el stock no se modificó", None)
+        self.agregados.registrar(venta)
+        if self.analitica is not None:
+            self.analitica.agregar_venta(venta)
+        self.actualizar_popularidad([venta])
         
         # Limpiar venta actual después de procesar
         self.limpiar_venta()
@@ -697,26 +1730,46 @@ class GestorVentas:
     
     def limpiar_venta(self) -> None:
         """Limpia la venta actual"""
-        self.productos_venta = []
+        self.productos_venta.limpiar()
+    
+    def compactar_historial(self) -> Tuple[bool, str]:
+        """Compacta el almacenamiento del historial (consolida el diario de ventas)"""
+        return self.almacenamiento.compactar_ventas(self.historial_ventas)
     
     def obtener_historial(self) -> List[Dict]:
         """Obtiene el historial de ventas"""
+        self.cargar_meses()
         return self.historial_ventas
     
     def buscar_venta_por_folio(self, folio: int) -> Optional[Dict]:
         """Busca una venta por folio"""
-        for venta in self.historial_ventas:
-            if venta.get('folio') == folio:
-                return venta
-        return None
+        if folio not in self.indice_folios:
+            self.cargar_meses_por_folio(folio, folio)
+        return self.indice_folios.get(folio)
+    
+    def buscar_ventas_por_rango_folio(self, folio_inicio: int, folio_fin: int) -> List[Dict]:
+        """Obtiene las ventas con folio entre folio_inicio y folio_fin (inclusive), ordenadas por folio"""
+        self.cargar_meses_por_folio(folio_inicio, folio_fin)
+        inicio = bisect_left(self.folios_ordenados, folio_inicio)
+        fin = bisect_right(self.folios_ordenados, folio_fin)
+        return [self.indice_folios[folio] for folio in self.folios_ordenados[inicio:fin]]
+    
+    def obtener_ventas_por_fecha(self, fecha: str) -> List[Dict]:
+        """Obtiene las ventas cuya fecha comienza con el prefijo dado (ej. '2026-01-15')"""
+        ventas = self.almacenamiento.buscar_ventas_por_fecha(fecha)
+        if ventas is not None:
+            return registros_venta(ventas)
+        self.cargar_meses([mes for mes in self.meses_pendientes if mes.startswith(fecha[:7])])
+        return [v for v in self.historial_ventas if v.get('fecha', '').startswith(fecha)]
     
     def buscar_ventas_por_descripcion(self, descripcion: str) -> List[Dict]:
         """Busca ventas por descripción de productos"""
+        self.cargar_meses()
         resultados = []
         descripcion_lower = descripcion.lower()
         
         for venta in self.historial_ventas:
-            for producto in venta.get('productos', []):
+            for producto in map(expandir_linea, venta.get('productos', [])):
                 if (descripcion_lower in producto.get('descripcion', '').lower() or
                     descripcion_lower in producto.get('nombre', '').lower()):
                     resultados.append(venta)
@@ -726,37 +1779,56 @@ class GestorVentas:
     
     def registrar_venta(self, venta: Dict) -> None:
         """Registra una venta (metodo legacy)"""
+        venta = VentaRegistrada.de(venta)
         self.historial_ventas.append(venta)
+        self.indexar_venta(venta)
     
     def obtener_ventas(self) -> List[Dict]:
         """Obtiene el listado de ventas"""
+        self.cargar_meses()
         return self.historial_ventas
     
     def set_gestor_inventario(self, gestor_inventario: Gestor_Inventario) -> None:
         """Establece el gestor de inventario para validaciones de stock"""
         self.gestor_inventario = gestor_inventario
+        self.sembrar_popularidad()
+
+
+# Columnas de plantilla_proveedores.csv y el campo que llena cada una
+COLUMNAS_PROVEEDORES = {
+    'ID Proveedor': 'id_proveedor', 'Alias': 'alias', 'RFC': 'rfc', 'Razon Social': 'razon_social',
+    'Personal': 'personal', 'Telefono': 'telefono', 'Codigo Postal': 'codigo_postal', 'Estado': 'estado',
+    'Ciudad': 'ciudad', 'Municipio': 'municipio', 'Colonia': 'colonia', 'Direccion': 'direccion',
+    'Fax': 'fax', 'Correo': 'correo', 'Pagina Web': 'pagina_web', 'Tipo Pago': 'tipo_pago',
+    'Condiciones': 'condiciones', 'Activo': 'activo'
+}
 
 
 class GestorProveedores:
     """Clase para gestionar los proveedores con todos los campos actualizados"""
-    def __init__(self):
+    def __init__(self, almacenamiento: Almacenamiento = None):
         self.proveedores = {}
+        self.almacenamiento = almacenamiento or obtener_almacenamiento()
         self.cargar_proveedores()
     
     def cargar_proveedores(self, archivo: str = 'proveedores.json') -> None:
-        """Carga los proveedores desde archivo JSON"""
-        if os.path.exists(archivo):
-            try:
-                with open(archivo, 'r', encoding='utf-8') as f:
-                    self.proveedores = json.load(f)
-            except Exception as e:
-                print(f"Error al cargar proveedores: {e}")
+        """Carga los proveedores desde el almacenamiento"""
+        try:
+            self.proveedores = self.almacenamiento.cargar('proveedores', archivo)
+        except Exception as e:
+            print(f"Error al cargar proveedores: {e}")
     
     def guardar_proveedores(self, archivo: str = 'proveedores.json') -> None:
-        """Guarda los proveedores en archivo JSON"""
+        """Guarda todos los proveedores en el almacenamiento"""
         try:
-            with open(archivo, 'w', encoding='utf-8') as f:
-                json.dump(self.proveedores, f, ensure_ascii=False, indent=2)
+            self.almacenamiento.guardar('proveedores', self.proveedores, archivo)
+        except Exception as e:
+            print(f"Error al guardar proveedores: {e}")
+    
+    def persistir_proveedores(self, ids: List[str], eliminados: List[str] = None) -> None:
+        """Guarda sólo los proveedores modificados o eliminados"""
+        try:
+            self.almacenamiento.guardar_registros('proveedores', self.proveedores, ids, eliminados)
         except Exception as e:
             print(f"Error al guardar proveedores: {e}")
     
@@ -848,7 +1920,7 @@ class GestorProveedores:
             'activo': True
         }
         
-        self.guardar_proveedores()
+        self.persistir_proveedores([id_upper])
         return (True, f"Proveedor '{alias}' agregado exitosamente")
     
     def editar_proveedor(self,
@@ -923,7 +1995,7 @@ class GestorProveedores:
             'activo': activo
         }
         
-        self.guardar_proveedores()
+        self.persistir_proveedores([id_upper])
         return (True, f"Proveedor '{alias}' actualizado exitosamente")
     
     def eliminar_proveedor(self, id_proveedor: str) -> Tuple[bool, str]:
@@ -935,7 +2007,7 @@ class GestorProveedores:
             # En lugar de eliminar, marcamos como inactivo
             self.proveedores[id_upper]['activo'] = False
             self.proveedores[id_upper]['fecha_actualizacion'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            self.guardar_proveedores()
+            self.persistir_proveedores([id_upper])
             return (True, f"Proveedor '{alias}' marcado como inactivo")
         return (False, "Proveedor no encontrado")
     
@@ -946,7 +2018,7 @@ class GestorProveedores:
         if id_upper in self.proveedores:
             alias = self.proveedores[id_upper].get('alias', '')
             del self.proveedores[id_upper]
-            self.guardar_proveedores()
+            self.persistir_proveedores([], eliminados=[id_upper])
             return (True, f"Proveedor '{alias}' eliminado permanentemente")
         return (False, "Proveedor no encontrado")
     
@@ -983,7 +2055,8 @@ class GestorProveedores:
             if prov.get('activo', True)
         ]
     
-    def exportar_proveedores_csv(self, ruta: str = 'proveedores_exportados.csv', solo_activos: bool = True) -> Tuple[bool, str]:
+    def exportar_proveedores_csv(self, ruta: str = 'proveedores_exportados.csv', solo_activos: bool = True,
+                                 progreso: Callable[[int], None] = None) -> Tuple[bool, str]:
         """Exporta proveedores a un archivo CSV"""
         try:
             proveedores_a_exportar = self.proveedores
@@ -1022,33 +2095,30 @@ class GestorProveedores:
                 'Fecha Actualizacion'
             ]
             
-            with open(ruta, 'w', newline='', encoding='utf-8-sig') as f:
-                writer = csv.DictWriter(f, fieldnames=campos)
-                writer.writeheader()
-                
-                for id_prov, proveedor in proveedores_a_exportar.items():
-                    writer.writerow({
-                        'ID Proveedor': id_prov,
-                        'Alias': proveedor.get('alias', ''),
-                        'RFC': proveedor.get('rfc', ''),
-                        'Razon Social': proveedor.get('razon_social', ''),
-                        'Personal': proveedor.get('personal', ''),
-                        'Telefono': proveedor.get('telefono', ''),
-                        'Codigo Postal': proveedor.get('codigo_postal', ''),
-                        'Estado': proveedor.get('estado', ''),
-                        'Ciudad': proveedor.get('ciudad', ''),
-                        'Municipio': proveedor.get('municipio', ''),
-                        'Colonia': proveedor.get('colonia', ''),
-                        'Direccion': proveedor.get('direccion', ''),
-                        'Fax': proveedor.get('fax', ''),
-                        'Correo': proveedor.get('correo', ''),
-                        'Pagina Web': proveedor.get('pagina_web', ''),
-                        'Tipo Pago': proveedor.get('tipo_pago', ''),
-                        'Condiciones': proveedor.get('condiciones', ''),
-                        'Activo': 'SI' if proveedor.get('activo', True) else 'NO',
-                        'Fecha Registro': proveedor.get('fecha_registro', ''),
-                        'Fecha Actualizacion': proveedor.get('fecha_actualizacion', '')
-                    })
+            # Se itera una copia: la tarea corre en un hilo de trabajo
+            filas = ([
+                id_prov,
+                proveedor.get('alias', ''),
+                proveedor.get('rfc', ''),
+                proveedor.get('razon_social', ''),
+                proveedor.get('personal', ''),
+                proveedor.get('telefono', ''),
+                proveedor.get('codigo_postal', ''),
+                proveedor.get('estado', ''),
+                proveedor.get('ciudad', ''),
+                proveedor.get('municipio', ''),
+                proveedor.get('colonia', ''),
+                proveedor.get('direccion', ''),
+                proveedor.get('fax', ''),
+                proveedor.get('correo', ''),
+                proveedor.get('pagina_web', ''),
+                proveedor.get('tipo_pago', ''),
+                proveedor.get('condiciones', ''),
+                'SI' if proveedor.get('activo', True) else 'NO',
+                proveedor.get('fecha_registro', ''),
+                proveedor.get('fecha_actualizacion', '')
+            ] for id_prov, proveedor in list(proveedores_a_exportar.items()))
+            escribir_csv_por_bloques(ruta, campos, filas, progreso, codificacion='utf-8-sig')
             
             return (True, f"Proveedores exportados exitosamente: {ruta}")
         
@@ -1127,82 +2197,6 @@ class GestorProveedores:
         except Exception as e:
             return (False, f"Error al importar proveedores: {str(e)}")
     
-    def importar_proveedores_csv(self, ruta: str, sobrescribir: bool = False) -> Tuple[bool, str]:
-        """Importa proveedores desde un archivo CSV"""
-        try:
-            if not os.path.exists(ruta):
-                return (False, f"Archivo no encontrado: {ruta}")
-            
-            proveedores_importados = 0
-            proveedores_omitidos = 0
-            errores = []
-            
-            with open(ruta, 'r', encoding='utf-8-sig') as f:
-                reader = csv.DictReader(f)
-                
-                # Verificar campos mínimos - solo ID Proveedor es obligatorio
-                campos_requeridos = ['ID Proveedor']
-                if not all(campo in reader.fieldnames for campo in campos_requeridos):
-                    return (False, f"El CSV debe contener los campos: {', '.join(campos_requeridos)}")
-                
-                for i, fila in enumerate(reader, start=2):
-                    try:
-                        id_prov = fila.get('ID Proveedor', '').strip().upper()
-                        
-                        # Solo validar que ID de proveedor no sea vacío
-                        if not id_prov:
-                            errores.append(f"Línea {i}: ID de proveedor vacío")
-                            proveedores_omitidos += 1
-                            continue
-                        
-                        # Obtener todos los campos, permitiendo blancos
-                        alias = fila.get('Alias', '').strip()
-                        razon_social = fila.get('Razon Social', '').strip()
-                        telefono = fila.get('Telefono', '').strip()
-                        
-                        # Solo importar si no existe o si se permite sobrescribir
-                        if sobrescribir or id_prov not in self.proveedores:
-                            self.proveedores[id_prov] = {
-                                'alias': alias,
-                                'rfc': fila.get('RFC', '').strip().upper(),
-                                'razon_social': razon_social,
-                                'personal': fila.get('Personal', '').strip(),
-                                'telefono': telefono,
-                                'codigo_postal': fila.get('Codigo Postal', '').strip(),
-                                'estado': fila.get('Estado', '').strip(),
-                                'ciudad': fila.get('Ciudad', '').strip(),
-                                'municipio': fila.get('Municipio', '').strip(),
-                                'colonia': fila.get('Colonia', '').strip(),
-                                'direccion': fila.get('Direccion', '').strip(),
-                                'fax': fila.get('Fax', '').strip(),
-                                'correo': fila.get('Correo', '').strip(),
-                                'pagina_web': fila.get('Pagina Web', '').strip(),
-                                'tipo_pago': fila.get('Tipo Pago', 'mensual').strip().lower(),
-                                'condiciones': fila.get('Condiciones', '').strip(),
-                                'fecha_registro': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                                'fecha_actualizacion': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                                'activo': True if fila.get('Activo', 'SI').strip().upper() == 'SI' else False
-                            }
-                            proveedores_importados += 1
-                        else:
-                            proveedores_omitidos += 1
-                            
-                    except Exception as e:
-                        errores.append(f"Línea {i}: Error procesando fila - {str(e)}")
-                        proveedores_omitidos += 1
-            
-            if proveedores_importados > 0:
-                self.guardar_proveedores()
-            
-            mensaje = f"Importación CSV completada: {proveedores_importados} proveedores importados, {proveedores_omitidos} omitidos"
-            if errores:
-                mensaje += f"\nErrores encontrados:\n" + "\n".join(errores[:10])
-            
-            return (True if proveedores_importados > 0 else False, mensaje)
-        
-        except Exception as e:
-            return (False, f"Error al importar CSV: {str(e)}")
-    
     def generar_plantilla_csv(self, ruta: str = 'plantilla_proveedores.csv') -> Tuple[bool, str]:
         """Genera un archivo CSV de plantilla con los campos requeridos"""
         try:
@@ -1257,88 +2251,78 @@ class GestorProveedores:
         except Exception as e:
             return (False, f"Error al generar plantilla: {str(e)}")
     
-    def exportar_proveedores_xlsx(self, ruta: str = 'proveedores_exportados.xlsx', solo_activos: bool = True) -> Tuple[bool, str]:
+    def filas_proveedores(self, solo_activos: bool = True) -> Iterator[list]:
+        """Una fila por proveedor con las columnas de la plantilla"""
+        for id_prov, proveedor in list(self.proveedores.items()):
+            if solo_activos and not proveedor.get('activo', True):
+                continue
+            yield [
+                id_prov,
+                proveedor.get('alias', ''),
+                proveedor.get('rfc', ''),
+                proveedor.get('razon_social', ''),
+                proveedor.get('personal', ''),
+                proveedor.get('telefono', ''),
+                proveedor.get('codigo_postal', ''),
+                proveedor.get('estado', ''),
+                proveedor.get('ciudad', ''),
+                proveedor.get('municipio', ''),
+                proveedor.get('colonia', ''),
+                proveedor.get('direccion', ''),
+                proveedor.get('fax', ''),
+                proveedor.get('correo', ''),
+                proveedor.get('pagina_web', ''),
+                proveedor.get('tipo_pago', ''),
+                proveedor.get('condiciones', ''),
+                'SI' if proveedor.get('activo', True) else 'NO'
+            ]
+    
+    def exportar_proveedores_xlsx(self, ruta: str = 'proveedores_exportados.xlsx', solo_activos: bool = True,
+                                  progreso: Callable[[int], None] = None) -> Tuple[bool, str]:
         """Exporta proveedores a un archivo XLSX"""
         try:
-            proveedores_a_exportar = self.proveedores
-            
-            if solo_activos:
-                proveedores_a_exportar = {
-                    id_prov: prov 
-                    for id_prov, prov in self.proveedores.items() 
-                    if prov.get('activo', True)
-                }
-            
-            if not proveedores_a_exportar:
+            escritas = escribir_xlsx(
+                ruta, [("Proveedores", list(COLUMNAS_PROVEEDORES), self.filas_proveedores(solo_activos))], progreso
+            )
+            if not escritas:
                 return (False, "No hay proveedores para exportar")
-            
-            wb = Workbook()
-            ws = wb.active
-            ws.title = "Proveedores"
-            
-            # Encabezados
-            campos = ['ID Proveedor', 'Alias', 'RFC', 'Razon Social', 'Personal', 'Telefono',
-                     'Codigo Postal', 'Estado', 'Ciudad', 'Municipio', 'Colonia', 'Direccion',
-                     'Fax', 'Correo', 'Pagina Web', 'Tipo Pago', 'Condiciones', 'Activo']
-            ws.append(campos)
-            
-            # Datos
-            for id_prov, proveedor in proveedores_a_exportar.items():
-                ws.append([
-                    id_prov,
-                    proveedor.get('alias', ''),
-                    proveedor.get('rfc', ''),
-                    proveedor.get('razon_social', ''),
-                    proveedor.get('personal', ''),
-                    proveedor.get('telefono', ''),
-                    proveedor.get('codigo_postal', ''),
-                    proveedor.get('estado', ''),
-                    proveedor.get('ciudad', ''),
-                    proveedor.get('municipio', ''),
-                    proveedor.get('colonia', ''),
-                    proveedor.get('direccion', ''),
-                    proveedor.get('fax', ''),
-                    proveedor.get('correo', ''),
-                    proveedor.get('pagina_web', ''),
-                    proveedor.get('tipo_pago', ''),
-                    proveedor.get('condiciones', ''),
-                    'SI' if proveedor.get('activo', True) else 'NO'
-                ])
-            
-            wb.save(ruta)
             return (True, f"Proveedores exportados exitosamente: {ruta}")
         
         except Exception as e:
             return (False, f"Error al exportar proveedores a XLSX: {str(e)}")
     
-    def importar_proveedores_xlsx(self, ruta: str, sobrescribir: bool = False) -> Tuple[bool, str]:
-        """Importa proveedores desde un archivo XLSX"""
+    def importar_proveedores_tabla(self, ruta: str, sobrescribir: bool = False,
+                                   progreso: Callable[[int], None] = None) -> Tuple[bool, str]:
+        """Importa proveedores desde un archivo XLSX o CSV, en flujo y por lotes; se aplica y guarda al final"""
+        exito, mensaje, importados = self.leer_proveedores_tabla(ruta, sobrescribir, progreso)
+        self.aplicar_importacion_proveedores(importados)
+        return (exito, mensaje)
+    
+    def leer_proveedores_tabla(self, ruta: str, sobrescribir: bool = False,
+                               progreso: Callable[[int], None] = None) -> Tuple[bool, str, Dict[str, Dict]]:
+        """Lee y valida proveedores de un XLSX o CSV en flujo; retorna los registros sin aplicarlos"""
+        formato = 'XLSX' if ruta.lower().endswith('.xlsx') else 'CSV'
         try:
             if not os.path.exists(ruta):
-                return (False, f"Archivo no encontrado: {ruta}")
+                return (False, f"Archivo no encontrado: {ruta}", {})
             
             proveedores_importados = 0
             proveedores_omitidos = 0
             errores = []
+            importados = {}
+            ahora = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             
-            wb = load_workbook(ruta)
-            ws = wb.active
-            
-            # Obtener encabezados
-            headers = [cell.value for cell in ws[1]]
-            
-            # Validar campos mínimos
-            campos_requeridos = ['ID Proveedor']
-            if not all(campo in headers for campo in campos_requeridos):
-                return (False, f"El XLSX debe contener los campos: {', '.join(campos_requeridos)}")
-            
-            # Procesar filas
-            for i, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
-                try:
-                    # Crear diccionario de fila
-                    fila = dict(zip(headers, row))
-                    
-                    id_prov = str(fila.get('ID Proveedor', '')).strip().upper() if fila.get('ID Proveedor') else ''
+            with abrir_tabla(ruta) as (headers, filas):
+                # Validar campos mínimos
+                campos_requeridos = ['ID Proveedor']
+                if not all(campo in headers for campo in campos_requeridos):
+                    return (False, f"El {formato} debe contener los campos: {', '.join(campos_requeridos)}", {})
+                
+                # Columnas ubicadas una sola vez para todas las filas
+                columnas = [(i, COLUMNAS_PROVEEDORES[h]) for i, h in enumerate(headers) if h in COLUMNAS_PROVEEDORES]
+                
+                for i, fila in registros_tabla(filas, columnas, progreso):
+                    id_prov = fila.get('id_proveedor', '').upper()
                     
                     # Validación
                     if not id_prov:
@@ -1346,53 +2330,57 @@ class GestorProveedores:
                         proveedores_omitidos += 1
                         continue
                     
-                    # Obtener campos opcionales
-                    alias = str(fila.get('Alias', '')).strip() if fila.get('Alias') else ''
-                    razon_social = str(fila.get('Razon Social', '')).strip() if fila.get('Razon Social') else ''
-                    telefono = str(fila.get('Telefono', '')).strip() if fila.get('Telefono') else ''
-                    
                     # Importar proveedor
-                    if sobrescribir or id_prov not in self.proveedores:
-                        self.proveedores[id_prov] = {
-                            'alias': alias,
-                            'rfc': str(fila.get('RFC', '')).strip().upper() if fila.get('RFC') else '',
-                            'razon_social': razon_social,
-                            'personal': str(fila.get('Personal', '')).strip() if fila.get('Personal') else '',
-                            'telefono': telefono,
-                            'codigo_postal': str(fila.get('Codigo Postal', '')).strip() if fila.get('Codigo Postal') else '',
-                            'estado': str(fila.get('Estado', '')).strip() if fila.get('Estado') else '',
-                            'ciudad': str(fila.get('Ciudad', '')).strip() if fila.get('Ciudad') else '',
-                            'municipio': str(fila.get('Municipio', '')).strip() if fila.get('Municipio') else '',
-                            'colonia': str(fila.get('Colonia', '')).strip() if fila.get('Colonia') else '',
-                            'direccion': str(fila.get('Direccion', '')).strip() if fila.get('Direccion') else '',
-                            'fax': str(fila.get('Fax', '')).strip() if fila.get('Fax') else '',
-                            'correo': str(fila.get('Correo', '')).strip() if fila.get('Correo') else '',
-                            'pagina_web': str(fila.get('Pagina Web', '')).strip() if fila.get('Pagina Web') else '',
-                            'tipo_pago': str(fila.get('Tipo Pago', 'mensual')).strip().lower() if fila.get('Tipo Pago') else 'mensual',
-                            'condiciones': str(fila.get('Condiciones', '')).strip() if fila.get('Condiciones') else '',
-                            'fecha_registro': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                            'fecha_actualizacion': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                            'activo': True if str(fila.get('Activo', 'SI')).strip().upper() == 'SI' else False
+                    if sobrescribir or (id_prov not in self.proveedores and id_prov not in importados):
+                        importados[id_prov] = {
+                            'alias': fila.get('alias', ''),
+                            'rfc': fila.get('rfc', '').upper(),
+                            'razon_social': fila.get('razon_social', ''),
+                            'personal': fila.get('personal', ''),
+                            'telefono': fila.get('telefono', ''),
+                            'codigo_postal': fila.get('codigo_postal', ''),
+                            'estado': fila.get('estado', ''),
+                            'ciudad': fila.get('ciudad', ''),
+                            'municipio': fila.get('municipio', ''),
+                            'colonia': fila.get('colonia', ''),
+                            'direccion': fila.get('direccion', ''),
+                            'fax': fila.get('fax', ''),
+                            'correo': fila.get('correo', ''),
+                            'pagina_web': fila.get('pagina_web', ''),
+                            'tipo_pago': fila.get('tipo_pago', '').lower() or 'mensual',
+                            'condiciones': fila.get('condiciones', ''),
+                            'fecha_registro': ahora,
+                            'fecha_actualizacion': ahora,
+                            'activo': fila.get('activo', 'SI').upper() == 'SI'
                         }
                         proveedores_importados += 1
                     else:
                         proveedores_omitidos += 1
-                        
-                except Exception as e:
-                    errores.append(f"Línea {i}: Error procesando fila - {str(e)}")
-                    proveedores_omitidos += 1
-            
-            if proveedores_importados > 0:
-                self.guardar_proveedores()
             
-            mensaje = f"Importación XLSX completada: {proveedores_importados} proveedores importados, {proveedores_omitidos} omitidos"
+            mensaje = f"Importación {formato} completada: {proveedores_importados} proveedores importados, {proveedores_omitidos} omitidos"
             if errores:
                 mensaje += f"\nErrores encontrados:\n" + "\n".join(errores[:10])
             
-            return (True if proveedores_importados > 0 else False, mensaje)
+            return (proveedores_importados > 0, mensaje, importados)
         
         except Exception as e:
-            return (False, f"Error al importar XLSX: {str(e)}")
+            return (False, f"Error al importar {formato}: {str(e)}", {})
+    
+    def aplicar_importacion_proveedores(self, importados: Dict[str, Dict]) -> None:
+        """Aplica y guarda los proveedores leídos por leer_proveedores_tabla (todos juntos)"""
+        if importados:
+            self.proveedores.update(importados)
+            self.guardar_proveedores()
+    
+    def importar_proveedores_csv(self, ruta: str, sobrescribir: bool = False,
+                                 progreso: Callable[[int], None] = None) -> Tuple[bool, str]:
+        """Importa proveedores desde un archivo CSV"""
+        return self.importar_proveedores_tabla(ruta, sobrescribir, progreso)
+    
+    def importar_proveedores_xlsx(self, ruta: str, sobrescribir: bool = False,
+                                  progreso: Callable[[int], None] = None) -> Tuple[bool, str]:
+        """Importa proveedores desde un archivo XLSX"""
+        return self.importar_proveedores_tabla(ruta, sobrescribir, progreso)
     
     def obtener_proveedores_por_tipo_pago(self, tipo_pago: str) -> List[Dict]:
         """Obtiene proveedores por tipo de pago"""
@@ -1414,7 +2402,7 @@ class GestorProveedores:
             alias = self.proveedores[id_upper].get('alias', '')
             self.proveedores[id_upper]['activo'] = True
             self.proveedores[id_upper]['fecha_actualizacion'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            self.guardar_proveedores()
+            self.persistir_proveedores([id_upper])
             return (True, f"Proveedor '{alias}' reactivado exitosamente")
         return (False, "Proveedor no encontrado")
     
@@ -1424,26 +2412,39 @@ class GestorProveedores:
         return [f"{id_prov} - {prov.get('alias', '')}" for id_prov, prov in self.proveedores.items() if prov.get('activo', True)]
 
 
+# Columnas de plantilla_clientes.csv y el campo que llena cada una
+COLUMNAS_CLIENTES = {
+    'RFC': 'rfc', 'Razon Social': 'razon_social', 'Regimen Fiscal': 'regimen_fiscal', 'Uso CFDI': 'uso_cfdi',
+    'Codigo Postal': 'codigo_postal', 'Direccion Fiscal': 'direccion_fiscal', 'Estado': 'estado',
+    'Ciudad': 'ciudad', 'Municipio': 'municipio', 'Colonia': 'colonia', 'Telefono': 'telefono', 'Correo': 'correo'
+}
+
+
 class GestorClientes:
     """Clase para gestionar los clientes con todos los campos fiscales"""
-    def __init__(self):
+    def __init__(self, almacenamiento: Almacenamiento = None):
         self.clientes = {}
+        self.almacenamiento = almacenamiento or obtener_almacenamiento()
         self.cargar_clientes()
     
     def cargar_clientes(self, archivo: str = 'clientes.json') -> None:
-        """Carga los clientes desde archivo JSON"""
-        if os.path.exists(archivo):
-            try:
-                with open(archivo, 'r', encoding='utf-8') as f:
-                    self.clientes = json.load(f)
-            except Exception as e:
-                print(f"Error al cargar clientes: {e}")
+        """Carga los clientes desde el almacenamiento"""
+        try:
+            self.clientes = self.almacenamiento.cargar('clientes', archivo)
+        except Exception as e:
+            print(f"Error al cargar clientes: {e}")
     
     def guardar_clientes(self, archivo: str = 'clientes.json') -> None:
-        """Guarda los clientes en archivo JSON"""
+        """Guarda todos los clientes en el almacenamiento"""
         try:
-            with open(archivo, 'w', encoding='utf-8') as f:
-                json.dump(self.clientes, f, ensure_ascii=False, indent=2)
+            self.almacenamiento.guardar('clientes', self.clientes, archivo)
+        except Exception as e:
+            print(f"Error al guardar clientes: {e}")
+    
+    def persistir_clientes(self, rfcs: List[str], eliminados: List[str] = None) -> None:
+        """Guarda sólo los clientes modificados o eliminados"""
+        try:
+            self.almacenamiento.guardar_registros('clientes', self.clientes, rfcs, eliminados)
         except Exception as e:
             print(f"Error al guardar clientes: {e}")
     
@@ -1516,7 +2517,7 @@ class GestorClientes:
             'fecha_actualizacion': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         }
         
-        self.guardar_clientes()
+        self.persistir_clientes([rfc_upper])
         return (True, f"Cliente '{razon_social}' agregado exitosamente")
     
     def editar_cliente(self,
@@ -1568,7 +2569,7 @@ class GestorClientes:
             'fecha_actualizacion': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         }
         
-        self.guardar_clientes()
+        self.persistir_clientes([rfc_upper])
         return (True, f"Cliente '{razon_social}' actualizado exitosamente")
     
     def eliminar_cliente(self, rfc: str) -> Tuple[bool, str]:
@@ -1578,7 +2579,7 @@ class GestorClientes:
         if rfc_upper in self.clientes:
             razon_social = self.clientes[rfc_upper].get('razon_social', '')
             del self.clientes[rfc_upper]
-            self.guardar_clientes()
+            self.persistir_clientes([], eliminados=[rfc_upper])
             return (True, f"Cliente '{razon_social}' eliminado exitosamente")
         return (False, "Cliente no encontrado")
     
@@ -1600,7 +2601,8 @@ class GestorClientes:
         
         return resultados
     
-    def exportar_clientes_csv(self, ruta: str = 'clientes_exportados.csv') -> Tuple[bool, str]:
+    def exportar_clientes_csv(self, ruta: str = 'clientes_exportados.csv',
+                              progreso: Callable[[int], None] = None) -> Tuple[bool, str]:
         """Exporta todos los clientes a un archivo CSV"""
         try:
             if not self.clientes:
@@ -1624,27 +2626,24 @@ class GestorClientes:
                 'Fecha Actualizacion'
             ]
             
-            with open(ruta, 'w', newline='', encoding='utf-8-sig') as f:
-                writer = csv.DictWriter(f, fieldnames=campos)
-                writer.writeheader()
-                
-                for rfc, cliente in self.clientes.items():
-                    writer.writerow({
-                        'RFC': rfc,
-                        'Razon Social': cliente.get('razon_social', ''),
-                        'Regimen Fiscal': cliente.get('regimen_fiscal', ''),
-                        'Uso CFDI': cliente.get('uso_cfdi', ''),
-                        'Codigo Postal': cliente.get('codigo_postal', ''),
-                        'Direccion Fiscal': cliente.get('direccion_fiscal', ''),
-                        'Estado': cliente.get('estado', ''),
-                        'Ciudad': cliente.get('ciudad', ''),
-                        'Municipio': cliente.get('municipio', ''),
-                        'Colonia': cliente.get('colonia', ''),
-                        'Telefono': cliente.get('telefono', ''),
-                        'Correo': cliente.get('correo', ''),
-                        'Fecha Registro': cliente.get('fecha_registro', ''),
-                        'Fecha Actualizacion': cliente.get('fecha_actualizacion', '')
-                    })
+            # Se itera una copia: la tarea corre en un hilo de trabajo
+            filas = ([
+                rfc,
+                cliente.get('razon_social', ''),
+                cliente.get('regimen_fiscal', ''),
+                cliente.get('uso_cfdi', ''),
+                cliente.get('codigo_postal', ''),
+                cliente.get('direccion_fiscal', ''),
+                cliente.get('estado', ''),
+                cliente.get('ciudad', ''),
+                cliente.get('municipio', ''),
+                cliente.get('colonia', ''),
+                cliente.get('telefono', ''),
+                cliente.get('correo', ''),
+                cliente.get('fecha_registro', ''),
+                cliente.get('fecha_actualizacion', '')
+            ] for rfc, cliente in list(self.clientes.items()))
+            escribir_csv_por_bloques(ruta, campos, filas, progreso, codificacion='utf-8-sig')
             
             return (True, f"Clientes exportados exitosamente: {ruta}")
         
@@ -1713,84 +2712,6 @@ class GestorClientes:
         except Exception as e:
             return (False, f"Error al importar clientes: {str(e)}")
     
-    def importar_clientes_csv(self, ruta: str, sobrescribir: bool = False) -> Tuple[bool, str]:
-        """Importa clientes desde un archivo CSV"""
-        try:
-            if not os.path.exists(ruta):
-                return (False, f"Archivo no encontrado: {ruta}")
-            
-            clientes_importados = 0
-            clientes_omitidos = 0
-            errores = []
-            
-            with open(ruta, 'r', encoding='utf-8-sig') as f:
-                reader = csv.DictReader(f)
-                
-                # Verificar campos mínimos - solo RFC y Razon Social son obligatorios
-                campos_requeridos = ['RFC', 'Razon Social']
-                if not all(campo in reader.fieldnames for campo in campos_requeridos):
-                    return (False, f"El CSV debe contener los campos: {', '.join(campos_requeridos)}")
-                
-                for i, fila in enumerate(reader, start=2):  # start=2 porque la fila 1 es el encabezado
-                    try:
-                        rfc = fila.get('RFC', '').strip().upper()
-                        razon_social = fila.get('Razon Social', '').strip()
-                        codigo_postal = fila.get('Codigo Postal', '').strip()
-                        
-                        # Validaciones básicas - RFC puede ser genérico o XAXX010101000
-                        if not rfc:
-                            errores.append(f"Línea {i}: RFC vacío")
-                            clientes_omitidos += 1
-                            continue
-                        
-                        # Aceptar RFCs genéricos también
-                        if not validar_rfc(rfc) and rfc.upper() != 'XAXX010101000':
-                            errores.append(f"Línea {i}: RFC inválido")
-                            clientes_omitidos += 1
-                            continue
-                        
-                        if not razon_social:
-                            errores.append(f"Línea {i}: Razón social vacía")
-                            clientes_omitidos += 1
-                            continue
-                        
-                        # Solo importar si no existe o si se permite sobrescribir
-                        if sobrescribir or rfc not in self.clientes:
-                            self.clientes[rfc] = {
-                                'razon_social': razon_social,
-                                'regimen_fiscal': fila.get('Regimen Fiscal', '').strip(),
-                                'uso_cfdi': fila.get('Uso CFDI', '').strip(),
-                                'codigo_postal': codigo_postal,
-                                'direccion_fiscal': fila.get('Direccion Fiscal', '').strip(),
-                                'estado': fila.get('Estado', '').strip(),
-                                'ciudad': fila.get('Ciudad', '').strip(),
-                                'municipio': fila.get('Municipio', '').strip(),
-                                'colonia': fila.get('Colonia', '').strip(),
-                                'telefono': fila.get('Telefono', '').strip(),
-                                'correo': fila.get('Correo', '').strip(),
-                                'fecha_registro': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                                'fecha_actualizacion': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                            }
-                            clientes_importados += 1
-                        else:
-                            clientes_omitidos += 1
-                            
-                    except Exception as e:
-                        errores.append(f"Línea {i}: Error procesando fila - {str(e)}")
-                        clientes_omitidos += 1
-            
-            if clientes_importados > 0:
-                self.guardar_clientes()
-            
-            mensaje = f"Importación CSV completada: {clientes_importados} clientes importados, {clientes_omitidos} omitidos"
-            if errores:
-                mensaje += f"\nErrores encontrados:\n" + "\n".join(errores[:10])  # Mostrar solo primeros 10 errores
-            
-            return (True if clientes_importados > 0 else False, mensaje)
-        
-        except Exception as e:
-            return (False, f"Error al importar CSV: {str(e)}")
-    
     def generar_plantilla_csv(self, ruta: str = 'plantilla_clientes.csv') -> Tuple[bool, str]:
         """Genera un archivo CSV de plantilla con los campos requeridos"""
         try:
@@ -1833,74 +2754,70 @@ class GestorClientes:
         except Exception as e:
             return (False, f"Error al generar plantilla: {str(e)}")
     
-    def exportar_clientes_xlsx(self, ruta: str = 'clientes_exportados.xlsx') -> Tuple[bool, str]:
+    def filas_clientes(self) -> Iterator[list]:
+        """Una fila por cliente con las columnas de la plantilla"""
+        for rfc, cliente in list(self.clientes.items()):
+            yield [
+                rfc,
+                cliente.get('razon_social', ''),
+                cliente.get('regimen_fiscal', ''),
+                cliente.get('uso_cfdi', ''),
+                cliente.get('codigo_postal', ''),
+                cliente.get('direccion_fiscal', ''),
+                cliente.get('estado', ''),
+                cliente.get('ciudad', ''),
+                cliente.get('municipio', ''),
+                cliente.get('colonia', ''),
+                cliente.get('telefono', ''),
+                cliente.get('correo', '')
+            ]
+    
+    def exportar_clientes_xlsx(self, ruta: str = 'clientes_exportados.xlsx',
+                               progreso: Callable[[int], None] = None) -> Tuple[bool, str]:
         """Exporta clientes a un archivo XLSX"""
         try:
             if not self.clientes:
                 return (False, "No hay clientes para exportar")
             
-            wb = Workbook()
-            ws = wb.active
-            ws.title = "Clientes"
-            
-            # Encabezados
-            campos = ['RFC', 'Razon Social', 'Regimen Fiscal', 'Uso CFDI', 'Codigo Postal',
-                     'Direccion Fiscal', 'Estado', 'Ciudad', 'Municipio', 'Colonia', 'Telefono', 'Correo']
-            ws.append(campos)
-            
-            # Datos
-            for rfc, cliente in self.clientes.items():
-                ws.append([
-                    rfc,
-                    cliente.get('razon_social', ''),
-                    cliente.get('regimen_fiscal', ''),
-                    cliente.get('uso_cfdi', ''),
-                    cliente.get('codigo_postal', ''),
-                    cliente.get('direccion_fiscal', ''),
-                    cliente.get('estado', ''),
-                    cliente.get('ciudad', ''),
-                    cliente.get('municipio', ''),
-                    cliente.get('colonia', ''),
-                    cliente.get('telefono', ''),
-                    cliente.get('correo', '')
-                ])
-            
-            wb.save(ruta)
+            escribir_xlsx(ruta, [("Clientes", list(COLUMNAS_CLIENTES), self.filas_clientes())], progreso)
             return (True, f"Clientes exportados exitosamente: {ruta}")
         
         except Exception as e:
             return (False, f"Error al exportar clientes a XLSX: {str(e)}")
     
-    def importar_clientes_xlsx(self, ruta: str, sobrescribir: bool = False) -> Tuple[bool, str]:
-        """Importa clientes desde un archivo XLSX"""
+    def importar_clientes_tabla(self, ruta: str, sobrescribir: bool = False,
+                                progreso: Callable[[int], None] = None) -> Tuple[bool, str]:
+        """Importa clientes desde un archivo XLSX o CSV, en flujo y por lotes; se aplica y guarda al final"""
+        exito, mensaje, importados = self.leer_clientes_tabla(ruta, sobrescribir, progreso)
+        self.aplicar_importacion_clientes(importados)
+        return (exito, mensaje)
+    
+    def leer_clientes_tabla(self, ruta: str, sobrescribir: bool = False,
+                            progreso: Callable[[int], None] = None) -> Tuple[bool, str, Dict[str, Dict]]:
+        """Lee y valida clientes de un XLSX o CSV en flujo; retorna los registros sin aplicarlos"""
+        formato = 'XLSX' if ruta.lower().endswith('.xlsx') else 'CSV'
         try:
             if not os.path.exists(ruta):
-                return (False, f"Archivo no encontrado: {ruta}")
+                return (False, f"Archivo no encontrado: {ruta}", {})
             
             clientes_importados = 0
             clientes_omitidos = 0
             errores = []
+            importados = {}
+            ahora = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             
-            wb = load_workbook(ruta)
-            ws = wb.active
-            
-            # Obtener encabezados
-            headers = [cell.value for cell in ws[1]]
-            
-            # Validar campos mínimos
-            campos_requeridos = ['RFC', 'Razon Social']
-            if not all(campo in headers for campo in campos_requeridos):
-                return (False, f"El XLSX debe contener los campos: {', '.join(campos_requeridos)}")
-            
-            # Procesar filas
-            for i, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
-                try:
-                    # Crear diccionario de fila
-                    fila = dict(zip(headers, row))
-                    
-                    rfc = str(fila.get('RFC', '')).strip().upper() if fila.get('RFC') else ''
-                    razon_social = str(fila.get('Razon Social', '')).strip() if fila.get('Razon Social') else ''
-                    codigo_postal = str(fila.get('Codigo Postal', '')).strip() if fila.get('Codigo Postal') else ''
+            with abrir_tabla(ruta) as (headers, filas):
+                # Validar campos mínimos
+                campos_requeridos = ['RFC', 'Razon Social']
+                if not all(campo in headers for campo in campos_requeridos):
+                    return (False, f"El {formato} debe contener los campos: {', '.join(campos_requeridos)}", {})
+                
+                # Columnas ubicadas una sola vez para todas las filas
+                columnas = [(i, COLUMNAS_CLIENTES[h]) for i, h in enumerate(headers) if h in COLUMNAS_CLIENTES]
+                
+                for i, fila in registros_tabla(filas, columnas, progreso):
+                    rfc = fila.get('rfc', '').upper()
+                    razon_social = fila.get('razon_social', '')
                     
                     # Validaciones
                     if not rfc:
@@ -1908,7 +2825,7 @@ class GestorClientes:
                         clientes_omitidos += 1
                         continue
                     
-                    if not validar_rfc(rfc) and rfc.upper() != 'XAXX010101000':
+                    if not validar_rfc(rfc) and rfc != 'XAXX010101000':
                         errores.append(f"Línea {i}: RFC inválido")
                         clientes_omitidos += 1
                         continue
@@ -1919,45 +2836,90 @@ class GestorClientes:
                         continue
                     
                     # Importar cliente
-                    if sobrescribir or rfc not in self.clientes:
-                        self.clientes[rfc] = {
+                    if sobrescribir or (rfc not in self.clientes and rfc not in importados):
+                        importados[rfc] = {
                             'razon_social': razon_social,
-                            'regimen_fiscal': str(fila.get('Regimen Fiscal', '')).strip() if fila.get('Regimen Fiscal') else '',
-                            'uso_cfdi': str(fila.get('Uso CFDI', '')).strip() if fila.get('Uso CFDI') else '',
-                            'codigo_postal': codigo_postal,
-                            'direccion_fiscal': str(fila.get('Direccion Fiscal', '')).strip() if fila.get('Direccion Fiscal') else '',
-                            'estado': str(fila.get('Estado', '')).strip() if fila.get('Estado') else '',
-                            'ciudad': str(fila.get('Ciudad', '')).strip() if fila.get('Ciudad') else '',
-                            'municipio': str(fila.get('Municipio', '')).strip() if fila.get('Municipio') else '',
-                            'colonia': str(fila.get('Colonia', '')).strip() if fila.get('Colonia') else '',
-                            'telefono': str(fila.get('Telefono', '')).strip() if fila.get('Telefono') else '',
-                            'correo': str(fila.get('Correo', '')).strip() if fila.get('Correo') else '',
-                            'fecha_registro': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                            'fecha_actualizacion': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                            'regimen_fiscal': fila.get('regimen_fiscal', ''),
+                            'uso_cfdi': fila.get('uso_cfdi', ''),
+                            'codigo_postal': fila.get('codigo_postal', ''),
+                            'direccion_fiscal': fila.get('direccion_fiscal', ''),
+                            'estado': fila.get('estado', ''),
+                            'ciudad': fila.get('ciudad', ''),
+                            'municipio': fila.get('municipio', ''),
+                            'colonia': fila.get('colonia', ''),
+                            'telefono': fila.get('telefono', ''),
+                            'correo': fila.get('correo', ''),
+                            'fecha_registro': ahora,
+                            'fecha_actualizacion': ahora
                         }
                         clientes_importados += 1
                     else:
                         clientes_omitidos += 1
-                        
-                except Exception as e:
-                    errores.append(f"Línea {i}: Error procesando fila - {str(e)}")
-                    clientes_omitidos += 1
             
-            if clientes_importados > 0:
-                self.guardar_clientes()
-            
-            mensaje = f"Importación XLSX completada: {clientes_importados} clientes importados, {clientes_omitidos} omitidos"
+            mensaje = f"Importación {formato} completada: {clientes_importados} clientes importados, {clientes_omitidos} omitidos"
             if errores:
                 mensaje += f"\nErrores encontrados:\n" + "\n".join(errores[:10])
             
-            return (True if clientes_importados > 0 else False, mensaje)
+            return (clientes_importados > 0, mensaje, importados)
         
         except Exception as e:
-            return (False, f"Error al importar XLSX: {str(e)}")
+            return (False, f"Error al importar {formato}: {str(e)}", {})
+    
+    def aplicar_importacion_clientes(self, importados: Dict[str, Dict]) -> None:
+        """Aplica y guarda los clientes leídos por leer_clientes_tabla (todos juntos)"""
+        if importados:
+            self.clientes.update(importados)
+            self.guardar_clientes()
+    
+    def importar_clientes_csv(self, ruta: str, sobrescribir: bool = False,
+                              progreso: Callable[[int], None] = None) -> Tuple[bool, str]:
+        """Importa clientes desde un archivo CSV"""
+        return self.importar_clientes_tabla(ruta, sobrescribir, progreso)
+    
+    def importar_clientes_xlsx(self, ruta: str, sobrescribir: bool = False,
+                               progreso: Callable[[int], None] = None) -> Tuple[bool, str]:
+        """Importa clientes desde un archivo XLSX"""
+        return self.importar_clientes_tabla(ruta, sobrescribir, progreso)
+
 
+# Filas que se escriben por bloque al exportar a CSV
+FILAS_POR_BLOQUE = 1000
+
+
+def escribir_csv_por_bloques(ruta: str, encabezados: List[str], filas: Iterable[list],
+                             progreso: Callable[[int], None] = None, codificacion: str = 'utf-8') -> int:
+    """Escribe filas a un CSV en bloques (memoria constante) y retorna cuántas se escribieron"""
+    filas = iter(filas)
+    # Se escribe en un temporal que sólo reemplaza a ruta si tiene filas: un error, una cancelación
+    # o un periodo vacío no dejan un archivo a medias ni borran el que ya existía
+    temporal = ruta + '.tmp'
+    escritas = 0
+    try:
+        with open(temporal, 'w', newline='', encoding=codificacion, buffering=1 << 16) as f:
+            writer = csv.writer(f)
+            writer.writerow(encabezados)
+            while True:
+                bloque = list(islice(filas, FILAS_POR_BLOQUE))
+                if not bloque:
+                    break
+                writer.writerows(bloque)
+                escritas += len(bloque)
+                if progreso:
+                    progreso(escritas)
+        if escritas:
+            os.replace(temporal, ruta)
+    finally:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+    return escritas
 
 class GeneradorReportes:
     """Clase para generar reportes de ventas"""
+    ENCABEZADOS_REPORTE = ['folio', 'fecha', 'producto', 'descripcion', 'cantidad', 'precio', 'subtotal', 'es_mayoreo']
+    ENCABEZADOS_LINEAS = ['Folio', 'Fecha', 'Producto', 'Descripción', 'Cantidad', 'Precio Unitario',
+                          'Subtotal', 'IVA', 'Total', 'Pago', 'Cambio']
+    ENCABEZADOS_VENTAS = ['Folio', 'Fecha', 'Subtotal', 'IVA', 'Total', 'Pago', 'Cambio', 'Productos', 'Descuento']
+    
     def __init__(self, gestor_ventas: GestorVentas):
         self.gestor_ventas = gestor_ventas
     
@@ -1966,45 +2928,158 @@ class GeneradorReportes:
         if fecha is None:
             fecha = datetime.now().strftime('%Y-%m-%d')
         
-        ventas = self.gestor_ventas.obtener_ventas()
-        ventas_del_dia = [v for v in ventas if v.get('fecha', '').startswith(fecha)]
-        
-        total = sum(v.get('total', 0) for v in ventas_del_dia)
+        reporte = self.gestor_ventas.obtener_agregados().resumen(fecha, fecha)
+        reporte['fecha'] = fecha
+        return reporte
+    
+    def generar_reporte_semanal(self, fecha: str = None) -> Dict:
+        """Genera un reporte de la semana (lunes a domingo) que contiene la fecha"""
+        dia = datetime.strptime(fecha, '%Y-%m-%d') if fecha else datetime.now()
+        lunes = dia - timedelta(days=dia.weekday())
+        domingo = lunes + timedelta(days=6)
+        return self.gestor_ventas.obtener_agregados().resumen(lunes.strftime('%Y-%m-%d'), domingo.strftime('%Y-%m-%d'))
+    
+    def generar_reporte_mensual(self, mes: str = None) -> Dict:
+        """Genera un reporte del mes (formato AAAA-MM)"""
+        if mes is None:
+            mes = datetime.now().strftime('%Y-%m')
+        reporte = self.gestor_ventas.obtener_agregados().resumen(f"{mes}-01", f"{mes}-31")
+        reporte['mes'] = mes
+        return reporte
+    
+    def generar_reporte_analitico(self, desde: str = None, hasta: str = None, n: int = 10) -> Dict:
+        """Más vendidos, ingresos por clasificación y proveedor, margen y ventas por hora"""
+        analitica = self.gestor_ventas.obtener_analitica()
         return {
-            'fecha': fecha,
-            'cantidad_ventas': len(ventas_del_dia),
-            'total': total
+            'desde': desde,
+            'hasta': hasta,
+            'mas_vendidos': analitica.mas_vendidos(n, 'unidades', desde, hasta),
+            'por_clasificacion': analitica.ingresos_por('clasificacion', desde, hasta),
+            'por_proveedor': analitica.ingresos_por('proveedor', desde, hasta),
+            'margen': analitica.margen(desde, hasta),
+            'por_hora': analitica.por_hora(desde, hasta)
         }
     
-    def generar_reporte_csv(self, archivo: str = 'reporte_ventas.csv') -> None:
+    @staticmethod
+    def filas_reporte(ventas: Iterable[Dict]) -> Iterator[list]:
+        """Una fila por línea vendida (reporte CSV)"""
+        for venta in ventas:
+            for producto in map(expandir_linea, venta.get('productos', [])):
+                yield [
+                    venta.get('folio', ''),
+                    venta.get('fecha', ''),
+                    producto.get('nombre', ''),
+                    producto.get('descripcion', ''),
+                    producto.get('cantidad', 0),
+                    producto.get('precio_aplicado', 0),
+                    producto.get('subtotal', 0),
+                    'SI' if producto.get('es_mayoreo', False) else 'NO'
+                ]
+    
+    @staticmethod
+    def filas_lineas(ventas: Iterable[Dict]) -> Iterator[list]:
+        """Una fila por línea vendida con los totales de su venta (exportación completa)"""
+        for venta in ventas:
+            for producto in map(expandir_linea, venta.get('productos', [])):
+                yield [
+                    venta.get('folio', ''),
+                    venta.get('fecha', ''),
+                    producto.get('nombre', ''),
+                    producto.get('descripcion', ''),
+                    producto.get('cantidad', 0),
+                    producto.get('precio_aplicado', producto.get('precio', 0)),
+                    producto.get('subtotal', 0),
+                    venta.get('iva', 0),
+                    venta.get('total', 0),
+                    venta.get('pago', 0),
+                    venta.get('cambio', 0)
+                ]
+    
+    @staticmethod
+    def filas_ventas(ventas: Iterable[Dict]) -> Iterator[list]:
+        """Una fila por venta (exportación del historial)"""
+        for venta in ventas:
+            yield [
+                venta.get('folio', ''),
+                venta.get('fecha', ''),
+                venta.get('subtotal', 0),
+                venta.get('iva', 0),
+                venta.get('total', 0),
+                venta.get('pago', 0),
+                venta.get('cambio', 0),
+                len(venta.get('productos', [])),
+                venta.get('descuento_total', 0)
+            ]
+    
+    def exportar_csv(self, ruta: str, encabezados: List[str], filas: Callable[[Iterable[Dict]], Iterator[list]],
+                     desde: str = None, hasta: str = None,
+                     progreso: Callable[[int], None] = None) -> Tuple[bool, str]:
+        """Escribe un CSV por bloques a partir de las ventas del rango, leídas del almacenamiento una a una"""
+        try:
+            escritas = escribir_csv_por_bloques(
+                ruta, encabezados, filas(self.gestor_ventas.iterar_ventas(desde, hasta)), progreso
+            )
+            if not escritas:
+                return (False, "No hay ventas para exportar en el periodo")
+            return (True, f"{escritas} filas exportadas a {ruta}")
+        except Exception as e:
+            return (False, f"Error al exportar CSV: {str(e)}")
+    
+    def generar_reporte_csv(self, archivo: str = 'reporte_ventas.csv', desde: str = None, hasta: str = None,
+                            progreso: Callable[[int], None] = None) -> Tuple[bool, str]:
         """Genera un reporte en formato CSV"""
+        return self.exportar_csv(archivo, self.ENCABEZADOS_REPORTE, self.filas_reporte, desde, hasta, progreso)
+    
+    def exportar_datos_completos(self, ruta: str, desde: str = None, hasta: str = None,
+                                 progreso: Callable[[int], None] = None) -> Tuple[bool, str]:
+        """Exporta cada línea vendida con los totales de su venta"""
+        return self.exportar_csv(ruta, self.ENCABEZADOS_LINEAS, self.filas_lineas, desde, hasta, progreso)
+    
+    def exportar_historial(self, ruta: str, desde: str = None, hasta: str = None,
+                           progreso: Callable[[int], None] = None) -> Tuple[bool, str]:
+        """Exporta una fila por venta"""
+        return self.exportar_csv(ruta, self.ENCABEZADOS_VENTAS, self.filas_ventas, desde, hasta, progreso)
+    
+    def hojas_ventas(self, desde: str = None, hasta: str = None) -> List[Tuple[str, List[str], Iterator[list]]]:
+        """Hojas de ventas y de detalle por línea; cada una recorre el almacenamiento por separado"""
+        iterar = self.gestor_ventas.iterar_ventas
+        return [
+            ("Ventas", self.ENCABEZADOS_VENTAS, self.filas_ventas(iterar(desde, hasta))),
+            ("Detalle de ventas", self.ENCABEZADOS_LINEAS, self.filas_lineas(iterar(desde, hasta)))
+        ]
+    
+    def exportar_ventas_xlsx(self, ruta: str, desde: str = None, hasta: str = None,
+                             progreso: Callable[[int], None] = None) -> Tuple[bool, str]:
+        """Exporta el historial de ventas a XLSX (ventas y detalle por línea)"""
         try:
-            ventas = self.gestor_ventas.obtener_ventas()
-            if not ventas:
-                return
-            
-            # Crear una lista plana de productos
-            rows = []
-            for venta in ventas:
-                for producto in venta.get('productos', []):
-                    rows.append({
-                        'folio': venta.get('folio', ''),
-                        'fecha': venta.get('fecha', ''),
-                        'producto': producto.get('nombre', ''),
-                        'descripcion': producto.get('descripcion', ''),
-                        'cantidad': producto.get('cantidad', 0),
-                        'precio': producto.get('precio_aplicado', 0),
-                        'subtotal': producto.get('subtotal', 0),
-                        'es_mayoreo': 'SI' if producto.get('es_mayoreo', False) else 'NO'
-                    })
-            
-            if rows:
-                with open(archivo, 'w', newline='', encoding='utf-8') as f:
-                    writer = csv.DictWriter(f, fieldnames=rows[0].keys())
-                    writer.writeheader()
-                    writer.writerows(rows)
+            escritas = escribir_xlsx(ruta, self.hojas_ventas(desde, hasta), progreso)
+            if not escritas:
+                return (False, "No hay ventas para exportar en el periodo")
+            return (True, f"{escritas} filas exportadas a {ruta}")
+        except Exception as e:
+            return (False, f"Error al exportar XLSX: {str(e)}")
+    
+    def exportar_paquete_mensual(self, ruta: str, mes: str = None, gestor_clientes: 'GestorClientes' = None,
+                                 gestor_proveedores: GestorProveedores = None,
+                                 progreso: Callable[[int], None] = None) -> Tuple[bool, str]:
+        """Libro XLSX para el contador: catálogo, clientes, proveedores y ventas del mes (AAAA-MM)"""
+        if mes is None:
+            mes = datetime.now().strftime('%Y-%m')
+        hojas = []
+        if self.gestor_ventas.gestor_inventario:
+            hojas.append(("Catalogo", list(COLUMNAS_INVENTARIO), self.gestor_ventas.gestor_inventario.filas_inventario()))
+        if gestor_clientes:
+            hojas.append(("Clientes", list(COLUMNAS_CLIENTES), gestor_clientes.filas_clientes()))
+        if gestor_proveedores:
+            hojas.append(("Proveedores", list(COLUMNAS_PROVEEDORES), gestor_proveedores.filas_proveedores(False)))
+        hojas.extend(self.hojas_ventas(f"{mes}-01", f"{mes}-31"))
+        try:
+            escritas = escribir_xlsx(ruta, hojas, progreso)
+            if not escritas:
+                return (False, f"No hay datos para exportar del mes {mes}")
+            return (True, f"Paquete del mes {mes} exportado: {escritas} filas en {ruta}")
         except Exception as e:
-            print(f"Error al generar reporte CSV: {e}")
+            return (False, f"Error al exportar paquete mensual: {str(e)}")
 
 
 class GeneradorTicket:
@@ -2015,6 +3090,7 @@ class GeneradorTicket:
     @staticmethod
     def generar_ticket(venta: Dict) -> str:
         """Genera un ticket de venta con información de precios"""
+        venta = VentaRegistrada.de(venta)
         ticket = "=" * 50 + "\n"
         ticket += "TICKET DE VENTA\n"
         ticket += "=" * 50 + "\n"
@@ -2030,22 +3106,21 @@ class GeneradorTicket:
         ticket += "-" * 50 + "\n"
         
         if 'productos' in venta:
-            for prod in venta['productos']:
+            for prod in venta.lineas():
                 precio_unitario = prod.get('precio_aplicado', 0)
                 es_mayoreo = prod.get('es_mayoreo', False)
-                precio_minorista = prod.get('precio_minorista', 0)
                 
                 ticket += f"{prod.get('nombre', 'Producto')}\n"
                 if prod.get('descripcion'):
                     ticket += f"  Desc: {prod.get('descripcion')[:30]}...\n"
-                ticket += f"  {prod.get('cantidad', 1)} x ${precio_unitario:.2f}"
+                ticket += f"  {prod.get('cantidad', 1)} x {formatear_moneda(precio_unitario)}"
                 
-                if es_mayoreo and precio_minorista > 0:
-                    ahorro = (precio_minorista - precio_unitario) * prod.get('cantidad', 1)
-                    ticket += f" (Mayoreo) Ahorro: ${ahorro:.2f}"
+                if es_mayoreo:
+                    ahorro = ahorro_linea(prod)
+                    ticket += f" (Mayoreo) Ahorro: {dinero.formatear(ahorro)}"
                 
                 subtotal = prod.get('subtotal', 0)
-                ticket += f" = ${subtotal:.2f}\n"
+                ticket += f" = {formatear_moneda(subtotal)}\n"
                 
                 if prod.get('unidad', 'pz') != 'pz':
                     ticket += f"  Unidad: {prod.get('unidad')}\n"
@@ -2053,14 +3128,14 @@ class GeneradorTicket:
         ticket += "-" * 50 + "\n"
         
         # Mostrar resumen de descuentos si aplica
-        if 'detalle_precios' in venta and venta['detalle_precios']['descuento_total'] > 0:
-            ticket += f"Descuento por mayoreo: ${venta['detalle_precios']['descuento_total']:.2f}\n"
+        if venta.get('descuento_total', 0) > 0:
+            ticket += f"Descuento por mayoreo: {formatear_moneda(venta['descuento_total'])}\n"
         
-        ticket += f"Subtotal: ${venta.get('subtotal', 0):.2f}\n"
-        ticket += f"IVA (16%): ${venta.get('iva', 0):.2f}\n"
-        ticket += f"TOTAL: ${venta.get('total', 0):.2f}\n"
-        ticket += f"Pago: ${venta.get('pago', 0):.2f}\n"
-        ticket += f"Cambio: ${venta.get('cambio', 0):.2f}\n"
+        ticket += f"Subtotal: {formatear_moneda(venta.get('subtotal', 0))}\n"
+        ticket += f"IVA ({dinero.TASA_IVA}%): {formatear_moneda(venta.get('iva', 0))}\n"
+        ticket += f"TOTAL: {formatear_moneda(venta.get('total', 0))}\n"
+        ticket += f"Pago: {formatear_moneda(venta.get('pago', 0))}\n"
+        ticket += f"Cambio: {formatear_moneda(venta.get('cambio', 0))}\n"
         
         ticket += "=" * 50 + "\n"
         ticket += "¡GRACIAS POR SU COMPRA!\n"
@@ -2167,7 +3242,7 @@ def ejemplo_punto_venta_descripcion():
     for prod in gestor_ventas.obtener_productos_venta():
         precio_unitario = prod.obtener_precio_unitario()
         print(f"- {prod.nombre}: {prod.cantidad} x ${precio_unitario:.2f} = ${prod.subtotal():.2f} "
-              f"(Mayoreo: {'Sí' if prod.cantidad >= 6 else 'No'})")
+              f"(Mayoreo: {'Sí' if prod.es_mayoreo() else 'No'})")
     
     # Calcular totales
     print(f"\nSubtotal: ${gestor_ventas.calcular_subtotal():.2f}")
@@ -0,0 +1,191 @@
+# precios.py - Reglas de precios por volumen (escalas por producto y por clasificación)
+#
+# Formato del archivo de reglas (JSON); cada escala indica desde qué cantidad aplica y
+# exactamente uno de: "precio" (fijo), "lista" ("minorista" o "mayoreo") o "descuento"
+# (porcentaje entero sobre el precio minorista):
+#
+#   {
+#     "predeterminada": [{"desde": 1, "lista": "minorista"}, {"desde": 6, "lista": "mayoreo"}],
+#     "clasificaciones": {"Cables": [{"desde": 1, "lista": "minorista"}, {"desde": 50, "descuento": 10}]},
+#     "productos": {"7501234567890": [{"desde": 1, "precio": 3.5}, {"desde": 100, "precio": 2.9}]}
+#   }
+#
+# Prioridad: regla del producto, luego la de su clasificación y al final la predeterminada.
+
+from bisect import bisect_right
+from typing import Dict, List, Optional, Tuple
+import json
+import os
+import time
+
+import dinero
+
+
+ARCHIVO_REGLAS_PRECIOS = os.environ.get('PV_REGLAS_PRECIOS', 'reglas_precios.json')
+# Regla por defecto: precio minorista y, desde 6 piezas, precio de mayoreo
+ESCALAS_PREDETERMINADAS = [{'desde': 1, 'lista': 'minorista'}, {'desde': 6, 'lista': 'mayoreo'}]
+LISTAS_PRECIOS = ('minorista', 'mayoreo')
+# Segundos entre revisiones del archivo de reglas (os.stat) durante la captura
+INTERVALO_REVISION_REGLAS = 1.0
+
+
+def es_numero(valor) -> bool:
+    return isinstance(valor, (int, float)) and not isinstance(valor, bool)
+
+
+def validar_escalas(escalas) -> List[Tuple[float, Dict]]:
+    """Valida las escalas de una regla y las ordena por cantidad; lanza ValueError si hay alguna inválida"""
+    if not isinstance(escalas, list) or not escalas:
+        raise ValueError("la regla debe ser una lista de escalas")
+    por_cantidad = {}
+    for escala in escalas:
+        desde = escala.get('desde') if isinstance(escala, dict) else None
+        if not es_numero(desde) or desde <= 0:
+            raise ValueError(f"escala sin 'desde' válido: {escala}")
+        claves = [clave for clave in ('precio', 'lista', 'descuento') if clave in escala]
+        if len(claves) != 1:
+            raise ValueError(f"la escala debe indicar sólo uno de precio, lista o descuento: {escala}")
+        if 'precio' in escala and (not es_numero(escala['precio']) or escala['precio'] < 0):
+            raise ValueError(f"precio inválido: {escala}")
+        if 'lista' in escala and escala['lista'] not in LISTAS_PRECIOS:
+            raise ValueError(f"lista de precios desconocida: {escala}")
+        if 'descuento' in escala and (not isinstance(escala['descuento'], int) or not 0 <= escala['descuento'] <= 100):
+            raise ValueError(f"el descuento debe ser un porcentaje entero entre 0 y 100: {escala}")
+        if desde in por_cantidad:
+            raise ValueError(f"cantidad repetida en las escalas: {desde}")
+        por_cantidad[desde] = escala
+    return sorted(por_cantidad.items())
+
+
+class TablaPrecios:
+    """Escalas de un producto resueltas a centavos; el precio de una cantidad se busca con bisect"""
+    def __init__(self, desdes: List[float], precios: List[int]):
+        self.desdes = desdes
+        self.precios = precios
+
+    def escala(self, cantidad) -> int:
+        """Índice de la escala que aplica a la cantidad (0 = precio base)"""
+        return max(bisect_right(self.desdes, cantidad) - 1, 0)
+
+    def precio(self, cantidad) -> int:
+        return self.precios[self.escala(cantidad)]
+
+    def es_mayoreo(self, cantidad) -> bool:
+        """Indica si la cantidad alcanza alguna escala por volumen"""
+        return self.escala(cantidad) > 0
+
+    @property
+    def precio_base(self) -> int:
+        return self.precios[0]
+
+
+def compilar_tabla(escalas: List[Tuple[float, Dict]], minorista: int, mayoreo: int) -> TablaPrecios:
+    """Resuelve las escalas de una regla con los precios (en centavos) de un producto"""
+    if escalas[0][0] > 1:
+        # Por debajo de la primera escala se cobra el precio minorista
+        escalas = [(1, {'lista': 'minorista'})] + escalas
+    desdes, precios = [], []
+    for desde, escala in escalas:
+        if 'precio' in escala:
+            centavos = dinero.a_centavos(escala['precio'])
+        elif 'lista' in escala:
+            centavos = minorista if escala['lista'] == 'minorista' else mayoreo
+        else:
+            centavos = minorista - dinero.porcentaje(minorista, escala['descuento'])
+        desdes.append(desde)
+        precios.append(centavos)
+    return TablaPrecios(desdes, precios)
+
+
+class ReglasPrecios:
+    """Reglas de precios por volumen leídas de un archivo JSON que se recarga al modificarse"""
+    def __init__(self, archivo: str = ARCHIVO_REGLAS_PRECIOS):
+        self.archivo = archivo
+        self.firma = None
+        self.predeterminada = validar_escalas(ESCALAS_PREDETERMINADAS)
+        self.por_producto = {}
+        self.por_clasificacion = {}
+        # codigo_barras -> (clave de precios, TablaPrecios compilada)
+        self.tablas = {}
+        self.version = 0
+        self.proxima_revision = 0.0
+        self.recargar_si_cambio()
+
+    def firma_archivo(self) -> Optional[Tuple[int, int]]:
+        try:
+            estado = os.stat(self.archivo)
+        except OSError:
+            return None
+        return (estado.st_mtime_ns, estado.st_size)
+
+    def revisar_cambios(self) -> None:
+        """Recarga las reglas si cambiaron, revisando el archivo a lo más una vez por intervalo"""
+        ahora = time.monotonic()
+        if ahora < self.proxima_revision:
+            return
+        self.proxima_revision = ahora + INTERVALO_REVISION_REGLAS
+        self.recargar_si_cambio()
+
+    def recargar_si_cambio(self) -> bool:
+        """Vuelve a cargar las reglas si el archivo cambió desde la última lectura"""
+        firma = self.firma_archivo()
+        if firma == self.firma:
+            return False
+        self.firma = firma
+        exito, mensaje = self.cargar()
+        if not exito:
+            print(f"Advertencia: {mensaje}")
+        return exito
+
+    def cargar(self) -> Tuple[bool, str]:
+        """Lee y valida el archivo de reglas; si es inválido se conservan las reglas anteriores"""
+        predeterminada = validar_escalas(ESCALAS_PREDETERMINADAS)
+        por_producto, por_clasificacion = {}, {}
+        if os.path.exists(self.archivo):
+            try:
+                with open(self.archivo, 'r', encoding='utf-8') as f:
+                    datos = json.load(f)
+                if 'predeterminada' in datos:
+                    predeterminada = validar_escalas(datos['predeterminada'])
+                for codigo, escalas in datos.get('productos', {}).items():
+                    por_producto[str(codigo)] = validar_escalas(escalas)
+                for clasificacion, escalas in datos.get('clasificaciones', {}).items():
+                    por_clasificacion[clasificacion.strip().lower()] = validar_escalas(escalas)
+            except (OSError, ValueError, AttributeError, TypeError) as e:
+                return (False, f"Reglas de precios inválidas en {self.archivo}: {e}")
+
+        self.predeterminada = predeterminada
+        self.por_producto = por_producto
+        self.por_clasificacion = por_clasificacion
+        self.tablas = {}
+        self.version += 1
+        return (True, f"Reglas de precios cargadas: {len(por_producto)} productos, "
+                      f"{len(por_clasificacion)} clasificaciones")
+
+    def escalas(self, codigo_barras: str, clasificacion: str) -> List[Tuple[float, Dict]]:
+        """Regla que aplica a un producto (producto > clasificación > predeterminada)"""
+        return (self.por_producto.get(codigo_barras)
+                or self.por_clasificacion.get((clasificacion or '').strip().lower())
+                or self.predeterminada)
+
+    def tabla(self, codigo_barras: str, clasificacion: str, minorista: int, mayoreo: int) -> TablaPrecios:
+        """Tabla de precios compilada de un producto (se reutiliza mientras no cambien reglas ni precios)"""
+        self.revisar_cambios()
+        clave = (clasificacion, minorista, mayoreo)
+        guardada = self.tablas.get(codigo_barras)
+        if guardada is not None and guardada[0] == clave:
+            return guardada[1]
+        tabla = compilar_tabla(self.escalas(codigo_barras, clasificacion), minorista, mayoreo)
+        self.tablas[codigo_barras] = (clave, tabla)
+        return tabla
+
+
+_reglas_compartidas = None
+
+
+def obtener_reglas_precios() -> ReglasPrecios:
+    """Retorna las reglas de precios compartidas por todas las ventas"""
+    global _reglas_compartidas
+    if _reglas_compartidas is None:
+        _reglas_compartidas = ReglasPrecios()
+    return _reglas_compartidas
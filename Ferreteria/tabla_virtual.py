@@ -0,0 +1,313 @@
+# tabla_virtual.py - Treeview virtualizado: sólo existen como filas de Tk las que se ven en pantalla
+
+from bisect import bisect_left, bisect_right
+import tkinter as tk
+from tkinter import ttk
+from typing import Callable, Dict, List, Optional, Sequence
+
+from estilos import *
+
+
+# Filas materializadas debajo de las visibles (evita huecos al cambiar el tamaño de la ventana)
+FILAS_EXTRA = 5
+# Espera antes de aplicar el filtro mientras se escribe (ms)
+RETRASO_FILTRO = 150
+
+
+def clave_valor(valor):
+    """Clave de orden que admite números y textos mezclados en la misma columna"""
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        return (0, valor, '')
+    return (1, 0, str(valor).lower())
+
+
+class Descendente:
+    """Clave de orden con la comparación invertida (para bisect sobre una vista descendente)"""
+    __slots__ = ('valor',)
+
+    def __init__(self, valor):
+        self.valor = valor
+
+    def __lt__(self, otro):
+        return otro.valor < self.valor
+
+
+class ValoresVista:
+    """Claves de orden de la vista, en su mismo orden, como secuencia para bisect"""
+    def __init__(self, tabla: 'TablaVirtual'):
+        self.tabla = tabla
+
+    def __len__(self):
+        return len(self.tabla.claves)
+
+    def __getitem__(self, indice):
+        return self.tabla.clave_orden(self.tabla.claves[indice])
+
+
+class TablaVirtual:
+    """Vista ordenada y filtrada sobre los datos de un gestor; el Treeview sólo tiene las filas visibles"""
+    def __init__(self, parent, columnas: Sequence[str], anchos: Dict[str, int], campos: Sequence[Optional[str]],
+                 obtener_datos: Callable[[], Dict[str, Dict]], formatear_fila: Callable[[str, Dict], tuple]):
+        # campos: llave del registro que muestra cada columna (None = la clave del diccionario)
+        self.campos = list(campos)
+        self.obtener_datos = obtener_datos
+        self.formatear_fila = formatear_fila
+        self.datos = {}
+        self.claves = []
+        self.inicio = 0
+        self.ranuras = []
+        self.claves_ranuras = []
+        self.clave_seleccionada = None
+        self.filtro = ''
+        self.textos = {}
+        self.orden = None
+        # clave -> valor con el que quedó ordenada en la vista (para ubicarla aunque el registro cambie)
+        self.valores = {}
+        self.filtro_pendiente = None
+
+        self.frame = tk.Frame(parent, **ESTILO_FRAME_SECUNDARIO)
+        self.frame.pack(fill=tk.BOTH, expand=True)
+
+        frame_filtro = tk.Frame(self.frame, **ESTILO_FRAME_SECUNDARIO)
+        frame_filtro.pack(fill=tk.X, padx=PADDING_GENERAL, pady=(PADDING_GENERAL, 0))
+        tk.Label(frame_filtro, text="Filtrar:", **ESTILO_LABEL_NORMAL).pack(side=tk.LEFT)
+        self.var_filtro = tk.StringVar()
+        self.var_filtro.trace_add('write', lambda *args: self.programar_filtro())
+        tk.Entry(frame_filtro, textvariable=self.var_filtro, **ESTILO_ENTRY, width=30).pack(side=tk.LEFT, padx=5)
+        self.label_total = tk.Label(frame_filtro, text="", **ESTILO_LABEL_NORMAL)
+        self.label_total.pack(side=tk.RIGHT)
+
+        # La barra de desplazamiento recorre la vista completa, no las filas del Treeview
+        self.scrollbar = ttk.Scrollbar(self.frame, command=self.desplazar)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.arbol = ttk.Treeview(self.frame, columns=columnas, show="headings", selectmode="browse", height=15)
+        for indice, col in enumerate(columnas):
+            self.arbol.heading(col, text=col, command=lambda i=indice: self.ordenar(i))
+            self.arbol.column(col, width=anchos.get(col, 100), anchor="center")
+        self.arbol.pack(fill=tk.BOTH, expand=True, padx=PADDING_GENERAL, pady=PADDING_GENERAL)
+
+        try:
+            self.alto_fila = int(ttk.Style().lookup('Treeview', 'rowheight') or 20)
+        except (tk.TclError, ValueError):
+            self.alto_fila = 20
+
+        self.arbol.bind('<Configure>', lambda e: self.ajustar_ranuras())
+        self.arbol.bind('<<TreeviewSelect>>', lambda e: self.recordar_seleccion())
+        self.arbol.bind('<MouseWheel>', self.rueda)
+        self.arbol.bind('<Button-4>', self.rueda)
+        self.arbol.bind('<Button-5>', self.rueda)
+        for tecla, paso in (('<Up>', -1), ('<Down>', 1), ('<Prior>', 'pagina-'), ('<Next>', 'pagina+'),
+                            ('<Home>', 'inicio'), ('<End>', 'fin')):
+            self.arbol.bind(tecla, lambda e, p=paso: self.mover_seleccion(p))
+
+    @property
+    def visibles(self) -> int:
+        """Filas que caben en el alto actual del Treeview (sin el encabezado)"""
+        alto = self.arbol.winfo_height()
+        if alto <= 1:
+            return int(self.arbol.cget('height'))
+        return max(1, alto // self.alto_fila - 1)
+
+    # Vista (claves filtradas y ordenadas)
+
+    def texto(self, clave: str, registro: Dict) -> str:
+        """Texto en minúsculas donde se busca el filtro (se calcula una vez por registro)"""
+        texto = self.textos.get(clave)
+        if texto is None:
+            partes = [clave] + [str(registro.get(campo, '')) for campo in self.campos if campo]
+            texto = self.textos[clave] = ' '.join(partes).lower()
+        return texto
+
+    def aplicar_filtro(self, claves: List[str]) -> List[str]:
+        if not self.filtro:
+            return claves
+        datos, filtro = self.datos, self.filtro
+        return [clave for clave in claves if filtro in self.texto(clave, datos[clave])]
+
+    def valor_orden(self, clave: str):
+        """Valor actual del registro en la columna de orden"""
+        campo = self.campos[self.orden[0]]
+        return clave_valor(clave if campo is None else self.datos[clave].get(campo, ''))
+
+    def clave_orden(self, clave: str):
+        """Valor con el que la clave está ordenada en la vista (invertido si el orden es descendente)"""
+        valor = self.valores[clave]
+        return Descendente(valor) if self.orden[1] else valor
+
+    def aplicar_orden(self) -> None:
+        if self.orden is None:
+            return
+        valores = self.valores = {clave: self.valor_orden(clave) for clave in self.claves}
+        self.claves.sort(key=valores.__getitem__, reverse=self.orden[1])
+
+    def refrescar(self) -> None:
+        """Vuelve a leer todos los datos del gestor (tras importaciones), filtra, ordena y redibuja"""
+        self.datos = self.obtener_datos()
+        self.textos = {}
+        self.claves = self.aplicar_filtro(list(self.datos))
+        self.aplicar_orden()
+        self.mostrar()
+
+    def posicion(self, clave: str) -> Optional[int]:
+        """Posición de la clave en la vista (None si no está), con bisect si la vista está ordenada"""
+        if self.orden is None or clave not in self.valores:
+            try:
+                return self.claves.index(clave)
+            except ValueError:
+                return None
+        valores = ValoresVista(self)
+        buscado = self.clave_orden(clave)
+        # Entre las claves con el mismo valor se busca la indicada
+        for indice in range(bisect_left(valores, buscado), bisect_right(valores, buscado)):
+            if self.claves[indice] == clave:
+                return indice
+        return None
+
+    def sacar_clave(self, clave: str) -> Optional[int]:
+        """Quita la clave de la vista sin redibujar; retorna la posición que tenía"""
+        self.textos.pop(clave, None)
+        indice = self.posicion(clave)
+        if indice is not None:
+            del self.claves[indice]
+        self.valores.pop(clave, None)
+        return indice
+
+    def actualizar_clave(self, clave: str) -> None:
+        """Ubica en la vista un registro agregado o editado (o lo quita si ya no existe o no pasa el filtro)"""
+        anterior = self.sacar_clave(clave)
+        registro = self.datos.get(clave)
+        if registro is not None and (not self.filtro or self.filtro in self.texto(clave, registro)):
+            if self.orden is not None:
+                self.valores[clave] = self.valor_orden(clave)
+                self.claves.insert(bisect_right(ValoresVista(self), self.clave_orden(clave)), clave)
+            elif anterior is not None:
+                self.claves.insert(anterior, clave)
+            else:
+                self.claves.append(clave)
+        self.mostrar()
+
+    def quitar_clave(self, clave: str) -> None:
+        """Quita de la vista un registro eliminado"""
+        self.sacar_clave(clave)
+        self.mostrar()
+
+    def programar_filtro(self) -> None:
+        if self.filtro_pendiente is not None:
+            self.arbol.after_cancel(self.filtro_pendiente)
+        self.filtro_pendiente = self.arbol.after(RETRASO_FILTRO, self.filtrar)
+
+    def filtrar(self) -> None:
+        self.filtro_pendiente = None
+        filtro = self.var_filtro.get().strip().lower()
+        if filtro == self.filtro:
+            return
+        # Si el filtro nuevo extiende al anterior basta con depurar la vista actual (ya ordenada)
+        depurar = bool(self.filtro) and filtro.startswith(self.filtro)
+        self.filtro = filtro
+        self.claves = self.aplicar_filtro(self.claves if depurar else list(self.datos))
+        if not depurar:
+            self.aplicar_orden()
+        self.inicio = 0
+        self.mostrar()
+
+    def ordenar(self, columna: int) -> None:
+        """Ordena por la columna; un segundo clic invierte el orden"""
+        descendente = self.orden == (columna, False)
+        self.orden = (columna, descendente)
+        self.aplicar_orden()
+        self.inicio = 0
+        self.mostrar()
+
+    # Filas materializadas
+
+    def ajustar_ranuras(self) -> None:
+        """Crea o quita filas del Treeview para cubrir el alto visible más unas de reserva"""
+        necesarias = self.visibles + FILAS_EXTRA
+        while len(self.ranuras) < necesarias:
+            self.ranuras.append(self.arbol.insert("", tk.END, values=()))
+        while len(self.ranuras) > necesarias:
+            self.arbol.delete(self.ranuras.pop())
+        self.mostrar()
+
+    def mostrar(self) -> None:
+        """Escribe en las filas del Treeview la ventana de la vista que empieza en self.inicio"""
+        total = len(self.claves)
+        visibles = self.visibles
+        self.inicio = max(0, min(self.inicio, total - visibles))
+        self.claves_ranuras = self.claves[self.inicio:self.inicio + len(self.ranuras)]
+        seleccion = None
+        for indice, iid in enumerate(self.ranuras):
+            if indice < len(self.claves_ranuras):
+                clave = self.claves_ranuras[indice]
+                self.arbol.item(iid, values=self.formatear_fila(clave, self.datos[clave]))
+                self.arbol.move(iid, "", indice)
+                if clave == self.clave_seleccionada:
+                    seleccion = iid
+            else:
+                self.arbol.detach(iid)
+        if seleccion:
+            self.arbol.selection_set(seleccion)
+        elif self.arbol.selection():
+            self.arbol.selection_remove(*self.arbol.selection())
+        self.arbol.yview_moveto(0)
+
+        if total:
+            self.scrollbar.set(self.inicio / total, min(1.0, (self.inicio + visibles) / total))
+        else:
+            self.scrollbar.set(0, 1)
+        self.label_total.config(text=f"{total:,} de {len(self.datos):,}")
+
+    def recordar_seleccion(self) -> None:
+        seleccion = self.arbol.selection()
+        if seleccion and seleccion[0] in self.ranuras:
+            indice = self.ranuras.index(seleccion[0])
+            if indice < len(self.claves_ranuras):
+                self.clave_seleccionada = self.claves_ranuras[indice]
+
+    # Desplazamiento
+
+    def desplazar(self, accion, cantidad, unidad=None) -> None:
+        """Comando de la barra de desplazamiento (moveto / scroll)"""
+        if accion == 'moveto':
+            self.inicio = int(float(cantidad) * len(self.claves))
+        else:
+            paso = self.visibles if unidad == 'pages' else 1
+            self.inicio += int(cantidad) * paso
+        self.mostrar()
+
+    def rueda(self, event):
+        if event.num == 4 or event.delta > 0:
+            self.inicio -= 3
+        else:
+            self.inicio += 3
+        self.mostrar()
+        return "break"
+
+    def mover_seleccion(self, paso):
+        """Mueve la selección con el teclado desplazando la ventana cuando sale de la vista"""
+        if not self.claves:
+            return "break"
+        if self.clave_seleccionada in self.claves_ranuras:
+            posicion = self.inicio + self.claves_ranuras.index(self.clave_seleccionada)
+        else:
+            posicion = self.inicio - 1 if paso in (1, 'pagina+') else self.inicio
+        visibles = self.visibles
+        if paso == 'pagina-':
+            posicion -= visibles
+        elif paso == 'pagina+':
+            posicion += visibles
+        elif paso == 'inicio':
+            posicion = 0
+        elif paso == 'fin':
+            posicion = len(self.claves) - 1
+        else:
+            posicion += paso
+        posicion = max(0, min(posicion, len(self.claves) - 1))
+        if posicion < self.inicio:
+            self.inicio = posicion
+        elif posicion >= self.inicio + visibles:
+            self.inicio = posicion - visibles + 1
+        self.clave_seleccionada = self.claves[posicion]
+        self.mostrar()
+        return "break"
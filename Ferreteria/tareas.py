@@ -0,0 +1,106 @@
+# tareas.py - Importaciones y exportaciones en hilos de trabajo, con avance y cancelación
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Tuple
+import threading
+
+
+# Hilos de trabajo: las importaciones y exportaciones pasan casi todo el tiempo en E/S y en openpyxl
+HILOS_TAREAS = 2
+
+
+# Hereda de BaseException para atravesar los `except Exception` con los que importadores
+# y exportadores convierten sus errores en mensajes
+class TareaCancelada(BaseException):
+    """Se lanza desde el callback de avance al cancelar una tarea"""
+
+
+class Tarea:
+    """Trabajo enviado al ejecutor: guarda el avance (filas) y permite cancelarlo"""
+    def __init__(self, nombre: str):
+        self.nombre = nombre
+        self.avance = 0
+        self.evento_cancelar = threading.Event()
+        self.futuro = None
+
+    def progreso(self, filas: int) -> None:
+        """Callback de avance que reciben las funciones de importación y exportación"""
+        if self.evento_cancelar.is_set():
+            raise TareaCancelada()
+        self.avance = filas
+
+    def cancelar(self) -> None:
+        self.evento_cancelar.set()
+
+    @property
+    def cancelada(self) -> bool:
+        return self.evento_cancelar.is_set()
+
+    @property
+    def terminada(self) -> bool:
+        return self.futuro is not None and self.futuro.done()
+
+    def resultado(self) -> Tuple:
+        """(exito, mensaje[, datos...]) de la tarea terminada"""
+        return self.futuro.result()
+
+
+class EjecutorTareas:
+    """Grupo de hilos al que la interfaz envía importaciones y exportaciones"""
+    def __init__(self, hilos: int = HILOS_TAREAS):
+        self.grupo = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix='tarea')
+        # Tareas enviadas que aún no terminan (para cancelarlas al cerrar)
+        self.tareas = set()
+        self.candado = threading.Lock()
+
+    @staticmethod
+    def ejecutar(tarea: Tarea, trabajo: Callable[[Callable[[int], None]], Tuple[bool, str]]) -> Tuple[bool, str]:
+        try:
+            if tarea.cancelada:
+                raise TareaCancelada()
+            return trabajo(tarea.progreso)
+        except TareaCancelada:
+            return (False, f"{tarea.nombre}: operación cancelada")
+        except Exception as e:
+            return (False, f"{tarea.nombre}: {str(e)}")
+
+    def enviar(self, nombre: str, trabajo: Callable[[Callable[[int], None]], Tuple[bool, str]]) -> Tarea:
+        """Programa trabajo(progreso) -> (exito, mensaje[, datos...]) en un hilo de trabajo
+
+        El trabajo sólo lee y valida; los datos que retorna los aplica el hilo de Tk.
+        """
+        tarea = Tarea(nombre)
+        with self.candado:
+            self.tareas.add(tarea)
+        tarea.futuro = self.grupo.submit(self.ejecutar, tarea, trabajo)
+        tarea.futuro.add_done_callback(lambda futuro: self.descartar(tarea))
+        return tarea
+
+    def descartar(self, tarea: Tarea) -> None:
+        with self.candado:
+            self.tareas.discard(tarea)
+
+    def en_curso(self) -> int:
+        """Número de tareas enviadas que aún no terminan"""
+        with self.candado:
+            return len(self.tareas)
+
+    def cerrar(self) -> None:
+        """Cancela las tareas pendientes y en curso y espera a que se detengan"""
+        with self.candado:
+            tareas = list(self.tareas)
+        for tarea in tareas:
+            tarea.cancelar()
+        # Las tareas en curso se detienen en su siguiente aviso de avance
+        self.grupo.shutdown(wait=True, cancel_futures=True)
+
+
+_ejecutor_compartido = None
+
+
+def obtener_ejecutor() -> EjecutorTareas:
+    """Retorna el ejecutor de tareas compartido por todas las ventanas"""
+    global _ejecutor_compartido
+    if _ejecutor_compartido is None:
+        _ejecutor_compartido = EjecutorTareas()
+    return _ejecutor_compartido
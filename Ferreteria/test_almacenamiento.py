@@ -0,0 +1,35 @@
+# test_almacenamiento.py - Folios repetidos en SQLite y escrituras diferidas de archivos JSON
+
+from almacenamiento import AlmacenamientoJSON, AlmacenamientoSQLite
+from metodos import Gestor_Inventario, GestorVentas
+
+
+def test_sqlite_rechaza_folio_repetido_y_procesar_venta_se_deshace(entorno, tmp_path):
+    alm = AlmacenamientoSQLite(str(tmp_path / 'ferreteria.db'))
+    inventario = Gestor_Inventario(alm)
+    inventario.agregar_producto('A', 'A1', 'N1', 'Tornillo', precio_minorista=2.0, stock=10)
+    ventas = GestorVentas(inventario, alm)
+
+    # Otra caja guardó ya una venta con el folio que sigue
+    folio = ventas.numero_folio
+    original = {'folio': folio, 'fecha': '2020-01-15 10:30:00', 'total': 1.0, 'productos': []}
+    assert alm.anexar_venta(original, [])
+    assert not alm.anexar_venta(dict(original, total=2.0), [])
+
+    ventas.agregar_producto_por_codigo('A', 3)
+    exito, mensaje, _ = ventas.procesar_venta(100)
+    assert not exito, mensaje
+    assert inventario.productos['A']['stock'] == 10
+    assert ventas.historial_ventas == []
+    assert alm.cargar_ventas() == [original]
+
+
+def test_escritura_diferida_guarda_los_datos_del_momento_de_marcar(entorno):
+    alm = AlmacenamientoJSON()
+    clientes = {'XAXX010101000': {'razon_social': 'Publico en general', 'telefono': ''}}
+    alm.guardar('clientes', clientes)
+    # Cambios posteriores a registros anidados no se cuelan en la escritura pendiente
+    clientes['XAXX010101000']['telefono'] = '5555555555'
+    clientes['AAA010101AAA'] = {'razon_social': 'Otro'}
+    assert alm.flush(5)
+    assert alm.cargar('clientes') == {'XAXX010101000': {'razon_social': 'Publico en general', 'telefono': ''}}
@@ -0,0 +1,71 @@
+# test_busqueda.py - El índice de productos devuelve lo mismo que el recorrido completo del inventario
+
+import random
+
+from busqueda import IndiceProductos, SesionBusqueda
+
+
+PALABRAS = ['tornillo', 'tuerca', 'taquete', 'clavo', 'pija', 'cable', 'cinta', 'brocha', 'pintura',
+            'acero', 'galvanizado', 'negro', 'blanco', '1/4"', '3/8', 'x', '10mm', 'truper', 'urrea', 'pretul']
+CONSULTAS = ['', 'to', 'tor', 'tornillo', 'rni', 'illo ac', '1/4', '/4"', '3/', 'mm', 'o t', 'a',
+             'cable negro', 'negro cable', 'xyz', 'TRUPER', 'pija 10']
+
+
+def producto_aleatorio(azar):
+    def texto():
+        return ' '.join(azar.choice(PALABRAS) for _ in range(azar.randint(0, 3)))
+    return {campo: texto() for campo in IndiceProductos.CAMPOS + ('codigo', 'stock')}
+
+
+def busqueda_lineal(productos, consulta):
+    """Búsqueda de referencia: la subcadena en cualquiera de los campos descriptivos, en el orden del inventario"""
+    consulta = consulta.lower()
+    return [cb for cb, producto in productos.items()
+            if any(consulta in producto.get(campo, '').lower() for campo in IndiceProductos.CAMPOS)]
+
+
+def mutar(azar, productos, indice):
+    """Alta, edición o baja de un producto, aplicada al inventario y al índice"""
+    operacion = azar.random()
+    if operacion < 0.4 or not productos:
+        cb = f"75{azar.randrange(10 ** 6):06d}"
+        productos.pop(cb, None)
+        indice.eliminar(cb)
+        productos[cb] = producto_aleatorio(azar)
+        indice.agregar(cb, productos[cb])
+    elif operacion < 0.7:
+        cb = azar.choice(list(productos))
+        productos[cb] = producto_aleatorio(azar)
+        indice.agregar(cb, productos[cb])
+    else:
+        cb = azar.choice(list(productos))
+        del productos[cb]
+        indice.eliminar(cb)
+
+
+def test_buscar_igual_a_busqueda_lineal_tras_altas_ediciones_y_bajas():
+    azar = random.Random(7)
+    productos = {f"75{i:06d}": producto_aleatorio(azar) for i in range(300)}
+    indice = IndiceProductos()
+    indice.construir(productos)
+    for ronda in range(60):
+        for _ in range(10):
+            mutar(azar, productos, indice)
+        for consulta in CONSULTAS:
+            assert indice.buscar(consulta) == busqueda_lineal(productos, consulta), (ronda, consulta)
+
+
+def test_sesion_al_escribir_borrar_y_cambiar_inventario():
+    azar = random.Random(11)
+    productos = {f"75{i:06d}": producto_aleatorio(azar) for i in range(300)}
+    indice = IndiceProductos()
+    indice.construir(productos)
+    sesion = SesionBusqueda(indice, capacidad_cache=4)
+    for consulta in CONSULTAS:
+        # Se teclea letra por letra, se borra de vuelta y a veces cambia el inventario a media captura
+        tecleos = [consulta[:n] for n in range(len(consulta) + 1)]
+        for texto in tecleos + tecleos[::-1]:
+            if azar.random() < 0.2:
+                mutar(azar, productos, indice)
+            assert sesion.buscar(texto) == busqueda_lineal(productos, texto), (consulta, texto)
+    assert sesion.estadisticas['refinadas'] and sesion.estadisticas['cache'] and sesion.estadisticas['indice']
@@ -0,0 +1,54 @@
+# test_dinero.py - Redondeo de importes en centavos
+
+from decimal import Decimal
+
+import dinero
+
+
+def test_a_centavos_redondea_medio_centavo_hacia_arriba():
+    # 1.005 no es exacto en binario: 1.005 * 100 da 100.49999999999999 y round() lo deja en 100
+    assert dinero.a_centavos(2.675) == 268
+    assert dinero.a_centavos(1.005) == 101
+    assert dinero.a_centavos(0.125) == 13
+    assert dinero.a_centavos(19.99) == 1999
+    assert dinero.a_centavos(0.1 + 0.2) == 30
+
+
+def test_a_centavos_acepta_enteros_textos_decimales_y_vacios():
+    assert dinero.a_centavos(15) == 1500
+    assert dinero.a_centavos('3.5') == 350
+    assert dinero.a_centavos(Decimal('7.005')) == 701
+    assert dinero.a_centavos(None) == 0
+    assert dinero.a_centavos('') == 0
+    assert dinero.a_centavos(-2.675) == -268
+
+
+def test_calcular_iva_redondea_al_centavo():
+    assert dinero.calcular_iva(0) == 0
+    assert dinero.calcular_iva(100) == 16
+    # 16% de 3.13 = 0.5008 y de 3.12 = 0.4992
+    assert dinero.calcular_iva(313) == 50
+    assert dinero.calcular_iva(312) == 50
+    assert dinero.calcular_iva(25) == 4      # 4.00
+    assert dinero.calcular_iva(1) == 0       # 0.16
+    assert dinero.calcular_iva(3) == 0       # 0.48
+    assert dinero.calcular_iva(4) == 1       # 0.64
+    assert dinero.calcular_iva(-313) == -50
+
+
+def test_porcentaje_medio_centavo_se_aleja_de_cero():
+    assert dinero.porcentaje(50, 1) == 1     # 0.5
+    assert dinero.porcentaje(-50, 1) == -1
+    assert dinero.porcentaje(150, 1) == 2    # 1.5
+    assert dinero.porcentaje(149, 1) == 1
+
+
+def test_totales_de_venta_cuadran_al_centavo():
+    # Tres líneas de 0.10: en float suman 0.30000000000000004
+    subtotal = dinero.sumar([0.1, 0.1, 0.1])
+    assert subtotal == 30
+    iva = dinero.calcular_iva(subtotal)
+    assert (subtotal, iva, subtotal + iva) == (30, 5, 35)
+    assert dinero.formatear(subtotal + iva) == '$0.35'
+    assert dinero.formatear(123456789) == '$1,234,567.89'
+    assert dinero.formatear(-5) == '-$0.05'
@@ -0,0 +1,27 @@
+# test_importacion.py - La lectura de una importación no modifica el inventario; sólo la aplicación lo hace
+
+from metodos import Gestor_Inventario
+
+
+def test_leer_inventario_tabla_no_modifica_hasta_aplicar(entorno, tmp_path):
+    inventario = Gestor_Inventario(entorno)
+    inventario.agregar_producto('A', 'A1', 'N1', 'Tornillo', precio_minorista=2.0, stock=5)
+    ruta = tmp_path / 'importar.csv'
+    ruta.write_text('Codigo Barras,Nombre,Precio Minorista,Stock\n'
+                    'A,,,7\n'
+                    'B,Brocha,25.00,3\n', encoding='utf-8')
+
+    exito, mensaje, cambios = inventario.leer_inventario_tabla(str(ruta))
+    assert exito, mensaje
+    assert sorted(cambios) == ['A', 'B']
+    # Nada se aplicó todavía: ni el inventario ni sus índices
+    assert set(inventario.productos) == {'A'}
+    assert inventario.productos['A']['stock'] == 5
+    assert inventario.indice.buscar('brocha') == []
+
+    inventario.aplicar_importacion_inventario(cambios)
+    assert inventario.productos['A']['stock'] == 7
+    assert inventario.productos['A']['nombre'] == 'Tornillo'
+    assert inventario.indice.buscar('brocha') == ['B']
+    # Lo aplicado quedó en el almacenamiento
+    assert set(Gestor_Inventario(entorno).productos) == {'A', 'B'}
@@ -0,0 +1,35 @@
+# test_precios.py - Revisión del archivo de reglas durante la captura y ahorro por escala
+
+import json
+
+import precios
+from metodos import ProductoVenta
+
+
+def test_archivo_de_reglas_se_revisa_a_lo_mas_una_vez_por_segundo(tmp_path, monkeypatch):
+    reloj = [1000.0]
+    monkeypatch.setattr(precios.time, 'monotonic', lambda: reloj[0])
+    archivo = tmp_path / 'reglas.json'
+    reglas = precios.ReglasPrecios(str(archivo))
+    revisiones = []
+    firma_archivo = reglas.firma_archivo
+    monkeypatch.setattr(reglas, 'firma_archivo', lambda: revisiones.append(1) or firma_archivo())
+
+    for _ in range(100):
+        assert reglas.tabla('A', '', 200, 150).precio(6) == 150
+    assert len(revisiones) == 1
+
+    # Un cambio al archivo se toma en cuenta al pasar el intervalo
+    archivo.write_text(json.dumps({'productos': {'A': [{'desde': 1, 'precio': 3.0}]}}), encoding='utf-8')
+    assert reglas.tabla('A', '', 200, 150).precio(6) == 150
+    reloj[0] += precios.INTERVALO_REVISION_REGLAS
+    assert reglas.tabla('A', '', 200, 150).precio(6) == 300
+    assert len(revisiones) == 2
+
+
+def test_escala_con_precio_mayor_al_base_no_da_ahorro_negativo(entorno):
+    with open(precios.ARCHIVO_REGLAS_PRECIOS, 'w', encoding='utf-8') as f:
+        json.dump({'productos': {'A': [{'desde': 1, 'lista': 'minorista'}, {'desde': 10, 'precio': 2.5}]}}, f)
+    producto = ProductoVenta('A', {'precio_minorista': 2.0, 'precio_mayoreo': 1.5}, 12)
+    assert producto.precio_unitario_centavos() == 250
+    assert producto.ahorro_centavos() == 0
@@ -0,0 +1,37 @@
+# test_reportes.py - Reporte analítico construido desde el almacenamiento
+
+from metodos import Gestor_Inventario, GestorVentas, GeneradorReportes
+
+
+def test_reporte_analitico_incluye_meses_no_cargados(entorno):
+    # Venta de un mes anterior en el formato de líneas completas: no se carga en el historial
+    entorno.anexar_venta({
+        'folio': 1, 'fecha': '2020-01-15 10:30:00', 'total': 116.0, 'iva': 16.0,
+        'productos': [{'codigo_barras': 'B', 'nombre': 'Brocha', 'cantidad': 4, 'precio_aplicado': 25.0,
+                       'costo': 10.0, 'clasificacion': 'Pintura', 'proveedor': 'P2'}]
+    }, [])
+
+    inventario = Gestor_Inventario(entorno)
+    inventario.agregar_producto('A', 'A1', 'N1', 'Tornillo', clasificacion='Tornilleria',
+                                precio_minorista=2.0, precio_mayoreo=1.5, costo=1.0, proveedor='P1', stock=100)
+    ventas = GestorVentas(inventario, entorno)
+    assert ventas.meses_pendientes == {'2020-01'}
+    ventas.agregar_producto_por_codigo('A', 3)
+    assert ventas.procesar_venta(100)[0]
+
+    exito, mensaje = ventas.preparar_analitica()
+    assert exito
+    # Los meses anteriores no quedan cargados en el historial
+    assert ventas.meses_pendientes == {'2020-01'}
+
+    reporte = GeneradorReportes(ventas).generar_reporte_analitico()
+    assert [(p['codigo_barras'], p['unidades']) for p in reporte['mas_vendidos']] == [('B', 4), ('A', 3)]
+    assert reporte['margen']['importe'] == 106.0
+    assert reporte['margen']['costo'] == 43.0
+    assert [fila['clasificacion'] for fila in reporte['por_clasificacion']] == ['Pintura', 'Tornilleria']
+    assert (10, 1, 100.0) in reporte['por_hora']
+
+    # Las ventas nuevas se agregan a las columnas ya construidas
+    ventas.agregar_producto_por_codigo('A', 1)
+    assert ventas.procesar_venta(100)[0]
+    assert GeneradorReportes(ventas).generar_reporte_analitico()['margen']['importe'] == 108.0
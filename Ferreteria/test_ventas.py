@@ -0,0 +1,49 @@
+# test_ventas.py - Datos de ventas calculados desde todo el historial, no sólo el mes cargado
+
+from metodos import Gestor_Inventario, GestorVentas
+
+
+def venta_anterior(folio, fecha, codigo_barras, cantidad, precio):
+    """Venta de un mes anterior en el formato de líneas completas"""
+    importe = cantidad * precio
+    return {'folio': folio, 'fecha': fecha, 'total': round(importe * 1.16, 2), 'iva': round(importe * 0.16, 2),
+            'productos': [{'codigo_barras': codigo_barras, 'nombre': codigo_barras, 'cantidad': cantidad,
+                           'precio_aplicado': precio, 'costo': 1.0}]}
+
+
+def test_popularidad_incluye_meses_no_cargados_y_no_se_duplica(entorno):
+    entorno.anexar_venta(venta_anterior(1, '2020-01-15 10:30:00', 'B', 4, 25.0), [])
+    entorno.anexar_venta(venta_anterior(2, '2020-02-10 12:00:00', 'B', 2, 25.0), [])
+    inventario = Gestor_Inventario(entorno)
+    inventario.agregar_producto('A', 'A1', 'N1', 'Tornillo', precio_minorista=2.0, stock=100)
+
+    ventas = GestorVentas(inventario, entorno)
+    assert ventas.meses_pendientes == {'2020-01', '2020-02'}
+    ventas.agregar_producto_por_codigo('A', 3)
+    assert ventas.procesar_venta(100)[0]
+    assert inventario.buscador.popularidad == {'B': 6, 'A': 3}
+
+    # Volver a asignar el inventario o cargar los meses no suma otra vez el historial
+    ventas.set_gestor_inventario(inventario)
+    ventas.cargar_meses()
+    assert inventario.buscador.popularidad == {'B': 6, 'A': 3}
+
+
+def test_verificar_agregados_reconstruye_dias_con_total_o_iva_distinto(entorno):
+    entorno.anexar_venta(venta_anterior(1, '2020-01-15 10:30:00', 'B', 4, 25.0), [])
+    entorno.anexar_venta(venta_anterior(2, '2020-02-10 12:00:00', 'B', 2, 25.0), [])
+    ventas = GestorVentas(Gestor_Inventario(entorno), entorno)
+    dias = ventas.obtener_agregados().dias
+    assert (dias['2020-01-15']['total_centavos'], dias['2020-01-15']['iva_centavos']) == (11600, 1600)
+
+    # Misma cantidad de ventas pero total e IVA distintos: antes sólo se comparaba el conteo por mes
+    dias['2020-01-15']['total_centavos'] += 100
+    dias['2020-01-15']['iva_centavos'] -= 16
+    febrero = dias['2020-02-10']
+    ventas.verificar_agregados()
+    dias = ventas.agregados.dias
+    assert (dias['2020-01-15']['total_centavos'], dias['2020-01-15']['iva_centavos']) == (11600, 1600)
+    assert dias['2020-01-15']['ventas'] == 1
+    # El día que coincide no se recalcula
+    assert dias['2020-02-10'] is febrero
+    assert ventas.agregados.dias_distintos(ventas.iterar_ventas()) == []